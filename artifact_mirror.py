@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import hashlib
+import argparse
+import tempfile
+import functools
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from spu_http import get_session, stream_to_file
+from spu_settings import load_settings
+from spu_trace import traced
+
+# === Mirror settings ===
+settings = load_settings()
+
+MIRROR = settings.mirror                    # directory (publish + install) or http(s) URL (install only)
+MIRROR_MAX_AGE = settings.mirror_max_age    # seconds a "latest" bundle such as config files is trusted
+MIRROR_PORT = 8780
+
+
+class MirrorError(Exception):
+    pass
+
+
+def enabled():
+    return bool(MIRROR)
+
+
+def is_remote():
+    return enabled() and MIRROR.startswith(("http://", "https://"))
+
+
+def can_publish():
+    """Only a mirror directory can be published into; an HTTP mirror is read-only."""
+    return enabled() and not is_remote()
+
+
+def _blob_rel(digest):
+    return f"blobs/{digest[:2]}/{digest}"
+
+
+def _manifest_rel(kind, key):
+    return f"index/{kind}/{key}.json"
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_atomic(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+# === Reading ===
+def load_manifest(kind, key):
+    """Manifest of kind/key, or None if the mirror does not have it. Raises MirrorError if it cannot be read."""
+    rel = _manifest_rel(kind, key)
+    try:
+        if is_remote():
+            response = get_session().get(f"{MIRROR}/{rel}", timeout=(5, 30))
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return response.json()
+        with open(os.path.join(MIRROR, rel)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (requests.RequestException, OSError, ValueError) as e:
+        raise MirrorError(f"cannot read {rel} from {MIRROR}: {e}") from e
+
+
+def _copy_blob(digest, destination):
+    rel = _blob_rel(digest)
+    if is_remote():
+        stream_to_file(f"{MIRROR}/{rel}", destination)
+    else:
+        shutil.copyfile(os.path.join(MIRROR, rel), destination)
+
+
+def _plain_name(name):
+    """Manifest file names are single path components; anything else could escape directory."""
+    return isinstance(name, str) and name not in ("", ".", "..") and "/" not in name and "\0" not in name
+
+
+@traced("mirror fetch")
+def fetch(kind, key, directory, names=None, max_age=None, expected=None):
+    """
+    Install the files of kind/key (optionally only names) from the mirror into directory.
+    Every file is checked against the digest in the manifest before it is renamed into place;
+    expected ({name: sha256}) are digests known from upstream, which the manifest must match.
+    Returns {name: path}, or None when the mirror is disabled, lacks the artifact (or one of
+    names), has only a bundle older than max_age, or its manifest is rejected; callers then
+    fall back to upstream.
+    """
+    if not enabled():
+        return None
+    try:
+        manifest = load_manifest(kind, key)
+    except MirrorError as e:
+        print(f"⚠️  Mirror unavailable, using upstream: {e}")
+        return None
+    if manifest is None:
+        return None
+    try:
+        entries = {entry["name"]: entry for entry in manifest["files"]}
+    except (KeyError, TypeError):
+        print(f"❌ Mirror manifest of {kind} {key} is malformed – using upstream.")
+        return None
+    wanted = list(entries) if names is None else list(names)
+    if any(name not in entries for name in wanted):
+        return None
+    unsafe = [name for name in wanted if not _plain_name(name)]
+    if unsafe:
+        print(f"❌ Mirror manifest of {kind} {key} has unsafe file names {unsafe!r} – using upstream.")
+        return None
+    mismatched = [name for name, digest in (expected or {}).items() if entries[name]["sha256"] != digest.lower()]
+    if mismatched:
+        print(f"❌ Mirrored {kind} {key} does not match the upstream SHA-256 of {', '.join(mismatched)} – using upstream.")
+        return None
+    if max_age is not None and any(time.time() - entries[name]["published"] > max_age for name in wanted):
+        print(f"ℹ️  Mirrored {kind} {key} is older than {max_age}s – using upstream.")
+        return None
+
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name in wanted:
+        entry = entries[name]
+        destination = os.path.join(directory, name)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".mirror")
+            os.close(fd)
+            _copy_blob(entry["sha256"], tmp_path)
+            digest = _sha256(tmp_path)
+            if digest != entry["sha256"]:
+                raise MirrorError(f"{name} from the mirror has SHA-256 {digest}, manifest says {entry['sha256']}")
+            os.chmod(tmp_path, entry.get("mode", 0o644))
+            os.replace(tmp_path, destination)
+        except (MirrorError, requests.RequestException, OSError) as e:
+            try:
+                if tmp_path:
+                    os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            print(f"❌ Mirror copy of {kind} {key} rejected, using upstream: {e}")
+            return None
+        paths[name] = destination
+
+    origin = manifest.get("host", "unknown host")
+    print(f"🪞 Installed {kind} {key} from the mirror ({len(paths)} file(s), published by {origin})")
+    return paths
+
+
+# === Publishing ===
+@traced("mirror publish")
+def publish(kind, key, files, merge=False, **meta):
+    """
+    Publish verified files ({name: path}) as kind/key. Each distinct content is stored once
+    under its digest; the manifest is written last, so readers never see a partial artifact.
+    With merge, files of an existing kind/key manifest that are not in files are kept (with
+    their own publish time, which is what max_age in fetch is checked against).
+    Old artifacts are pruned afterwards. Returns the manifest, or None if this host does not publish.
+    """
+    if not can_publish():
+        return None
+    entries = []
+    written = 0
+    now = time.time()
+    try:
+        if merge:
+            existing = load_manifest(kind, key) or {"files": []}
+            entries = [entry for entry in existing["files"] if entry["name"] not in files]
+        for name, path in files.items():
+            digest = _sha256(path)
+            blob = os.path.join(MIRROR, _blob_rel(digest))
+            if not os.path.exists(blob):
+                with open(path, "rb") as source:
+                    _write_atomic(blob, lambda f: shutil.copyfileobj(source, f, 1024 * 1024))
+                written += os.path.getsize(blob)
+            st = os.stat(path)
+            entries.append({"name": name, "sha256": digest, "size": st.st_size, "mode": st.st_mode & 0o7777,
+                            "published": now})
+
+        manifest = dict(meta, kind=kind, key=key, files=entries, published=now, host=socket.gethostname())
+        body = json.dumps(manifest, indent=2).encode()
+        _write_atomic(os.path.join(MIRROR, _manifest_rel(kind, key)), lambda f: f.write(body))
+        prune()
+    except (MirrorError, OSError) as e:
+        print(f"⚠️  Could not publish {kind} {key} to the mirror: {e}")
+        return None
+    print(f"🪞 Published {kind} {key} to the mirror ({len(files)} file(s), {written} new bytes)")
+    return manifest
+
+
+def list_manifests(directory=None):
+    """All manifests of a mirror directory, newest first."""
+    index = os.path.join(directory or MIRROR, "index")
+    manifests = []
+    for dirpath, _, filenames in os.walk(index):
+        for name in filenames:
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(dirpath, name)) as f:
+                    manifests.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    manifests.sort(key=lambda manifest: manifest["published"], reverse=True)
+    return manifests
+
+
+def prune(directory=None, keep=None):
+    """Keep the newest keep artifacts of each kind, then drop blobs no manifest references."""
+    directory = directory or MIRROR
+    keep = settings.cardano_keep_versions if keep is None else keep
+    by_kind = {}
+    for manifest in list_manifests(directory):
+        by_kind.setdefault(manifest["kind"], []).append(manifest)
+    for manifests in by_kind.values():
+        for manifest in manifests[keep:]:
+            os.unlink(os.path.join(directory, _manifest_rel(manifest["kind"], manifest["key"])))
+
+    referenced = {entry["sha256"] for manifest in list_manifests(directory) for entry in manifest["files"]}
+    for dirpath, _, filenames in os.walk(os.path.join(directory, "blobs")):
+        for name in filenames:
+            if name not in referenced and not name.endswith(".tmp"):
+                os.unlink(os.path.join(dirpath, name))
+
+
+# === Command line ===
+def serve(directory, bind="0.0.0.0", port=MIRROR_PORT):
+    """Serve a mirror directory read-only over HTTP for the other hosts."""
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=directory)
+    server = ThreadingHTTPServer((bind, port), handler)
+    print(f"🪞 Serving {directory} on http://{bind}:{port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LAN mirror for verified SPU artifacts")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="serve a mirror directory over HTTP")
+    serve_parser.add_argument("directory", nargs="?", default=MIRROR if can_publish() else None)
+    serve_parser.add_argument("--bind", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=MIRROR_PORT)
+    list_parser = commands.add_parser("list", help="list published artifacts")
+    list_parser.add_argument("directory", nargs="?", default=MIRROR if can_publish() else None)
+    prune_parser = commands.add_parser("prune", help="drop old artifacts and unreferenced blobs")
+    prune_parser.add_argument("directory", nargs="?", default=MIRROR if can_publish() else None)
+    prune_parser.add_argument("--keep", type=int, help="artifacts kept per kind (default CARDANO_KEEP_VERSIONS)")
+    args = parser.parse_args()
+
+    if not args.directory:
+        print("❌ No mirror directory given and SPU_MIRROR is not a directory.")
+        return 2
+    directory = os.path.abspath(os.path.expanduser(args.directory))
+    if args.command == "serve":
+        os.makedirs(directory, exist_ok=True)
+        serve(directory, args.bind, args.port)
+    elif args.command == "list":
+        for manifest in list_manifests(directory):
+            published = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(manifest["published"]))
+            size = sum(entry["size"] for entry in manifest["files"])
+            print(f"{published}  {manifest['kind']:<14} {manifest['key']:<16} {size / 1048576:>8.1f} MiB  "
+                  f"from {manifest.get('host', '?')}" + (f" ({manifest['source']})" if manifest.get("source") else ""))
+    else:
+        prune(directory, args.keep)
+        print(f"🧹 Pruned {directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
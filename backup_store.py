@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import gzip
+import shutil
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from spu_helpers import ask_user_to_continue, clear_terminal, is_unattended, print_header
+from spu_settings import load_settings
+from spu_trace import current_span, traced
+
+# === Backup store settings ===
+settings = load_settings()
+
+BACKUP_DIR = settings.cardano_backup_dir      # blobs/ and snapshots/ live here
+BACKUP_KEEP = settings.backup_keep            # snapshots kept per kind
+BLOB_CHUNK_SIZE = 4 * 1024 * 1024             # each chunk becomes one gzip member
+COMPRESS_LEVEL = 6
+COMPRESS_THREADS = min(8, os.cpu_count() or 1)
+
+# Where restores of each kind are written
+RESTORE_ROOTS = {
+    "config": settings.node_config_path,
+    "gliveview": settings.gliveview_dir,
+}
+
+
+class BackupError(Exception):
+    pass
+
+
+def _blob_path(digest):
+    return os.path.join(BACKUP_DIR, "blobs", digest[:2], f"{digest}.gz")
+
+
+def _snapshot_dir():
+    path = os.path.join(BACKUP_DIR, "snapshots")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_chunks(f):
+    return iter(lambda: f.read(BLOB_CHUNK_SIZE), b"")
+
+
+def _compress_to(src, dst, pool):
+    """
+    gzip src into dst using the pool: chunks are compressed in parallel as separate gzip
+    members (a valid .gz that gzip/zcat read as one stream). At most 2 chunks per thread are in memory.
+    """
+    window = []
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        for chunk in _read_chunks(fin):
+            window.append(pool.submit(gzip.compress, chunk, COMPRESS_LEVEL))
+            if len(window) >= COMPRESS_THREADS * 2:
+                fout.write(window.pop(0).result())
+        for future in window:
+            fout.write(future.result())
+        fout.flush()
+        os.fsync(fout.fileno())
+
+
+def _store_blob(path, digest, pool):
+    """Store path under its digest unless an identical blob exists. Returns bytes written."""
+    blob = _blob_path(digest)
+    if os.path.exists(blob):
+        return 0
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob), suffix=".tmp")
+    os.close(fd)
+    try:
+        _compress_to(path, tmp_path, pool)
+        os.replace(tmp_path, blob)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return os.path.getsize(blob)
+
+
+@traced("backup snapshot")
+def snapshot(kind, root, names, version=None, label=None, prune_old=True):
+    """
+    Record the current content of root/<name> for each existing name as one snapshot.
+    Unchanged files cost nothing but an index entry. Returns the snapshot id, or None if no file exists.
+    """
+    files = []
+    for name in names:
+        path = os.path.join(root, name)
+        if os.path.isfile(path):
+            st = os.stat(path)
+            files.append({"name": name, "path": path, "size": st.st_size, "mode": st.st_mode & 0o7777})
+    if not files:
+        return None
+
+    with ThreadPoolExecutor(max_workers=COMPRESS_THREADS) as pool:
+        for entry, digest in zip(files, pool.map(lambda e: _sha256(e["path"]), files)):
+            entry["sha256"] = digest
+        written = 0
+        seen = set()
+        for entry in files:
+            if entry["sha256"] not in seen:
+                seen.add(entry["sha256"])
+                written += _store_blob(entry.pop("path"), entry["sha256"], pool)
+            else:
+                entry.pop("path")
+
+    created = time.time()
+    base_id = time.strftime("%Y%m%d-%H%M%S", time.localtime(created)) + f"-{kind}"
+    if version:
+        base_id += f"-{version}"
+    snapshot_id, n = base_id, 1
+    while os.path.exists(os.path.join(_snapshot_dir(), f"{snapshot_id}.json")):
+        n += 1
+        snapshot_id = f"{base_id}.{n}"
+    meta = {
+        "id": snapshot_id,
+        "kind": kind,
+        "version": version,
+        "label": label,
+        "root": root,
+        "created": created,
+        "files": files,
+    }
+    path = os.path.join(_snapshot_dir(), f"{snapshot_id}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+    total = sum(e["size"] for e in files)
+    current_span().bytes = written
+    print(f"🗄️  Snapshot {snapshot_id}: {len(files)} file(s), {total} bytes, {written} bytes of new compressed data")
+    if prune_old:
+        prune(kind)
+    return snapshot_id
+
+
+def list_snapshots(kind=None):
+    """Snapshots, newest first (optionally of one kind)."""
+    snapshots = []
+    for name in os.listdir(_snapshot_dir()):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(_snapshot_dir(), name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if kind is None or meta.get("kind") == kind:
+            snapshots.append(meta)
+    snapshots.sort(key=lambda meta: meta["created"], reverse=True)
+    return snapshots
+
+
+def load_snapshot(snapshot_id):
+    try:
+        with open(os.path.join(_snapshot_dir(), f"{snapshot_id}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise BackupError(f"snapshot {snapshot_id} cannot be read: {e}") from e
+
+
+def extract_file(entry, destination):
+    """Write one snapshot entry to destination (atomically, with its original mode)."""
+    blob = _blob_path(entry["sha256"])
+    if not os.path.exists(blob):
+        raise BackupError(f"blob for {entry['name']} is missing from the store")
+    directory = os.path.dirname(destination) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".restore")
+    try:
+        h = hashlib.sha256()
+        with os.fdopen(fd, "wb") as fout, gzip.open(blob, "rb") as fin:
+            for chunk in _read_chunks(fin):
+                h.update(chunk)
+                fout.write(chunk)
+        if h.hexdigest() != entry["sha256"]:
+            raise BackupError(f"blob for {entry['name']} is corrupt")
+        os.chmod(tmp_path, entry.get("mode", 0o644))
+        os.replace(tmp_path, destination)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return destination
+
+
+@traced("backup restore")
+def restore(snapshot_id, root=None, names=None):
+    """
+    Restore a snapshot's files into root (default: where it was taken).
+    The files being replaced are snapshotted first, so a restore can itself be undone.
+    """
+    meta = load_snapshot(snapshot_id)
+    root = root or meta["root"]
+    entries = [e for e in meta["files"] if names is None or e["name"] in names]
+    os.makedirs(root, exist_ok=True)
+    # Pruning waits until the restore is done, so it cannot drop the snapshot being restored
+    snapshot(meta["kind"], root, [e["name"] for e in entries], label=f"before restoring {snapshot_id}", prune_old=False)
+    for entry in entries:
+        extract_file(entry, os.path.join(root, entry["name"]))
+        print(f"✅ Restored {entry['name']} from {snapshot_id}")
+    prune(meta["kind"])
+    return [os.path.join(root, e["name"]) for e in entries]
+
+
+def prune(kind=None, keep=None):
+    """Keep the newest keep snapshots of each kind, then drop blobs no snapshot references."""
+    keep = BACKUP_KEEP if keep is None else keep
+    by_kind = {}
+    for meta in list_snapshots(kind):
+        by_kind.setdefault(meta["kind"], []).append(meta)
+    for snapshots in by_kind.values():
+        for meta in snapshots[keep:]:
+            os.unlink(os.path.join(_snapshot_dir(), f"{meta['id']}.json"))
+
+    referenced = {e["sha256"] for meta in list_snapshots() for e in meta["files"]}
+    blob_root = os.path.join(BACKUP_DIR, "blobs")
+    for dirpath, _, filenames in os.walk(blob_root):
+        for name in filenames:
+            if name.endswith(".gz") and name[:-len(".gz")] not in referenced:
+                os.unlink(os.path.join(dirpath, name))
+
+
+# === Interactive restore ===
+def run_restore_menu():
+    clear_terminal()
+    print_header("Restore a backup snapshot")
+    print()
+
+    snapshots = list_snapshots()
+    if not snapshots:
+        print(f"ℹ️  No snapshots in {BACKUP_DIR} yet.")
+        return True
+
+    for index, meta in enumerate(snapshots, start=1):
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(meta["created"]))
+        names = ", ".join(e["name"] for e in meta["files"])
+        print(f"{index:>3} - {created}  {meta['kind']:<10} {meta.get('version') or '':<10} {names}")
+
+    if is_unattended():
+        print("\n⛔ Choosing a snapshot to restore needs an interactive session – nothing restored.")
+        return False
+    answer = input("\nSnapshot to restore (number, empty to cancel): ").strip()
+    if not answer.isdigit() or not 1 <= int(answer) <= len(snapshots):
+        print("⛔ Restore cancelled.")
+        return True
+    meta = snapshots[int(answer) - 1]
+
+    if meta["kind"] == "binaries":
+        from node_versions import install_version
+
+        staging = tempfile.mkdtemp(prefix="spu-restore-")
+        try:
+            paths = {e["name"]: extract_file(e, os.path.join(staging, e["name"])) for e in meta["files"]}
+            install_version(meta["version"], paths["cardano-node"], paths["cardano-cli"])
+        except (BackupError, KeyError) as e:
+            print(f"❌ Restore failed: {e}")
+            return False
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        print(f"✅ Version {meta['version']} is installed again; use the rollback option to activate it.")
+        return True
+
+    root = RESTORE_ROOTS.get(meta["kind"], meta["root"])
+    if not ask_user_to_continue(f"Restore {len(meta['files'])} file(s) into {root}?", unattended_default=False):
+        print("⛔ Restore cancelled.")
+        return True
+    try:
+        restore(meta["id"], root)
+    except (BackupError, OSError) as e:
+        print(f"❌ Restore failed: {e}")
+        return False
+    return True
@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for SPU's network paths against a local HTTP stand-in.
+
+The stand-in serves fake GitHub release JSON, a node release tarball, config/genesis files,
+gLiveView.sh and the install docs page, with configurable latency, bandwidth and failure
+injection. Every requests call made through the shared session (spu_http.get_session) is
+routed to it, so the real fetch code runs unchanged: http_cache, downloader, stream_to_file.
+
+Each scenario runs in a fresh process with its own HOME, cache and config directories, and
+reports end-to-end time, peak RSS, bytes written and bytes served.
+
+    python3 benchmarks/bench_network.py --latency 80 --bandwidth 20 --repeat 3
+    python3 benchmarks/bench_network.py --fail-rate 0.1 --json after.json --baseline before.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tarfile
+import hashlib
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import contextlib
+from email.utils import formatdate
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# === Fake upstream content ===
+NODE_VERSION = "10.5.1"
+CNCLI_TAG = "v6.5.0"
+GLIVEVIEW_VERSION = "v1.30.4"
+NODE_ARCHIVE = f"cardano-node-{NODE_VERSION}-linux.tar.gz"
+CONFIG_FILES = ["config.json", "byron-genesis.json", "shelley-genesis.json", "alonzo-genesis.json",
+                "conway-genesis.json", "checkpoints.json"]
+THROTTLE_CHUNK = 64 * 1024
+RESULT_MARKER = "BENCH_RESULT "
+
+
+def _release_tarball(size_mib, rng):
+    """Release-like .tar.gz: two incompressible 'binaries' sharing size_mib plus a few small files."""
+    half = max(1, size_mib * 1024 * 1024 // 2)
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz", compresslevel=1) as tar:
+        for name, size in (("bin/cardano-node", half), ("bin/cardano-cli", half),
+                           ("share/mainnet/config.json", 4096), ("share/mainnet/topology.json", 1024)):
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mode = 0o755 if name.startswith("bin/") else 0o644
+            tar.addfile(info, io.BytesIO(rng.randbytes(size) if hasattr(rng, "randbytes") else os.urandom(size)))
+    return buffer.getvalue()
+
+
+def _genesis(name, rng):
+    if name == "byron-genesis.json":
+        # The real file is ~1 MiB, mostly AVVM balances
+        balances = {hashlib.sha256(str(i).encode()).hexdigest()[:44]: str(rng.randrange(10 ** 12)) for i in range(14000)}
+        return {"avvmDistr": balances, "protocolConsts": {"k": 2160, "protocolMagic": 764824073}}
+    if name == "config.json":
+        return {"Protocol": "Cardano", "RequiresNetworkMagic": "RequiresNoMagic", "PeerSharing": False,
+                "TraceBlockFetchClient": False, "minSeverity": "Info"}
+    return {"file": name, "params": {f"p{i}": rng.randrange(1000) for i in range(200)}}
+
+
+def build_routes(tarball_mib, seed=0):
+    """Map 'host/path' to (status, headers, body) for everything the fetch paths request."""
+    rng = random.Random(seed)
+    tarball = _release_tarball(tarball_mib, rng)
+    asset_url = f"objects.githubusercontent.com/release-assets/{NODE_ARCHIVE}"
+    routes = {
+        "api.github.com/repos/IntersectMBO/cardano-node/releases/latest": {"tag_name": NODE_VERSION},
+        f"api.github.com/repos/IntersectMBO/cardano-node/releases/tags/{NODE_VERSION}": {
+            "tag_name": NODE_VERSION,
+            "assets": [{"name": NODE_ARCHIVE, "digest": "sha256:" + hashlib.sha256(tarball).hexdigest()}],
+        },
+        "api.github.com/repos/cardano-community/cncli/releases/latest": {"tag_name": CNCLI_TAG},
+        f"github.com/IntersectMBO/cardano-node/releases/download/{NODE_VERSION}/{NODE_ARCHIVE}": ("redirect", asset_url),
+        asset_url: tarball,
+        "raw.githubusercontent.com/cardano-community/guild-operators/master/scripts/cnode-helper-scripts/gLiveView.sh":
+            (f'#!/usr/bin/env bash\nGLV_VERSION="{GLIVEVIEW_VERSION}"\n' + "# gLiveView body\n" * 4000).encode(),
+        "developers.cardano.org/docs/operate-a-stake-pool/node-operations/installing-cardano-node":
+            ("<html><body>" + "<p>Installing the node</p>" * 2000
+             + "<code>GHC &gt;= 9.6.7</code><code>Cabal &gt;= 3.12.1.0</code></body></html>").encode(),
+    }
+    for name in CONFIG_FILES:
+        routes[f"book.play.dev.cardano.org/environments/mainnet/{name}"] = _genesis(name, rng)
+
+    compiled = {}
+    for key, value in routes.items():
+        if isinstance(value, tuple):
+            compiled[key] = (302, {"Location": f"https://{value[1]}"}, b"")
+            continue
+        if isinstance(value, dict):
+            body, content_type = json.dumps(value, indent=2).encode(), "application/json"
+        else:
+            body, content_type = value, "application/octet-stream"
+        headers = {
+            "Content-Type": content_type,
+            "ETag": '"' + hashlib.sha256(body).hexdigest()[:16] + '"',
+            "Last-Modified": formatdate(usegmt=True),
+            "Accept-Ranges": "bytes",
+        }
+        compiled[key] = (200, headers, body)
+    return compiled
+
+
+# === Local stand-in server ===
+class StandIn:
+    """
+    Threaded HTTP/1.1 server for the fake routes. latency is added before every response,
+    bandwidth (MiB/s, per connection) throttles bodies, fail_rate answers 503 and
+    truncate_rate cuts a large body off halfway.
+    """
+
+    def __init__(self, routes, latency=0.0, bandwidth=None, fail_rate=0.0, truncate_rate=0.0, seed=0):
+        self.routes = routes
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.fail_rate = fail_rate
+        self.truncate_rate = truncate_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.bytes_served = 0
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+    def counters(self):
+        with self.lock:
+            return self.requests, self.bytes_served
+
+    def _roll(self, rate):
+        with self.lock:
+            return rate > 0 and self.rng.random() < rate
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._respond(head=True)
+
+            def do_GET(self):
+                self._respond(head=False)
+
+            def _send_body(self, body):
+                truncated = len(body) > 1024 * 1024 and stand_in._roll(stand_in.truncate_rate)
+                limit = len(body) // 2 if truncated else len(body)
+                view = memoryview(body)[:limit]
+                sent = 0
+                started = time.monotonic()
+                while sent < limit:
+                    chunk = view[sent:sent + THROTTLE_CHUNK]
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+                    if stand_in.bandwidth:
+                        ahead = sent / (stand_in.bandwidth * 1024 * 1024) - (time.monotonic() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                with stand_in.lock:
+                    stand_in.bytes_served += sent
+                if truncated:
+                    self.close_connection = True
+
+            def _respond(self, head):
+                with stand_in.lock:
+                    stand_in.requests += 1
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                route = stand_in.routes.get(self.path.lstrip("/").split("?", 1)[0])
+                if route is None:
+                    return self._empty(404)
+                if stand_in._roll(stand_in.fail_rate):
+                    return self._empty(503)
+
+                status, headers, body = route
+                if status != 200:
+                    return self._empty(status, headers)
+                if self.headers.get("If-None-Match") == headers["ETag"]:
+                    return self._empty(304, {"ETag": headers["ETag"]})
+
+                start, end = 0, len(body) - 1
+                byte_range = self.headers.get("Range", "")
+                if_range = self.headers.get("If-Range")
+                if byte_range.startswith("bytes=") and (not if_range or if_range == headers["ETag"]):
+                    first, _, last = byte_range[len("bytes="):].partition("-")
+                    start = int(first)
+                    end = min(int(last), len(body) - 1) if last else len(body) - 1
+                    status = 206
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                if not head:
+                    self._send_body(body[start:end + 1] if status == 206 else body)
+
+            def _empty(self, status, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        return Handler
+
+
+# === Scenarios (run in the child process) ===
+def _node_latest():
+    from node_updater import fetch_latest_version
+    return fetch_latest_version() == NODE_VERSION
+
+
+def _node_digest():
+    from node_updater import fetch_release_asset_digest
+    return fetch_release_asset_digest(NODE_VERSION, NODE_ARCHIVE) is not None
+
+
+def _node_prebuilt():
+    from node_updater import prepare_prebuilt
+    return prepare_prebuilt(NODE_VERSION) is not None
+
+
+def _cncli_latest():
+    from cncli_checker import get_latest_cncli_version
+    return get_latest_cncli_version()[1] == CNCLI_TAG
+
+
+def _gliveview_remote():
+    from guild_view_updater import get_remote_gliveview_version
+    return get_remote_gliveview_version() == GLIVEVIEW_VERSION
+
+
+def _config_download():
+    from config_updater import STAGING_DIR, download_files
+    return all(download_files(CONFIG_FILES, STAGING_DIR).values())
+
+
+def _ghc_docs():
+    from ghc_tools import get_required_versions_official
+    return get_required_versions_official() != ("unknown", "unknown")
+
+
+# name: (function, warm-up runs before the measured one, extra environment)
+SCENARIOS = {
+    "node.latest": (_node_latest, 0, {}),
+    "node.latest.warm": (_node_latest, 1, {}),
+    "node.latest.revalidate": (_node_latest, 1, {"SPU_HTTP_CACHE_TTL": "0"}),
+    "node.digest": (_node_digest, 0, {}),
+    "node.prebuilt.stream": (_node_prebuilt, 0, {"PREBUILT_DOWNLOAD_MODE": "stream"}),
+    "node.prebuilt.segmented": (_node_prebuilt, 0, {"PREBUILT_DOWNLOAD_MODE": "segmented"}),
+    "cncli.latest": (_cncli_latest, 0, {}),
+    "gliveview.remote": (_gliveview_remote, 0, {}),
+    "config.download": (_config_download, 0, {}),
+    "ghc.docs": (_ghc_docs, 0, {}),
+    "ghc.docs.warm": (_ghc_docs, 1, {}),
+}
+
+
+def _route_session_to(stand_in_url):
+    """Send every request of the shared session to the stand-in, keeping SPU's pool and retry settings."""
+    from requests.adapters import HTTPAdapter
+    from spu_http import HTTP_POOL_SIZE, get_session
+
+    target = urlsplit(stand_in_url)
+
+    class StandInAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            url = urlsplit(request.url)
+            if url.netloc != target.netloc:
+                request.url = f"{stand_in_url}/{url.netloc}{url.path}" + (f"?{url.query}" if url.query else "")
+            return super().send(request, **kwargs)
+
+    session = get_session()
+    adapter = StandInAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE,
+                             max_retries=session.get_adapter("https://").max_retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def _bytes_written():
+    """Bytes this process passed to write() so far (Linux /proc/self/io), or None."""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss():
+    """
+    High-water RSS of this process image in bytes (Linux VmHWM), or None. The rusage the
+    parent gets from wait4 would also count the parent's own RSS at fork time.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def run_child(name, stand_in_url, verbose):
+    sys.path.insert(0, REPO_ROOT)
+    function, warmups, _ = SCENARIOS[name]
+    _route_session_to(stand_in_url)
+    output = sys.stdout if verbose else io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for _ in range(warmups):
+            function()
+        written = _bytes_written()
+        started = time.monotonic()
+        ok = function()
+        elapsed = time.monotonic() - started
+        if written is not None:
+            written = _bytes_written() - written
+    print(RESULT_MARKER + json.dumps({"ok": bool(ok), "seconds": elapsed, "written": written, "peak_rss": _peak_rss()}))
+    return 0
+
+
+# === Driver ===
+def _disk_usage(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def run_scenario(name, stand_in, verbose=False):
+    """Run one scenario in a fresh process. Returns a result dict."""
+    _, _, extra_env = SCENARIOS[name]
+    home = tempfile.mkdtemp(prefix="spu-bench-")
+    env = dict(os.environ, HOME=home, SPU_ENV_FILE=os.path.join(home, ".env"), SPU_TRACE="false",
+               SPU_CACHE_DIR=os.path.join(home, "cache"), NODE_CONFIG_PATH=os.path.join(home, "cnode"),
+               CARDANO_BACKUP_DIR=os.path.join(home, "backups"), PYTHONDONTWRITEBYTECODE="1", **extra_env)
+    requests_before, served_before = stand_in.counters()
+    try:
+        child = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--child", name, "--stand-in", stand_in.url]
+            + (["--verbose"] if verbose else []),
+            env=env, cwd=home, stdout=subprocess.PIPE, text=True,
+        )
+        output = child.stdout.read()
+        _, status, usage = os.wait4(child.pid, 0)
+        child.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else status >> 8
+        on_disk = _disk_usage(home)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+    requests_after, served_after = stand_in.counters()
+
+    result = {"ok": False, "seconds": None, "written": None, "peak_rss": None}
+    for line in output.splitlines():
+        if line.startswith(RESULT_MARKER):
+            result = json.loads(line[len(RESULT_MARKER):])
+        elif verbose:
+            print(f"   {line}")
+    result.update({
+        "scenario": name,
+        "exit_status": child.returncode,
+        "peak_rss": result["peak_rss"] or usage.ru_maxrss * 1024,
+        "on_disk": on_disk,
+        "served": served_after - served_before,
+        "requests": requests_after - requests_before,
+    })
+    return result
+
+
+def summarize(results):
+    """Median time, max peak RSS and median bytes per scenario."""
+    by_name = {}
+    for result in results:
+        by_name.setdefault(result["scenario"], []).append(result)
+    summary = {}
+    for name, runs in by_name.items():
+        timed = [r["seconds"] for r in runs if r["seconds"] is not None]
+        written = [r["written"] for r in runs if r["written"] is not None]
+        summary[name] = {
+            "runs": len(runs),
+            "failed": sum(1 for r in runs if not r["ok"] or r["exit_status"]),
+            "seconds": statistics.median(timed) if timed else None,
+            "peak_rss": max(r["peak_rss"] for r in runs),
+            "written": statistics.median(written) if written else None,
+            "on_disk": statistics.median(r["on_disk"] for r in runs),
+            "served": statistics.median(r["served"] for r in runs),
+            "requests": statistics.median(r["requests"] for r in runs),
+        }
+    return summary
+
+
+def _mib(value):
+    return f"{value / 1048576:.2f}" if value is not None else "-"
+
+
+def print_summary(summary, baseline=None):
+    header = (f"{'scenario':<26} {'runs':>4} {'time s':>8} {'RSS MiB':>8} {'written':>8} "
+              f"{'on disk':>8} {'served':>8} {'reqs':>5}")
+    print(header + (f" {'vs base':>8}" if baseline else ""))
+    for name, entry in summary.items():
+        line = (f"{name:<26} {entry['runs']:>4} "
+                f"{entry['seconds'] if entry['seconds'] is not None else float('nan'):>8.3f} "
+                f"{_mib(entry['peak_rss']):>8} {_mib(entry['written']):>8} {_mib(entry['on_disk']):>8} "
+                f"{_mib(entry['served']):>8} {entry['requests']:>5.0f}")
+        base = (baseline or {}).get(name)
+        if base and base.get("seconds") and entry["seconds"] is not None:
+            line += f" {entry['seconds'] / base['seconds'] - 1:>+8.0%}"
+        elif baseline:
+            line += f" {'-':>8}"
+        if entry["failed"]:
+            line += f"  ({entry['failed']} failed)"
+        print(line)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark SPU's download and probe paths against a local HTTP stand-in")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario (default 3)")
+    parser.add_argument("--latency", type=float, default=0.0, help="milliseconds added before every response")
+    parser.add_argument("--bandwidth", type=float, help="MiB/s per connection (default unlimited)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="fraction of large bodies cut off halfway")
+    parser.add_argument("--tarball-mib", type=int, default=64, help="size of the fake node release binaries")
+    parser.add_argument("--seed", type=int, default=0, help="seed for content and failure injection")
+    parser.add_argument("--json", help="write per-run results and the summary to this file")
+    parser.add_argument("--baseline", help="earlier --json output to compare times against")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the code under test")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--stand-in", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        return run_child(args.child, args.stand_in, args.verbose)
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        print(f"❌ Unknown scenario(s): {', '.join(unknown)}")
+        return 2
+    names = args.scenarios or list(SCENARIOS)
+
+    print(f"🧪 Building stand-in content ({args.tarball_mib} MiB release)...")
+    routes = build_routes(args.tarball_mib, args.seed)
+    stand_in = StandIn(routes, latency=args.latency / 1000, bandwidth=args.bandwidth,
+                       fail_rate=args.fail_rate, truncate_rate=args.truncate_rate, seed=args.seed)
+    results = []
+    with stand_in:
+        print(f"🌐 Stand-in at {stand_in.url} (latency {args.latency:g} ms, "
+              f"bandwidth {f'{args.bandwidth:g} MiB/s' if args.bandwidth else 'unlimited'}, "
+              f"fail {args.fail_rate:.0%}, truncate {args.truncate_rate:.0%})\n")
+        for name in names:
+            for _ in range(args.repeat):
+                results.append(run_scenario(name, stand_in, args.verbose))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["summary"]
+    summary = summarize(results)
+    print_summary(summary, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": {k: v for k, v in vars(args).items() if k not in ("child", "stand_in")},
+                       "results": results, "summary": summary}, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+    return 1 if any(entry["failed"] for entry in summary.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import shutil
+import calendar
+import subprocess
+import psutil
+from spu_helpers import spu_cache_dir
+from spu_settings import load_settings
+from spu_trace import traced
+
+GIB = 1024 ** 3
+settings = load_settings()
+
+# === Build scheduler settings ===
+# Only the components SPU installs are built (not `cabal build all`)
+CABAL_TARGETS = ["exe:cardano-node", "exe:cardano-cli"]
+
+# Rough peak memory of one parallel GHC package build
+CABAL_MEM_PER_JOB = settings.cabal_mem_per_job_gb * GIB
+# Memory kept free for a node running on the same host
+CABAL_MEM_RESERVE = settings.cabal_mem_reserve_gb * GIB
+
+# none   - run cabal as-is
+# nice   - lowest CPU priority and idle I/O class (nice/ionice)
+# cgroup - nice plus a transient systemd scope capped by MemoryMax/CPUQuota
+CABAL_BUILD_PROFILE = settings.cabal_build_profile
+CABAL_CGROUP_MEMORY_MAX = settings.cabal_cgroup_memory_max
+CABAL_CGROUP_CPU_QUOTA = settings.cabal_cgroup_cpu_quota
+
+# === Build cache settings ===
+# `cabal update` is skipped while the package index is younger than this and
+# still covers every index-state pinned in cabal.project
+CABAL_INDEX_MAX_AGE = settings.cabal_index_max_age_hours * 3600
+# Shared cabal build directory plus built binaries per node version, and the
+# disk budget for both (old versions are evicted first)
+CARDANO_BUILD_CACHE_DIR = settings.cardano_build_cache_dir
+CARDANO_BUILD_CACHE_MAX = settings.cardano_build_cache_max_gb * GIB
+BUILD_OUTPUT_META = "meta.json"
+
+
+def usable_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def plan_build_jobs():
+    """Return (jobs, cores, available_bytes) from free RAM (minus the node reserve) and cores."""
+    cores = usable_cores()
+    available = psutil.virtual_memory().available
+    budget = max(0, available - CABAL_MEM_RESERVE)
+    jobs = max(1, min(cores, int(budget // CABAL_MEM_PER_JOB)))
+    return jobs, cores, available
+
+
+def _memory_max():
+    if CABAL_CGROUP_MEMORY_MAX:
+        return CABAL_CGROUP_MEMORY_MAX
+    budget = psutil.virtual_memory().available - CABAL_MEM_RESERVE
+    return f"{max(GIB, int(budget)) // (1024 * 1024)}M"
+
+
+def wrap_command(cmd, profile=None):
+    """Prefix cmd according to the build profile (falls back gracefully if tools are missing)."""
+    profile = profile or CABAL_BUILD_PROFILE
+    if profile == "none":
+        return cmd
+
+    wrapped = list(cmd)
+    if shutil.which("ionice"):
+        wrapped = ["ionice", "-c", "3", *wrapped]
+    wrapped = ["nice", "-n", "19", *wrapped]
+
+    if profile == "cgroup":
+        if shutil.which("systemd-run"):
+            scope = ["systemd-run", "--user", "--scope", "--quiet", "-p", f"MemoryMax={_memory_max()}"]
+            if CABAL_CGROUP_CPU_QUOTA:
+                scope += ["-p", f"CPUQuota={CABAL_CGROUP_CPU_QUOTA}"]
+            wrapped = [*scope, *wrapped]
+        else:
+            print("⚠️  systemd-run not found – falling back to the 'nice' build profile.")
+    return wrapped
+
+
+@traced("cabal build")
+def build_components(targets=None, cwd=None, extra_args=None):
+    """
+    Build only the given cabal targets with a job count sized for this host.
+    Returns True on success.
+    """
+    targets = targets or CABAL_TARGETS
+    jobs, cores, available = plan_build_jobs()
+    print(f"🧮 Build plan: {' '.join(targets)} with -j{jobs} "
+          f"({cores} cores, {available / GIB:.1f} GiB free, {CABAL_MEM_RESERVE / GIB:.1f} GiB reserved, "
+          f"profile: {CABAL_BUILD_PROFILE})")
+
+    cmd = wrap_command(["cabal", "build", f"-j{jobs}", *(extra_args or []), *targets])
+    try:
+        subprocess.run(cmd, cwd=cwd, check=True)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"❌ cabal build failed: {e}")
+        return False
+
+
+# === Package index freshness ===
+def _cabal_package_dirs():
+    dirs = []
+    if os.getenv("CABAL_DIR"):
+        dirs.append(os.path.join(os.getenv("CABAL_DIR"), "packages"))
+    dirs += [os.path.expanduser("~/.cabal/packages"), os.path.expanduser("~/.cache/cabal/packages")]
+    return [d for d in dirs if os.path.isdir(d)]
+
+
+def cabal_index_times():
+    """Return {repository: mtime of its downloaded 01-index} for all local package repos."""
+    times = {}
+    for packages_dir in _cabal_package_dirs():
+        for repo in os.listdir(packages_dir):
+            for name in ("01-index.timestamp", "01-index.tar", "01-index.tar.gz"):
+                path = os.path.join(packages_dir, repo, name)
+                if os.path.isfile(path):
+                    times[repo] = max(times.get(repo, 0), os.path.getmtime(path))
+                    break
+    return times
+
+
+def required_index_states(project_file="cabal.project"):
+    """Parse index-state pins (including indented continuation lines) into {repository: unix time}."""
+    try:
+        with open(project_file) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return {}
+
+    values = []
+    collecting = False
+    for line in lines:
+        if line.startswith("index-state:"):
+            values.append(line.split(":", 1)[1])
+            collecting = True
+        elif collecting and line[:1].isspace() and line.strip():
+            values[-1] += " " + line.strip()
+        else:
+            collecting = False
+
+    states = {}
+    for value in values:
+        for entry in value.split(","):
+            parts = entry.split()
+            if len(parts) == 1:
+                parts = ["hackage.haskell.org", parts[0]]
+            if len(parts) != 2:
+                continue
+            try:
+                states[parts[0]] = calendar.timegm(time.strptime(parts[1], "%Y-%m-%dT%H:%M:%SZ"))
+            except ValueError:
+                continue
+    return states
+
+
+@traced("cabal index update")
+def update_index_if_stale(project_file="cabal.project"):
+    """Run `cabal update` only if the index is too old or misses a pinned index-state."""
+    index_times = cabal_index_times()
+    now = time.time()
+    reason = None
+    if not index_times:
+        reason = "no local package index"
+    elif now - min(index_times.values()) > CABAL_INDEX_MAX_AGE:
+        reason = f"index older than {CABAL_INDEX_MAX_AGE / 3600:.0f}h"
+    else:
+        for repo, required in required_index_states(project_file).items():
+            if index_times.get(repo, 0) < required:
+                reason = f"cabal.project pins a newer index-state for {repo}"
+                break
+
+    if reason:
+        print(f"🔄 Running cabal update ({reason})...")
+        subprocess.run(["cabal", "update"], check=True)
+    else:
+        age_hours = (now - min(index_times.values())) / 3600
+        print(f"ℹ️  cabal package index is {age_hours:.1f}h old and covers cabal.project – skipping cabal update.")
+
+
+# === Build directory and per-version outputs ===
+def _build_cache_root():
+    if CARDANO_BUILD_CACHE_DIR:
+        os.makedirs(CARDANO_BUILD_CACHE_DIR, exist_ok=True)
+        return CARDANO_BUILD_CACHE_DIR
+    return spu_cache_dir("cabal-builds")
+
+
+def builddir():
+    """
+    Stable cabal --builddir outside CARDANO_SOURCE_DIR.
+    It survives source tree resets and keeps the same absolute path across
+    versions, so a point release only recompiles what actually changed.
+    """
+    path = os.path.join(_build_cache_root(), "dist-newstyle")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _versions_root():
+    path = os.path.join(_build_cache_root(), "versions")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, BUILD_OUTPUT_META)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path, meta):
+    with open(os.path.join(path, BUILD_OUTPUT_META), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def cached_build_outputs(version):
+    """Return (node_path, cli_path) of a previously built version, or None."""
+    path = os.path.join(_versions_root(), version)
+    node_path = os.path.join(path, "cardano-node")
+    cli_path = os.path.join(path, "cardano-cli")
+    if not (os.path.isfile(node_path) and os.path.isfile(cli_path)):
+        return None
+    meta = _read_meta(path)
+    meta["last_used"] = time.time()
+    _write_meta(path, meta)
+    return node_path, cli_path
+
+
+def store_build_outputs(version, node_path, cli_path):
+    """Keep the built binaries of version and evict old versions over the disk budget."""
+    path = os.path.join(_versions_root(), version)
+    os.makedirs(path, exist_ok=True)
+    size = 0
+    for source in (node_path, cli_path):
+        destination = shutil.copy2(source, os.path.join(path, os.path.basename(source)))
+        size += os.path.getsize(destination)
+    now = time.time()
+    _write_meta(path, {"version": version, "size": size, "created": now, "last_used": now})
+    evict_build_outputs(keep=version)
+    return os.path.join(path, "cardano-node"), os.path.join(path, "cardano-cli")
+
+
+def evict_build_outputs(keep=None, max_bytes=None):
+    """
+    Delete least-recently-used version outputs until they fit the budget. The shared
+    builddir is not counted: eviction cannot shrink it, and counting it would evict every
+    stored version once it alone outgrew the budget. It is only reported when it does.
+    """
+    max_bytes = CARDANO_BUILD_CACHE_MAX if max_bytes is None else max_bytes
+    root = _versions_root()
+    entries = []
+    for version in os.listdir(root):
+        meta = _read_meta(os.path.join(root, version))
+        entries.append((meta.get("last_used", 0), version, meta.get("size", 0)))
+
+    builddir_size = _dir_size(builddir())
+    if builddir_size > max_bytes:
+        print(f"ℹ️  The cabal build directory alone takes {builddir_size / GIB:.1f} GiB, more than "
+              f"CARDANO_BUILD_CACHE_MAX_GB; delete {builddir()} to reclaim it (the next build starts cold).")
+
+    total = sum(size for _, _, size in entries)
+    for _, version, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if version == keep:
+            continue
+        print(f"🧹 Evicting cached build of {version} ({size / GIB:.2f} GiB)")
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+        total -= size
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_blocks * 512
+            except OSError:
+                pass
+    return total
+
+
+def list_bin(target, builddir=None):
+    """Return the path of a built executable via `cabal list-bin`."""
+    cmd = ["cabal", "list-bin", target]
+    if builddir:
+        cmd.insert(2, f"--builddir={builddir}")
+    return subprocess.check_output(cmd, text=True).strip().splitlines()[-1]
@@ -1,14 +1,20 @@
 import os
 import subprocess
-import requests
 import shutil
-from spu_helpers import clear_terminal, print_header, resolve_path
+import artifact_mirror
+import privileged
+from http_cache import GITHUB_API_HEADERS, cached_get
+from spu_helpers import VERSION_COMMAND_TIMEOUT, ask_user_to_continue, clear_terminal, print_header
+from spu_settings import load_settings
+from spu_trace import traced
 
 
-# === Load environment variables ===
-CNCLI_INSTALL_DIR = resolve_path("CNCLI_INSTALL_DIR")
-CNCLI_GITHUB_API = os.getenv("CNCLI_GITHUB_API", "https://api.github.com/repos/cardano-community/cncli/releases/latest")
-CNCLI_DOWNLOAD_BASE = os.getenv("CNCLI_DOWNLOAD_BASE", "https://github.com/cardano-community/cncli/releases/download/")
+# === Load settings ===
+settings = load_settings()
+
+CNCLI_INSTALL_DIR = settings.cncli_install_dir
+CNCLI_GITHUB_API = settings.cncli_github_api
+CNCLI_DOWNLOAD_BASE = settings.cncli_download_base
 
 def get_local_cncli_version():
     """Returns the locally installed CNCLI version (or None if not installed)."""
@@ -16,19 +22,17 @@ def get_local_cncli_version():
         print("⚠️  CNCLI is not installed or not in PATH.")
         return None
     try:
-        result = subprocess.run(["cncli", "-V"], capture_output=True, text=True, check=True)
+        result = subprocess.run(["cncli", "-V"], capture_output=True, text=True, check=True, timeout=VERSION_COMMAND_TIMEOUT)
         version = result.stdout.strip().split()[1].lstrip('v')
         return version
-    except (subprocess.CalledProcessError, IndexError):
+    except (subprocess.SubprocessError, IndexError):
         print("⚠️  Failed to detect CNCLI version.")
         return None
 
 def get_latest_cncli_version():
     """Fetches the latest CNCLI version and tag from GitHub."""
     try:
-        response = requests.get(CNCLI_GITHUB_API)
-        response.raise_for_status()
-        data = response.json()
+        data = cached_get(CNCLI_GITHUB_API, headers=GITHUB_API_HEADERS).json()
         tag = data["tag_name"]
         version = tag.lstrip('v')
         return version, tag
@@ -37,6 +41,7 @@ def get_latest_cncli_version():
         return None, None
 
 
+@traced("cncli update")
 def update_cncli(version, tag):
     """Downloads and installs the specified CNCLI binary to CNCLI_INSTALL_DIR."""
     print(f"⬇️  Installing CNCLI version {version}...")
@@ -45,15 +50,20 @@ def update_cncli(version, tag):
     local_path = f"/tmp/{filename}"
 
     try:
-        subprocess.run(["curl", "-sLJ", url, "-o", local_path], check=True)
-        subprocess.run(["sudo", "tar", "xzvf", local_path, "-C", CNCLI_INSTALL_DIR], check=True)
+        if not artifact_mirror.fetch("cncli", version, os.path.dirname(local_path), names=[filename]):
+            subprocess.run(["curl", "-fsSLJ", url, "-o", local_path], check=True)
+            subprocess.run(["tar", "tzf", local_path], check=True, stdout=subprocess.DEVNULL)
+            artifact_mirror.publish("cncli", version, {filename: local_path})
+        privileged.run("extract", local_path, CNCLI_INSTALL_DIR, "verbose")
         print("✅ CNCLI updated successfully.")
+        return True
     except subprocess.CalledProcessError as e:
         print(f"❌ Failed to update CNCLI: {e}")
+        return False
 
 
 def check_and_update_cncli():
-    """Main logic to compare and update CNCLI if a newer version is available."""
+    """Main logic to compare and update CNCLI if a newer version is available. Returns False on failure."""
     local_version = get_local_cncli_version()
     latest_version, latest_tag = get_latest_cncli_version()
     
@@ -64,13 +74,16 @@ def check_and_update_cncli():
     print(f"Local CNCLI version:  {local_version}")
     print(f"Latest CNCLI version: {latest_version}\n")
 
-    if local_version != latest_version and latest_version is not None:
-        answer = input("🆕 Do you want to install new version of CNCLI? [y/N]: ").strip().lower()
-        if answer == 'y':
-            update_cncli(latest_version, latest_tag)
+    ok = True
+    if latest_version is None:
+        ok = False
+    elif local_version != latest_version:
+        if ask_user_to_continue("🆕 Do you want to install new version of CNCLI?"):
+            ok = update_cncli(latest_version, latest_tag)
         else:
             print("➡️  Skipping CNCLI upgrade.")
     else:
         print("✅ CNCLI is up to date.")
 
     print("\n➡️  Returning to menu...")
+    return ok
@@ -1,17 +1,33 @@
 import os
-import requests
+import json
 import shutil
+import hashlib
+import requests
 import subprocess
-from dotenv import load_dotenv
-from spu_helpers import ask_user_to_continue, print_header, clear_terminal, resolve_path
+import tempfile
+import artifact_mirror
+from concurrent.futures import ThreadPoolExecutor
+from backup_store import BackupError, extract_file, load_snapshot, snapshot
+from json_diff import MISSING, apply_ops, diff_files, diff_values, format_path, load_json, merge_overrides, print_diff
+from node_process import start_service, stop_service
+from spu_http import get_session, stream_to_file
+from spu_helpers import ask_user_to_continue, is_unattended, print_header, clear_terminal
+from spu_settings import load_settings
+from spu_trace import inherit, traced
 
-load_dotenv()
+# === Load settings ===
+settings = load_settings()
 
-# === Load environment variables ===
-NODE_CONFIG_PATH = resolve_path("NODE_CONFIG_PATH")
-CARDANO_SERVICE_NAME = os.getenv("CARDANO_SERVICE_NAME", "cardano-node")
+NODE_CONFIG_PATH = settings.node_config_path
+CARDANO_SERVICE_NAME = settings.cardano_service_name
 CARDANO_CONFIG_URL_BASE = "https://book.play.dev.cardano.org/environments/mainnet"
-IS_BLOCK_PRODUCER = os.getenv("IS_BLOCK_PRODUCER", "false").lower() == "true"
+IS_BLOCK_PRODUCER = settings.is_block_producer
+STAGING_DIR = os.path.join(NODE_CONFIG_PATH, ".spu-staging")  # same filesystem, so replacing is a rename
+# Unmodified upstream copies of the config files, used to tell local edits from upstream changes
+BASELINE_DIR = os.path.join(NODE_CONFIG_PATH, ".spu-upstream")
+
+# Files whose local edits (e.g. block producer settings) are carried onto new upstream versions
+OVERRIDE_FILES = ("config.json", "config-bp.json")
 
 # === Filenames to update ===
 FILES_TO_UPDATE = [
@@ -36,66 +52,243 @@ def print_warning():
 
 def stop_cardano_node():
     print(f"🛑 Attempting to stop service {CARDANO_SERVICE_NAME}.service ...")
-    subprocess.run(["sudo", "systemctl", "stop", f"{CARDANO_SERVICE_NAME}.service"])
+    stop_service(CARDANO_SERVICE_NAME)
+
+def start_cardano_node():
+    print(f"🚀 Starting service {CARDANO_SERVICE_NAME}.service ...")
+    if start_service(CARDANO_SERVICE_NAME):
+        print("✅ Cardano node restarted.")
+        return True
+    print(f"❌ {CARDANO_SERVICE_NAME}.service did not start – check: journalctl -u {CARDANO_SERVICE_NAME}")
+    return False
 
-def backup_file(filepath):
-    if os.path.isfile(filepath):
-        backup_path = filepath + ".bak"
-        shutil.copy(filepath, backup_path)
-        print(f"🔄 Backed up {filepath} -> {backup_path}")
+def backup_files(filenames):
+    """Snapshot the current files into the backup store. Returns the snapshot id (or None)."""
+    snapshot_id = snapshot("config", NODE_CONFIG_PATH, filenames, label="before config update")
+    if snapshot_id:
+        print(f"🔄 Backed up {len(filenames)} file(s) as snapshot {snapshot_id}")
+    return snapshot_id
 
-def download_file(filename):
+def download_file(filename, session=None, directory=NODE_CONFIG_PATH):
+    """Stream a single config/genesis file into directory. Returns True on success."""
     url = f"{CARDANO_CONFIG_URL_BASE}/{filename}"
-    destination = os.path.join(NODE_CONFIG_PATH, filename)
-    print(f"⬇️  Downloading {filename} from:\n   {url}")
-    response = requests.get(url)
-    if response.status_code == 200:
-        with open(destination, "wb") as f:
-            f.write(response.content)
-        print(f"✅ Saved to {destination}")
-    else:
-        print(f"❌ Failed to download {filename} (HTTP {response.status_code})")
+    destination = os.path.join(directory, filename)
+    try:
+        size = stream_to_file(url, destination, session=session)
+        print(f"✅ {filename} saved to {destination} ({size} bytes)")
+        return True
+    except requests.HTTPError as e:
+        print(f"❌ Failed to download {filename} (HTTP {e.response.status_code})")
+    except requests.RequestException as e:
+        print(f"❌ Failed to download {filename}: {e}")
+    return False
+
+@traced("config download")
+def download_files(filenames, directory=NODE_CONFIG_PATH):
+    """Download all files concurrently over one pooled session. Returns {filename: ok}."""
+    session = get_session()
+    os.makedirs(directory, exist_ok=True)
+    print(f"⬇️  Downloading {len(filenames)} files from:\n   {CARDANO_CONFIG_URL_BASE}")
+    with ThreadPoolExecutor(max_workers=max(1, len(filenames))) as pool:
+        results = pool.map(inherit(lambda name: download_file(name, session=session, directory=directory)), filenames)
+        return dict(zip(filenames, results))
+
+def stage_upstream_files(filenames):
+    """
+    Put the upstream files into STAGING_DIR: from the LAN mirror if another host fetched them
+    recently, else downloaded (and published for the other hosts). Returns {filename: ok}.
+    """
+    network = os.path.basename(CARDANO_CONFIG_URL_BASE)
+    if artifact_mirror.fetch("config", network, STAGING_DIR, names=filenames, max_age=artifact_mirror.MIRROR_MAX_AGE):
+        return {name: True for name in filenames}
+    results = download_files(filenames, directory=STAGING_DIR)
+    downloaded = {name: os.path.join(STAGING_DIR, name) for name, ok in results.items() if ok}
+    if downloaded:
+        artifact_mirror.publish("config", network, downloaded, merge=True)
+    return results
+
+def file_digest(path):
+    """SHA-256 of a file, or None if it does not exist."""
+    if not os.path.isfile(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+@traced("config compare")
+def find_changed_files(filenames, staging_dir=STAGING_DIR):
+    """Compare staged downloads with the installed files by digest. Returns the names that differ."""
+    changed = []
+    for filename in filenames:
+        staged = file_digest(os.path.join(staging_dir, filename))
+        if staged is not None and staged != file_digest(os.path.join(NODE_CONFIG_PATH, filename)):
+            changed.append(filename)
+    return changed
+
+def _write_json(path, doc):
+    with open(path + ".tmp", "w") as f:
+        json.dump(doc, f, indent=2)
+        f.write("\n")
+    os.replace(path + ".tmp", path)
+
+def _choose_overrides(filename, local, upstream):
+    """Without a baseline, ask key by key which local values to keep."""
+    ops = diff_values(upstream, local)
+    if not ops:
+        return []
+    print(f"\nℹ️  No upstream baseline for {filename} yet – choose which local values to keep:")
+    keep = []
+    for op in ops:
+        _, path, upstream_value, local_value = op
+        print_diff([op])
+        label = "Keep your local value" if local_value is not MISSING else "Keep this key removed"
+        if ask_user_to_continue(f"   {label} for {format_path(path)}?", unattended_default=False):
+            keep.append(op)
+    return keep
+
+def carry_local_overrides(filename, staging_dir=STAGING_DIR):
+    """
+    Replay local edits of a config file onto the staged upstream version.
+    The untouched upstream file is kept as <name>.upstream in staging so it can become the next baseline.
+    An unattended run without a baseline stages the local file itself, so it is not replaced.
+    Returns True if that baseline may be saved even when the file is not installed: the carried
+    values came from an earlier baseline, were confirmed by the user, or the local file was kept.
+    """
+    local_path = os.path.join(NODE_CONFIG_PATH, filename)
+    staged_path = os.path.join(staging_dir, filename)
+    if not os.path.isfile(local_path):
+        return False
+    shutil.copy(staged_path, staged_path + ".upstream")
+    try:
+        local = load_json(local_path)
+        upstream = load_json(staged_path)
+        baseline_path = os.path.join(BASELINE_DIR, filename)
+        if os.path.isfile(baseline_path):
+            merged, carried, conflicts = merge_overrides(load_json(baseline_path), local, upstream)
+        elif is_unattended() and diff_values(upstream, local):
+            # Nobody can say which local values matter: keep the file, so the next run has a baseline
+            print(f"\n⚠️  No upstream baseline for {filename} yet – your local file was kept unchanged.")
+            print("   Run the config update interactively to review it against upstream.")
+            shutil.copy(local_path, staged_path)
+            return True
+        else:
+            carried = _choose_overrides(filename, local, upstream)
+            merged, conflicts = apply_ops(upstream, carried), []
+    except ValueError as e:
+        print(f"⚠️  {filename} is not valid JSON ({e}) – local edits are not carried over.")
+        return False
+
+    if carried:
+        print(f"\n🧷 Carrying {len(carried)} local setting(s) onto the new {filename}:")
+        print_diff(carried)
+        _write_json(staged_path, merged)
+    for _, path, _, _ in conflicts:
+        print(f"⚠️  Upstream also changed {format_path(path)} in {filename}; your local value was kept.")
+    return True
+
+def save_baselines(filenames, staging_dir=STAGING_DIR):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    for filename in filenames:
+        upstream = os.path.join(staging_dir, filename + ".upstream")
+        if os.path.isfile(upstream):
+            os.replace(upstream, os.path.join(BASELINE_DIR, filename))
+
+def review_changes(filenames, staging_dir=STAGING_DIR):
+    """
+    Print a key-level diff for each changed file and drop files whose JSON content is
+    identical (formatting-only changes). Returns the files that really change.
+    """
+    changed = []
+    for filename in filenames:
+        local_path = os.path.join(NODE_CONFIG_PATH, filename)
+        staged_path = os.path.join(staging_dir, filename)
+        if not os.path.isfile(local_path):
+            print(f"\n🆕 {filename}: new file")
+            changed.append(filename)
+            continue
+        try:
+            ops = diff_files(local_path, staged_path)
+        except ValueError:
+            print(f"\n🆕 {filename}: changed (not comparable as JSON)")
+            changed.append(filename)
+            continue
+        if not ops:
+            continue
+        print(f"\n🆕 {filename}: {len(ops)} key(s) differ")
+        print_diff(ops)
+        changed.append(filename)
+    return changed
+
+@traced("config install")
+def install_staged_files(filenames, staging_dir=STAGING_DIR):
+    for filename in filenames:
+        os.replace(os.path.join(staging_dir, filename), os.path.join(NODE_CONFIG_PATH, filename))
+        print(f"✅ {filename} updated")
 
-def compare_with_backup(filename):
-    original = os.path.join(NODE_CONFIG_PATH, filename + ".bak")
+def compare_with_backup(filename, snapshot_id):
     updated = os.path.join(NODE_CONFIG_PATH, filename)
-    if os.path.isfile(original) and os.path.isfile(updated):
+    try:
+        entry = next(e for e in load_snapshot(snapshot_id)["files"] if e["name"] == filename)
+    except (BackupError, StopIteration):
+        entry = None
+    if entry is None or not os.path.isfile(updated):
+        print(f"⚠️  Either {filename} or its backup not found – skipping diff.")
+        return
+    with tempfile.TemporaryDirectory(prefix="spu-diff-") as tmp_dir:
+        original = extract_file(entry, os.path.join(tmp_dir, f"{filename}.backup"))
         print(f"\n🔍 Launching vimdiff for {filename} and its backup...")
         subprocess.run(["vimdiff", original, updated])
-    else:
-        print(f"⚠️  Either {filename} or its backup not found – skipping diff.")
 
 def run_config_update():
+    """Stage, review and install upstream config files. Returns False if a download failed."""
     print_warning()
 
-    if not ask_user_to_continue("Do you want to continue with stopping the Cardano node?"):
-        print("\n⛔ Operation cancelled by user.")
-        return
+    config_file = "config-bp.json" if IS_BLOCK_PRODUCER else "config.json"
+    filenames = [config_file] + FILES_TO_UPDATE
 
-    stop_cardano_node()
+    # Fetch into staging and compare first – the node keeps running while nothing changed
+    print("📥 Downloading latest config and genesis files for comparison...")
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)
+    results = stage_upstream_files(filenames)
+    failed = [name for name, ok in results.items() if not ok]
+    if failed:
+        print(f"⚠️  {len(failed)} file(s) failed to download and will be left untouched: {', '.join(failed)}")
 
-    if ask_user_to_continue("\nDo you want to back up current config and genesis files (.bak)?"):
-        config_file = "config-bp.json" if IS_BLOCK_PRODUCER else "config.json"
-        FILES_TO_UPDATE.insert(0, config_file)
+    downloaded = [name for name, ok in results.items() if ok]
+    overridable = [name for name in downloaded if name in OVERRIDE_FILES]
+    # A baseline records upstream as last accepted: only save it for files that get installed or
+    # whose carried values were confirmed, or reverted upstream changes would count as local edits
+    confirmed = [name for name in overridable if carry_local_overrides(name)]
 
-        for filename in FILES_TO_UPDATE:
-            path = os.path.join(NODE_CONFIG_PATH, filename)
-            backup_file(path)
-    else:
-        print("⏭️  Skipping backup step.")
-        return
+    changed = review_changes(find_changed_files(downloaded))
+    if not changed:
+        save_baselines(confirmed)
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+        print("\n✅ All files match upstream – nothing to update, the node was not stopped.")
+        return not failed
 
-    if ask_user_to_continue("\nDo you want to download latest config and genesis files?"):
-        print("\n📥 Downloading latest config and genesis files ...")
-        for filename in FILES_TO_UPDATE:
-            download_file(filename)
-    else:
-        print("⏭️  Skipping download of new config files.")
-        return
+    if not ask_user_to_continue("\nDo you want to stop the Cardano node, back up and replace these files?"):
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+        print("\n⛔ Operation cancelled by user.")
+        return True
+    # Decided up front so an unattended run never leaves the node down after the install
+    restart = ask_user_to_continue("Restart the Cardano node right after the files are replaced?")
 
-    if not ask_user_to_continue("\nDo you want to compare the new files with their backups using vimdiff?"):
+    snapshot_id = backup_files(changed)
+    stop_cardano_node()
+    try:
+        install_staged_files(changed)
+        save_baselines([name for name in overridable if name in changed or name in confirmed])
+    finally:
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+        started = restart and start_cardano_node()
+    ok = not failed and (started or not restart)
+
+    if not ask_user_to_continue("\nDo you also want to review the files line by line in vimdiff?", unattended_default=False):
         print("🔙 Skipping comparison and returning to main menu.")
-        return
+        return ok
 
     print("\n🧪 Ready to compare new config files with backups using vimdiff.")
     print("👉 Each file will open one-by-one in the editor.")
@@ -110,7 +303,11 @@ def run_config_update():
 """)
     input("Press Enter to begin comparing files...")
 
-    for filename in FILES_TO_UPDATE:
-        compare_with_backup(filename)
+    for filename in changed:
+        compare_with_backup(filename, snapshot_id)
 
-    print("\n✅ Configuration update completed. Please review diffs above and start the node when ready.")
+    if restart:
+        print("\n✅ Configuration update completed. Restart the node again if you changed anything in vimdiff.")
+    else:
+        print("\n✅ Configuration update completed. Please review diffs above and start the node when ready.")
+    return ok
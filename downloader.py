@@ -0,0 +1,355 @@
+import os
+import json
+import time
+import hashlib
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import urllib3
+from spu_http import DOWNLOAD_CHUNK_SIZE, HTTP_TIMEOUT, get_session
+from spu_settings import load_settings
+from spu_trace import current_span, traced
+
+# === Downloader settings ===
+DOWNLOAD_SEGMENTS = load_settings().download_segments
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+STATE_FLUSH_BYTES = 8 * 1024 * 1024
+HASH_READ_SIZE = 1024 * 1024
+
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed or fails verification."""
+
+
+def _mib(n):
+    return n / (1024 * 1024)
+
+
+def probe_download(url, session=None):
+    """Resolve redirects and return (final_url, size, accepts_ranges, etag)."""
+    session = session or get_session()
+    response = session.head(url, allow_redirects=True, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    size = response.headers.get("Content-Length")
+    accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    return response.url, int(size) if size and size.isdigit() else None, accepts_ranges, response.headers.get("ETag")
+
+
+def _split_segments(size, count):
+    count = max(1, min(count, size // MIN_SEGMENT_SIZE or 1))
+    step = size // count
+    segments = []
+    for i in range(count):
+        start = i * step
+        end = size - 1 if i == count - 1 else start + step - 1
+        segments.append([start, end, 0])
+    return segments
+
+
+def _load_state(state_path, url, size, etag):
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("url") != url or state.get("size") != size or state.get("etag") != etag:
+        return None
+    return state
+
+
+class _SegmentedTransfer:
+    """Shared state between segment workers, the hasher and the state file."""
+
+    def __init__(self, part_path, state_path, state):
+        self.part_path = part_path
+        self.state_path = state_path
+        self.state = state
+        self.segments = state["segments"]
+        self.cond = threading.Condition()
+        self.failed = False
+        self.fetched = 0
+        self._unflushed = 0
+
+    def save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def advance(self, index, nbytes):
+        with self.cond:
+            self.segments[index][2] += nbytes
+            self.fetched += nbytes
+            self._unflushed += nbytes
+            if self._unflushed >= STATE_FLUSH_BYTES:
+                self._unflushed = 0
+                self.save_state()
+            self.cond.notify_all()
+
+    def fail(self):
+        with self.cond:
+            self.failed = True
+            self.save_state()
+            self.cond.notify_all()
+
+    def fetch_segment(self, session, url, etag, index):
+        start, end, done = self.segments[index]
+        if start + done > end:
+            return
+        headers = {"Range": f"bytes={start + done}-{end}"}
+        if etag:
+            headers["If-Range"] = etag
+        fd = os.open(self.part_path, os.O_WRONLY)
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=HTTP_TIMEOUT) as response:
+                if response.status_code != 206:
+                    raise DownloadError(f"server ignored range request (HTTP {response.status_code})")
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if self.failed:
+                        return
+                    if not chunk:
+                        continue
+                    offset = start + self.segments[index][2]
+                    if offset + len(chunk) > end + 1:
+                        raise DownloadError("server sent more data than requested")
+                    os.pwrite(fd, chunk, offset)
+                    self.advance(index, len(chunk))
+            if start + self.segments[index][2] <= end:
+                raise DownloadError(f"segment {index} ended early")
+        finally:
+            os.close(fd)
+
+    def hash_in_order(self):
+        """Follow the write frontier segment by segment, hashing bytes while they arrive."""
+        digest = hashlib.sha256()
+        fd = os.open(self.part_path, os.O_RDONLY)
+        try:
+            for segment in self.segments:
+                start, end = segment[0], segment[1]
+                pos = start
+                while pos <= end:
+                    with self.cond:
+                        while not self.failed and start + segment[2] <= pos:
+                            self.cond.wait()
+                        if self.failed:
+                            return None
+                        available = start + segment[2]
+                    while pos < available:
+                        data = os.pread(fd, min(HASH_READ_SIZE, available - pos), pos)
+                        if not data:
+                            break
+                        digest.update(data)
+                        pos += len(data)
+            return digest.hexdigest()
+        finally:
+            os.close(fd)
+
+
+def _download_single(session, url, part_path):
+    """Fallback for servers without range support: one stream, hashed inline."""
+    digest = hashlib.sha256()
+    fetched = 0
+    with session.get(url, stream=True, timeout=HTTP_TIMEOUT) as response:
+        response.raise_for_status()
+        with open(part_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    digest.update(chunk)
+                    fetched += len(chunk)
+    return digest.hexdigest(), fetched
+
+
+@traced("segmented download")
+def download_segmented(url, destination, expected_sha256=None, segments=DOWNLOAD_SEGMENTS, session=None):
+    """
+    Download url to destination using concurrent HTTP Range segments.
+    Progress is kept in <destination>.part and <destination>.part.json, so an
+    interrupted download resumes where each segment stopped. The SHA-256 is
+    computed while bytes arrive and checked against expected_sha256 if given.
+    Returns a dict with path, sha256, size, fetched bytes and elapsed seconds.
+    """
+    session = session or get_session()
+    part_path = destination + ".part"
+    state_path = destination + ".part.json"
+    started = time.monotonic()
+
+    try:
+        final_url, size, accepts_ranges, etag = probe_download(url, session)
+    except requests.RequestException as e:
+        raise DownloadError(f"failed to probe {url}: {e}") from e
+
+    resumed = 0
+    try:
+        if not size or not accepts_ranges:
+            print("ℹ️  Server does not support range requests – using a single connection.")
+            sha256, fetched = _download_single(session, final_url, part_path)
+            size = os.path.getsize(part_path)
+            connections = 1
+        else:
+            state = _load_state(state_path, url, size, etag)
+            if state and os.path.exists(part_path) and os.path.getsize(part_path) == size:
+                resumed = sum(done for _, _, done in state["segments"])
+                print(f"⏯️  Resuming download ({_mib(resumed):.1f} of {_mib(size):.1f} MiB already on disk)")
+            else:
+                state = {"url": url, "size": size, "etag": etag, "segments": _split_segments(size, segments)}
+                with open(part_path, "wb") as f:
+                    f.truncate(size)
+
+            transfer = _SegmentedTransfer(part_path, state_path, state)
+            transfer.save_state()
+            connections = len(state["segments"])
+            with ThreadPoolExecutor(max_workers=len(state["segments"]) + 1) as pool:
+                hasher = pool.submit(transfer.hash_in_order)
+                workers = [
+                    pool.submit(transfer.fetch_segment, session, final_url, etag, i)
+                    for i in range(len(state["segments"]))
+                ]
+                try:
+                    for worker in workers:
+                        worker.result()
+                except BaseException:
+                    transfer.fail()
+                    raise
+                sha256 = hasher.result()
+            fetched = transfer.fetched
+    except (requests.RequestException, OSError) as e:
+        raise DownloadError(f"download of {url} interrupted: {e} (rerun to resume)") from e
+
+    if expected_sha256 and sha256 != expected_sha256.lower():
+        for path in (part_path, state_path):
+            if os.path.exists(path):
+                os.unlink(path)
+        raise DownloadError(f"SHA-256 mismatch for {url}: expected {expected_sha256}, got {sha256}")
+
+    os.replace(part_path, destination)
+    if os.path.exists(state_path):
+        os.unlink(state_path)
+
+    elapsed = time.monotonic() - started
+    rate = _mib(fetched) / elapsed if elapsed > 0 else 0.0
+    print(f"📊 {_mib(fetched):.1f} MiB in {elapsed:.1f}s ({rate:.1f} MiB/s) over {connections} connection(s)"
+          + (f", {_mib(resumed):.1f} MiB resumed" if resumed else ""))
+    print(f"🔐 SHA-256: {sha256}" + (" (verified)" if expected_sha256 else ""))
+    current_span().bytes = fetched
+
+    return {
+        "path": destination,
+        "sha256": sha256,
+        "size": size,
+        "fetched": fetched,
+        "resumed": resumed,
+        "elapsed": elapsed,
+    }
+
+
+class _HashingReader:
+    """File-like wrapper that hashes and counts every byte read through it (and copies it to sink, if given)."""
+
+    def __init__(self, raw, sink=None):
+        self.raw = raw
+        self.sink = sink
+        self.digest = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.digest.update(data)
+        self.bytes_read += len(data)
+        if self.sink:
+            self.sink.write(data)
+        return data
+
+    def drain(self):
+        while self.read(DOWNLOAD_CHUNK_SIZE):
+            pass
+
+
+def _member_name(name):
+    return name[2:] if name.startswith("./") else name
+
+
+def extract_members(fileobj, members, staging_dir, mode="r|gz"):
+    """
+    Read a tar stream sequentially and write only the wanted members into staging_dir.
+    Returns {member: staged_path}; raises DownloadError if a member is missing.
+    """
+    os.makedirs(staging_dir, exist_ok=True)
+    wanted = {_member_name(m) for m in members}
+    staged = {}
+    with tarfile.open(fileobj=fileobj, mode=mode) as archive:
+        for member in archive:
+            name = _member_name(member.name)
+            if name not in wanted or not member.isfile():
+                continue
+            destination = os.path.join(staging_dir, os.path.basename(name))
+            source = archive.extractfile(member)
+            with open(destination + ".part", "wb") as f:
+                while True:
+                    chunk = source.read(DOWNLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+            os.chmod(destination + ".part", member.mode & 0o777 or 0o755)
+            os.replace(destination + ".part", destination)
+            staged[name] = destination
+            print(f"📦 Extracted {name} ({_mib(member.size):.1f} MiB)")
+    missing = wanted - set(staged)
+    if missing:
+        raise DownloadError(f"archive does not contain: {', '.join(sorted(missing))}")
+    return staged
+
+
+def _discard_partial(members, staging_dir, archive_part):
+    """Remove whatever a failed stream_extract left behind: staged members, their .part files and the archive copy."""
+    paths = [os.path.join(staging_dir, os.path.basename(_member_name(m))) for m in members]
+    for path in [*paths, *(p + ".part" for p in paths), archive_part]:
+        if path and os.path.exists(path):
+            os.unlink(path)
+
+
+@traced("streaming extract")
+def stream_extract(url, members, staging_dir, expected_sha256=None, session=None, keep_archive=None):
+    """
+    Download a .tar.gz and extract only the given members while it streams in.
+    Nothing but the selected members touches the disk (unless keep_archive names a
+    path to keep the archive at); the archive's SHA-256 is computed on the fly and
+    checked against expected_sha256 before returning. Returns {member: staged_path}.
+    """
+    session = session or get_session()
+    started = time.monotonic()
+    sink = open(keep_archive + ".part", "wb") if keep_archive else None
+    complete = False
+    try:
+        try:
+            with session.get(url, stream=True, timeout=HTTP_TIMEOUT) as response:
+                response.raise_for_status()
+                response.raw.decode_content = False
+                reader = _HashingReader(response.raw, sink)
+                staged = extract_members(reader, members, staging_dir)
+                reader.drain()
+        # Reading response.raw directly surfaces urllib3 errors (e.g. a connection cut mid-body) unwrapped
+        except (requests.RequestException, urllib3.exceptions.HTTPError, tarfile.TarError, OSError) as e:
+            raise DownloadError(f"streaming extraction of {url} failed: {e}") from e
+
+        sha256 = reader.digest.hexdigest()
+        if expected_sha256 and sha256 != expected_sha256.lower():
+            raise DownloadError(f"SHA-256 mismatch for {url}: expected {expected_sha256}, got {sha256}")
+        if sink:
+            sink.close()
+            os.replace(sink.name, keep_archive)
+        complete = True
+    finally:
+        if sink:
+            sink.close()
+        if not complete:
+            _discard_partial(members, staging_dir, sink.name if sink else None)
+
+    elapsed = time.monotonic() - started
+    rate = _mib(reader.bytes_read) / elapsed if elapsed > 0 else 0.0
+    print(f"📊 Streamed {_mib(reader.bytes_read):.1f} MiB in {elapsed:.1f}s ({rate:.1f} MiB/s), "
+          f"wrote {_mib(sum(os.path.getsize(p) for p in staged.values())):.1f} MiB")
+    print(f"🔐 SHA-256: {sha256}" + (" (verified)" if expected_sha256 else ""))
+    current_span().bytes = reader.bytes_read
+    return staged
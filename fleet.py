@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from spu_helpers import ask_user_to_continue, clear_terminal, print_header, spu_cache_dir
+from spu_settings import SettingsError, load_settings
+
+# === Fleet settings ===
+try:
+    settings = load_settings()
+except SettingsError as e:
+    # Imported from the menu the .env was already validated; run as a script, report it here
+    if __name__ != "__main__":
+        raise
+    print(f"❌ {e}")
+    sys.exit(2)
+
+FLEET_INVENTORY = settings.fleet_inventory
+FLEET_STEPS = ["libs", "config", "cncli", "gliveview", "node", "rollback"]
+# Steps that stop the node; a host running any of them is only done once the health step finds its node up
+NODE_STEPS = ("config", "node", "rollback")
+HEALTH_STEP = "health"
+DEFAULT_SPU_DIR = "~/Stake_Pool_Updater"
+STEP_TIMEOUT = settings.fleet_step_timeout
+
+# Command run inside the SPU checkout on each host
+REMOTE_STEP_COMMAND = (
+    "if [ -x venv/bin/python3 ]; then PY=venv/bin/python3; else PY=python3; fi; "
+    "SPU_ASSUME_YES=1 SPU_NODE_INSTALL_METHOD={method} {mirror}\"$PY\" stake_pool_updater.py --run {step} --yes"
+)
+
+
+# === Transports ===
+class Transport:
+    """Runs a shell command in a host's SPU directory. Subclasses implement the channel."""
+
+    def __init__(self, host):
+        self.host = host
+
+    def argv(self, command):
+        raise NotImplementedError
+
+    def run(self, command, log, timeout=STEP_TIMEOUT):
+        """Run command, streaming its output into log. Returns the exit status."""
+        try:
+            result = subprocess.run(
+                self.argv(command),
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                timeout=timeout,
+            )
+            return result.returncode
+        except subprocess.TimeoutExpired:
+            log.write(f"\n[fleet] timed out after {timeout}s\n".encode())
+            return 124
+        except OSError as e:
+            log.write(f"\n[fleet] transport error: {e}\n".encode())
+            return 255
+
+
+class LocalTransport(Transport):
+    """Executes on this machine; a stand-in for remote hosts when testing fleet runs."""
+
+    def argv(self, command):
+        spu_dir = os.path.expanduser(self.host["spu_dir"])
+        return ["bash", "-c", f"cd {shlex.quote(spu_dir)} && {command}"]
+
+
+def _remote_path(path):
+    """Quote path for the remote shell, leaving a leading ~/ unquoted so it still expands there."""
+    if path == "~":
+        return path
+    if path.startswith("~/"):
+        return "~/" + shlex.quote(path[2:])
+    return shlex.quote(path)
+
+
+class SshTransport(Transport):
+    """Executes over ssh in batch mode (key-based login and passwordless sudo are required)."""
+
+    def argv(self, command):
+        remote = f"cd {_remote_path(self.host['spu_dir'])} && {command}"
+        return ["ssh", "-o", "BatchMode=yes", *self.host.get("ssh_options", []), self.host["address"], remote]
+
+
+TRANSPORTS = {
+    "local": LocalTransport,
+    "ssh": SshTransport,
+}
+
+
+# === Inventory ===
+def load_inventory(path=None):
+    """
+    Load hosts from a JSON inventory:
+    {"defaults": {...}, "hosts": [{"name": "relay1", "role": "relay", "address": "user@10.0.0.1"}, ...]}
+    Every host gets role (relay|bp), transport, spu_dir and method filled from defaults;
+    an optional mirror sets SPU_MIRROR for the steps run on that host.
+    """
+    path = path or FLEET_INVENTORY
+    with open(path) as f:
+        data = json.load(f)
+
+    defaults = {"transport": "ssh", "spu_dir": DEFAULT_SPU_DIR, "role": "relay", "method": "1"}
+    defaults.update(data.get("defaults", {}))
+    hosts = []
+    for entry in data.get("hosts", []):
+        host = dict(defaults, **entry)
+        if "name" not in host:
+            raise ValueError(f"inventory host without a name: {entry}")
+        if host["role"] not in ("relay", "bp"):
+            raise ValueError(f"{host['name']}: role must be 'relay' or 'bp'")
+        if host["transport"] not in TRANSPORTS:
+            raise ValueError(f"{host['name']}: unknown transport '{host['transport']}'")
+        if host["transport"] != "local" and "address" not in host:
+            raise ValueError(f"{host['name']}: address is required for transport '{host['transport']}'")
+        hosts.append(host)
+    return hosts
+
+
+# === Execution ===
+def run_host(host, steps, run_dir):
+    """Run steps one after another on a host; stop at the first failing step."""
+    transport = TRANSPORTS[host["transport"]](host)
+    log_path = os.path.join(run_dir, f"{host['name']}.log")
+    result = {"host": host["name"], "role": host["role"], "ok": True, "log": log_path, "steps": []}
+
+    with open(log_path, "wb") as log:
+        for step in steps:
+            print(f"▶️  [{host['name']}] {step} ...")
+            log.write(f"\n===== {step} =====\n".encode())
+            log.flush()
+            started = time.monotonic()
+            # The host's mirror (a directory on the publishing host, the mirror URL elsewhere) overrides its .env
+            mirror = f"SPU_MIRROR={shlex.quote(host['mirror'])} " if host.get("mirror") else ""
+            command = REMOTE_STEP_COMMAND.format(step=step, method=host["method"], mirror=mirror)
+            status = transport.run(command, log)
+            elapsed = time.monotonic() - started
+            result["steps"].append({"step": step, "exit_status": status, "seconds": round(elapsed, 1)})
+            if status != 0:
+                result["ok"] = False
+                print(f"❌ [{host['name']}] {step} failed (exit {status}) after {elapsed:.0f}s – see {log_path}")
+                break
+            print(f"✅ [{host['name']}] {step} done in {elapsed:.0f}s")
+    return result
+
+
+def run_fleet(hosts, steps, max_relays_down=1, halt_on_failure=True):
+    """
+    Rolling run: relays first, at most max_relays_down at a time, block producer(s) last.
+    After steps that stop the node, a host only counts as done once its node is running
+    again, so the next relay never goes down while this one is still down.
+    With halt_on_failure, no new host is started after any failure (the BP is never
+    touched if a relay failed). Returns the list of per-host results.
+    """
+    if any(step in NODE_STEPS for step in steps):
+        steps = [*steps, HEALTH_STEP]
+    run_id = time.strftime("%Y%m%d-%H%M%S")
+    run_dir = spu_cache_dir("fleet", run_id)
+    relays = [h for h in hosts if h["role"] == "relay"]
+    producers = [h for h in hosts if h["role"] == "bp"]
+    results = []
+    halted = False
+
+    print(f"🚦 Rolling run {run_id}: {len(relays)} relay(s), at most {max_relays_down} at a time, then {len(producers)} BP(s)")
+
+    pending = list(relays)
+    with ThreadPoolExecutor(max_workers=max(1, max_relays_down)) as pool:
+        running = {}
+        while pending or running:
+            while pending and len(running) < max_relays_down and not halted:
+                host = pending.pop(0)
+                running[pool.submit(run_host, host, steps, run_dir)] = host
+            if not running:
+                break
+            done = next(as_completed(running))
+            running.pop(done)
+            result = done.result()
+            results.append(result)
+            if not result["ok"] and halt_on_failure:
+                halted = True
+
+    for host in pending:
+        results.append({"host": host["name"], "role": host["role"], "ok": False, "skipped": True, "steps": []})
+
+    for host in producers:
+        if halted:
+            results.append({"host": host["name"], "role": host["role"], "ok": False, "skipped": True, "steps": []})
+            continue
+        result = run_host(host, steps, run_dir)
+        results.append(result)
+        if not result["ok"] and halt_on_failure:
+            halted = True
+
+    report_path = os.path.join(run_dir, "report.json")
+    with open(report_path, "w") as f:
+        json.dump({"run_id": run_id, "steps": steps, "results": results}, f, indent=2)
+    print_report(results, steps)
+    print(f"\n📝 Report: {report_path}")
+    return results
+
+
+def print_report(results, steps):
+    print()
+    print_header("Fleet results")
+    print(f"{'Host':<20} {'Role':<6} " + " ".join(f"{step:<10}" for step in steps))
+    for result in results:
+        by_step = {s["step"]: s for s in result["steps"]}
+        cells = []
+        for step in steps:
+            entry = by_step.get(step)
+            if entry is None:
+                cells.append("skipped" if result.get("skipped") or not result["ok"] else "-")
+            elif entry["exit_status"] == 0:
+                cells.append(f"ok {entry['seconds']:.0f}s")
+            else:
+                cells.append(f"FAIL({entry['exit_status']})")
+        print(f"{result['host']:<20} {result['role']:<6} " + " ".join(f"{cell:<10}" for cell in cells))
+
+
+def _parse_steps(text):
+    steps = [s.strip() for s in text.split(",") if s.strip()]
+    unknown = [s for s in steps if s not in FLEET_STEPS]
+    if unknown:
+        raise ValueError(f"unknown step(s): {', '.join(unknown)} (choose from {', '.join(FLEET_STEPS)})")
+    return steps
+
+
+# === Interactive entry point ===
+def run_fleet_menu():
+    clear_terminal()
+    print_header("Fleet mode")
+    print()
+
+    path = input(f"Inventory file [{FLEET_INVENTORY}]: ").strip() or FLEET_INVENTORY
+    try:
+        hosts = load_inventory(path)
+    except (OSError, ValueError) as e:
+        print(f"❌ Failed to load inventory: {e}")
+        return
+
+    for host in hosts:
+        print(f" - {host['name']:<20} {host['role']:<6} via {host['transport']}")
+
+    try:
+        steps = _parse_steps(input(f"\nSteps to run, comma separated ({', '.join(FLEET_STEPS)}) [node]: ") or "node")
+        max_down = int(input("Maximum relays down at the same time [1]: ").strip() or "1")
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+
+    if not ask_user_to_continue(f"\nRun {', '.join(steps)} on {len(hosts)} host(s), block producer last?"):
+        print("⛔ Fleet run cancelled.")
+        return
+    run_fleet(hosts, steps, max_relays_down=max(1, max_down))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SPU steps across a fleet of relays and block producers")
+    parser.add_argument("--inventory", default=FLEET_INVENTORY, help="JSON inventory file")
+    parser.add_argument("--steps", default="node", help=f"comma separated steps ({', '.join(FLEET_STEPS)})")
+    parser.add_argument("--max-relays-down", type=int, default=1, help="relays upgraded at the same time")
+    parser.add_argument("--continue-on-failure", action="store_true", help="keep going after a host fails")
+    args = parser.parse_args()
+
+    try:
+        hosts = load_inventory(args.inventory)
+        steps = _parse_steps(args.steps)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        return 2
+    results = run_fleet(hosts, steps, max_relays_down=max(1, args.max_relays_down),
+                        halt_on_failure=not args.continue_on_failure)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
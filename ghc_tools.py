@@ -1,21 +1,137 @@
 import os
-import requests
-import subprocess
+import re
+import json
+import time
 import html
-from bs4 import BeautifulSoup
-from spu_helpers import ask_user_to_continue, clear_terminal, print_header
+import subprocess
+from http_cache import cached_get
+from spu_helpers import VERSION_COMMAND_TIMEOUT, ask_user_to_continue, clear_terminal, print_header, spu_cache_dir, version_tuple
+from spu_settings import load_settings
+
+# === Load settings ===
+settings = load_settings()
+
+CARDANO_INSTALL_GUIDE = settings.cardano_install_guide
+CARDANO_SOURCE_DIR = settings.cardano_source_dir
+DOCS_RESULT_TTL = 24 * 3600   # seconds a version pair scraped from the docs page is reused
+
+# Toolchain pins in the cardano-node source tree
+WITH_COMPILER_RE = re.compile(r"^\s*with-compiler:\s*ghc-([\d.]+)", re.MULTILINE)
+NIX_COMPILER_RE = re.compile(r'(?:defaultCompiler|compiler-nix-name)\s*=\s*"ghc(\d{3,5})"')
+CI_MATRIX_RE = r"^\s*{key}:\s*\[([^\]]*)\]"
+GHC_MAJOR_VERSIONS = ("8", "9")  # nix compiler names are only decoded for these; released series have even minors
+
+
+def _cache_path():
+    return os.path.join(spu_cache_dir("toolchain"), "required.json")
+
+
+def _load_cache():
+    try:
+        with open(_cache_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    path = _cache_path()
+    with open(path + ".tmp", "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _git(*args):
+    try:
+        result = subprocess.run(["git", "-C", CARDANO_SOURCE_DIR, *args], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def _resolve_local_ref(tag):
+    """A commit for tag in the local source checkout (with or without 'v'), else HEAD if there is no tag."""
+    if not os.path.isdir(os.path.join(CARDANO_SOURCE_DIR or "", ".git")):
+        return None
+    if not tag:
+        return "HEAD"
+    bare = tag.lstrip("v")
+    for candidate in (tag, bare, f"v{bare}"):
+        if _git("rev-parse", "--verify", "-q", f"{candidate}^{{commit}}"):
+            return candidate
+    return None
+
+
+def _source_files(ref):
+    """(path, text) for cabal.project, nix files and CI workflows at ref, read straight from git."""
+    listing = _git("ls-tree", "-r", "--name-only", ref, "--", "cabal.project", "flake.nix", "nix", ".github/workflows") or ""
+    for path in listing.splitlines():
+        if path == "cabal.project" or path.endswith((".nix", ".yml", ".yaml")):
+            text = _git("show", f"{ref}:{path}")
+            if text:
+                yield path, text
+
+
+def _nix_version(digits):
+    """
+    ghc966 -> 9.6.6, ghc9102 -> 9.10.2. The name has no separators, so it is decoded only
+    if exactly one split gives a known GHC series; otherwise None.
+    """
+    major, rest = digits[0], digits[1:]
+    if major not in GHC_MAJOR_VERSIONS:
+        return None
+    candidates = []
+    for minor, patch in ((rest[:1], rest[1:]), (rest[:2], rest[2:])):
+        # no leading zeros, so "9061" cannot also read as 9.06.1
+        if patch and str(int(minor)) == minor and str(int(patch)) == patch and int(minor) % 2 == 0:
+            candidates.append(f"{major}.{minor}.{patch}")
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def _ci_minimum(text, key):
+    match = re.search(CI_MATRIX_RE.format(key=key), text, re.MULTILINE)
+    if not match:
+        return None
+    versions = re.findall(r"[\d][\d.]*", match.group(1))
+    return min(versions, key=version_tuple) if versions else None
+
+
+def parse_toolchain_pins(files):
+    """
+    Derive (ghc, cabal, source) from source files. GHC: with-compiler in cabal.project,
+    then the lowest version in the CI matrix, then the nix default compiler. Cabal: the CI matrix.
+    """
+    ghc = cabal = None
+    sources = []
+    ghc_rank = 99
+    for path, text in files:
+        found = WITH_COMPILER_RE.search(text) if path == "cabal.project" else None
+        if found and ghc_rank > 0:
+            ghc, ghc_rank = found.group(1), 0
+            sources.append(path)
+        found = NIX_COMPILER_RE.search(text) if path.endswith(".nix") else None
+        nix_ghc = _nix_version(found.group(1)) if found else None
+        if nix_ghc and ghc_rank > 2:
+            ghc, ghc_rank = nix_ghc, 2
+            sources.append(path)
+        if path.endswith((".yml", ".yaml")):
+            ci_ghc = _ci_minimum(text, "ghc")
+            if ci_ghc and ghc_rank > 1:
+                ghc, ghc_rank = ci_ghc, 1
+                sources.append(path)
+            ci_cabal = _ci_minimum(text, "cabal")
+            if ci_cabal and (cabal is None or version_tuple(ci_cabal) < version_tuple(cabal)):
+                cabal = ci_cabal
+                sources.append(path)
+    return ghc, cabal, ", ".join(dict.fromkeys(sources))
 
-# === Load variables ===
-CARDANO_INSTALL_GUIDE = os.getenv(
-    "CARDANO_INSTALL_GUIDE",
-    "https://developers.cardano.org/docs/operate-a-stake-pool/node-operations/installing-cardano-node"
-)
 
 def get_required_versions_official():
     """Scrapes Cardano install docs for required GHC and Cabal versions."""
+    from bs4 import BeautifulSoup
+
     try:
-        response = requests.get(CARDANO_INSTALL_GUIDE)
-        response.raise_for_status()
+        response = cached_get(CARDANO_INSTALL_GUIDE)
 
         soup = BeautifulSoup(response.text, 'html.parser')
         code_blocks = soup.find_all("code")
@@ -44,20 +160,89 @@ def get_required_versions_official():
         return "unknown", "unknown"
 
 
+def _latest_node_tag():
+    from node_updater import fetch_latest_version
+
+    return fetch_latest_version()
+
+
+def get_required_versions(tag=None):
+    """
+    Required (ghc, cabal, source) for building cardano-node tag (default: latest release).
+    Pins from the local source checkout are used first and cached per tag; otherwise the
+    docs page is scraped and its result cached for DOCS_RESULT_TTL.
+    """
+    tag = tag or _latest_node_tag()
+    cache = _load_cache()
+
+    pinned = cache.get("pins", {}).get(tag) if tag else None
+    if pinned:
+        return pinned["ghc"], pinned["cabal"], pinned["source"]
+
+    ref = _resolve_local_ref(tag)
+    if ref:
+        ghc, cabal, source = parse_toolchain_pins(_source_files(ref))
+        if ghc and cabal:
+            source = f"{CARDANO_SOURCE_DIR} @ {ref} ({source})"
+            if tag and ref != "HEAD":
+                cache.setdefault("pins", {})[tag] = {"ghc": ghc, "cabal": cabal, "source": source}
+                _save_cache(cache)
+            return ghc, cabal, source
+
+    docs = cache.get("docs")
+    if docs and time.time() - docs["fetched_at"] < DOCS_RESULT_TTL:
+        return docs["ghc"], docs["cabal"], f"{CARDANO_INSTALL_GUIDE} (cached)"
+
+    ghc, cabal = get_required_versions_official()
+    if ghc != "unknown" and cabal != "unknown":
+        cache["docs"] = {"ghc": ghc, "cabal": cabal, "fetched_at": time.time()}
+        _save_cache(cache)
+    elif docs:
+        return docs["ghc"], docs["cabal"], f"{CARDANO_INSTALL_GUIDE} (stale cache)"
+    return ghc, cabal, CARDANO_INSTALL_GUIDE
+
+
+def get_installed_tool_version(tool):
+    """Returns the version reported by `<tool> --numeric-version` (ghc, cabal), or None."""
+    try:
+        result = subprocess.run([tool, "--numeric-version"], capture_output=True, text=True,
+                                check=True, timeout=VERSION_COMMAND_TIMEOUT)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def meets_requirement(installed, required):
+    """True/False when both versions are known, None otherwise."""
+    if not installed or required in (None, "unknown"):
+        return None
+    return version_tuple(installed) >= version_tuple(required)
+
+
 def prompt_for_ghcup_tui():
-    """Displays required versions and optionally launches ghcup tui."""
+    """Displays required vs installed versions and offers ghcup tui only when something is missing. Returns True."""
 
     clear_terminal()
     print_header ("Check required GHC/Cabal & launch ghcup tui")
     print()
 
-    ghc, cabal = get_required_versions_official()
+    ghc, cabal, source = get_required_versions()
+
+    print(f"📌 Required versions (from {source}):")
+    outdated = False
+    for label, tool, required in (("GHC:  ", "ghc", ghc), ("Cabal:", "cabal", cabal)):
+        installed = get_installed_tool_version(tool)
+        ok = meets_requirement(installed, required)
+        mark = {True: "✅", False: "⚠️ ", None: "❔"}[ok]
+        print(f"\n   {label} >= {required}  installed: {installed or 'none'} {mark}")
+        outdated = outdated or ok is not True
 
-    print("📌 Required versions from official Cardano documentation:")
-    print(f"\n   GHC:   >= {ghc}")
-    print(f"   Cabal: >= {cabal}")
+    if not outdated:
+        print("\n✅ Installed GHC and Cabal meet the requirements.")
+        return True
 
-    if ask_user_to_continue("\n🛠️  Do you want to launch ghcup tui to install them?"):
+    if ask_user_to_continue("\n🛠️  Do you want to launch ghcup tui to install them?", unattended_default=False):
         subprocess.run(["ghcup", "tui"])
     else:
-        print("\n➡️  Skipping ghcup tui.")
\ No newline at end of file
+        print("\n➡️  Skipping ghcup tui.")
+    return True
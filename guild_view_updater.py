@@ -1,15 +1,16 @@
 import os
 import subprocess
-import shutil
-import requests
 import re
-from dotenv import load_dotenv
-from spu_helpers import ask_user_to_continue, clear_terminal, print_header, resolve_path
+import artifact_mirror
+from backup_store import snapshot
+from http_cache import cached_get
+from spu_helpers import VERSION_COMMAND_TIMEOUT, ask_user_to_continue, clear_terminal, print_header
+from spu_settings import load_settings
 
-# === Load environment variables ===
-load_dotenv()
+# === Load settings ===
+settings = load_settings()
 
-GLIVEVIEW_DIR = resolve_path("GLIVEVIEW_DIR")
+GLIVEVIEW_DIR = settings.gliveview_dir
 GLV_SCRIPT = os.path.join(GLIVEVIEW_DIR, "gLiveView.sh")
 ENV_FILE = os.path.join(GLIVEVIEW_DIR, "env")
 
@@ -20,7 +21,7 @@ ENV_URL = "https://raw.githubusercontent.com/cardano-community/guild-operators/m
 def get_local_gliveview_version():
     """Returns the locally installed gLiveView version string, or None."""
     try:
-        result = subprocess.run([GLV_SCRIPT, "-v"], capture_output=True, text=True, check=True)
+        result = subprocess.run([GLV_SCRIPT, "-v"], capture_output=True, text=True, check=True, timeout=VERSION_COMMAND_TIMEOUT)
         return result.stdout.strip()
     except Exception:
         print("⚠️  gLiveView not installed or not working.")
@@ -29,11 +30,9 @@ def get_local_gliveview_version():
 
 # === Remote version detection ===
 def get_remote_gliveview_version():
-    """Fetches the gLiveView script from GitHub and extracts version string."""
+    """Fetches the gLiveView script (via the HTTP cache) and extracts version string."""
     try:
-        response = requests.get(GLV_SCRIPT_URL)
-        response.raise_for_status()
-        content = response.text
+        content = cached_get(GLV_SCRIPT_URL).text
         match = re.search(r'v\d+\.\d+\.\d+', content)
         if match:
             return match.group(0)
@@ -45,30 +44,37 @@ def get_remote_gliveview_version():
 
 # === Backup existing files ===
 def backup_existing_files():
-    if os.path.exists(GLV_SCRIPT):
-        shutil.copy(GLV_SCRIPT, f"{GLV_SCRIPT}.bak")
-        print("✅ gLiveView.sh backed up.")
-    if os.path.exists(ENV_FILE):
-        shutil.copy(ENV_FILE, f"{ENV_FILE}.bak")
-        print("✅ env backed up.")
+    if snapshot("gliveview", GLIVEVIEW_DIR, [os.path.basename(GLV_SCRIPT), os.path.basename(ENV_FILE)]):
+        print("✅ gLiveView.sh and env backed up.")
 
 
 # === Download files ===
-def download_gLiveView_script():
-    print(f"⬇️  Downloading gLiveView.sh from:\n   {GLV_SCRIPT_URL}")
-    subprocess.run(["curl", "-s", "-o", GLV_SCRIPT, GLV_SCRIPT_URL], check=True)
+def _download(url, path, version, max_age=None):
+    """Take the file from the LAN mirror if it has this version, else from upstream (and publish it)."""
+    name = os.path.basename(path)
+    if version and artifact_mirror.fetch("gliveview", version, GLIVEVIEW_DIR, names=[name], max_age=max_age):
+        return
+    print(f"⬇️  Downloading {name} from:\n   {url}")
+    subprocess.run(["curl", "-fs", "-o", path, url], check=True)
+    if version:
+        # Script and env are published one at a time under the script version
+        artifact_mirror.publish("gliveview", version, {name: path}, merge=True)
+
+
+def download_gLiveView_script(version=None):
+    _download(GLV_SCRIPT_URL, GLV_SCRIPT, version)
     print("✅ gLiveView.sh downloaded.")
 
 
-def download_env_file():
-    print(f"⬇️  Downloading env from:\n   {ENV_URL}")
-    subprocess.run(["curl", "-s", "-o", ENV_FILE, ENV_URL], check=True)
+def download_env_file(version=None):
+    # Upstream changes env without bumping the script version, so a mirrored copy is trusted only for a while
+    _download(ENV_URL, ENV_FILE, version, max_age=artifact_mirror.MIRROR_MAX_AGE)
     print("✅ env downloaded.")
 
 
 # === Modify env file ===
 def configure_env_file():
-    config_name = os.getenv("CONFIG_FILE_NAME", "config.json")
+    config_name = settings.config_file_name
     subprocess.run([
         "sed", "-i", ENV_FILE,
         "-e", f"s|#CONFIG=\"${{CNODE_HOME}}/files/config.json\"|CONFIG=\"${{NODE_HOME}}/{config_name}\"|g",
@@ -94,27 +100,32 @@ def run_gLiveView_updater():
     print(f"Local gLiveView version:  {local_version or 'Unknown'}")
     print(f"Latest gLiveView version: {remote_version or 'Unknown'}\n")
 
-    if remote_version and (local_version is None or remote_version not in local_version):
+    ok = True
+    if remote_version is None:
+        ok = False
+    elif local_version is None or remote_version not in local_version:
         if ask_user_to_continue("🆕 Do you want to update gLiveView?"):
             try:
                 backup_existing_files()
-                download_gLiveView_script()
+                download_gLiveView_script(remote_version)
                 subprocess.run(["chmod", "755", GLV_SCRIPT], check=True)
 
-                if ask_user_to_continue("⚠️  Do you also want to download and overwrite your env file?"):
-                    download_env_file()
+                if ask_user_to_continue("⚠️  Do you also want to download and overwrite your env file?", unattended_default=False):
+                    download_env_file(remote_version)
                     configure_env_file()
                 else:
                     print("➡️  Skipping env file update.")
 
                 print("✅ gLiveView updated successfully.")
-                if ask_user_to_continue("Do you want to launch gLiveView now?"):
+                if ask_user_to_continue("Do you want to launch gLiveView now?", unattended_default=False):
                     launch_gLiveView()
             except subprocess.CalledProcessError as e:
                 print(f"❌ Update failed: {e}")
+                ok = False
         else:
             print("➡️  Skipping gLiveView update.")
     else:
         print("✅ gLiveView is up to date.")
 
     print("\n➡️  Returning to menu...")
+    return ok
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import requests
+from spu_helpers import spu_cache_dir
+from spu_http import HTTP_TIMEOUT, get_session
+from spu_settings import load_settings
+from spu_trace import span
+
+# === Cache settings ===
+settings = load_settings()
+
+HTTP_CACHE_TTL = settings.http_cache_ttl                           # seconds
+HTTP_CACHE_MAX_BYTES = settings.http_cache_max_mb * 1024 * 1024
+
+GITHUB_API_HEADERS = {"Accept": "application/vnd.github+json"}
+
+
+class CachedResponse:
+    """Minimal response object returned by cached_get (body is always fully read)."""
+
+    def __init__(self, url, content, headers, from_cache=False, revalidated=False):
+        self.url = url
+        self.status_code = 200
+        self.content = content
+        self.headers = headers
+        self.from_cache = from_cache
+        self.revalidated = revalidated
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def _entry_paths(url):
+    key = hashlib.sha256(url.encode()).hexdigest()
+    directory = spu_cache_dir("http")
+    return os.path.join(directory, f"{key}.json"), os.path.join(directory, f"{key}.body")
+
+
+def _atomic_write(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _load_entry(url):
+    meta_path, body_path = _entry_paths(url)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            body = f.read()
+    except (OSError, ValueError):
+        return None, None
+    if meta.get("url") != url:
+        return None, None
+    return meta, body
+
+
+def _save_meta(url, meta):
+    meta_path, _ = _entry_paths(url)
+    _atomic_write(meta_path, json.dumps(meta).encode())
+
+
+def _store_entry(url, response):
+    _, body_path = _entry_paths(url)
+    now = time.time()
+    meta = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "content_type": response.headers.get("Content-Type"),
+        "size": len(response.content),
+        "fetched_at": now,
+        "last_used": now,
+    }
+    _atomic_write(body_path, response.content)
+    _save_meta(url, meta)
+    evict_http_cache()
+    return meta
+
+
+def evict_http_cache(max_bytes=None):
+    """Drop least-recently-used entries until the cache fits in max_bytes."""
+    max_bytes = HTTP_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    directory = spu_cache_dir("http")
+    entries = []
+    total = 0
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        meta_path = os.path.join(directory, name)
+        body_path = meta_path[:-len(".json")] + ".body"
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            size = os.path.getsize(body_path)
+        except (OSError, ValueError):
+            size, meta = 0, {}
+        entries.append((meta.get("last_used", 0), size, meta_path, body_path))
+        total += size
+
+    for _, size, meta_path, body_path in sorted(entries):
+        if total <= max_bytes:
+            break
+        for path in (meta_path, body_path):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+
+def cached_get(url, ttl=None, headers=None, timeout=HTTP_TIMEOUT):
+    """
+    GET url through the on-disk cache.
+    Within ttl seconds the cached body is returned without touching the network;
+    after that the entry is revalidated with If-None-Match/If-Modified-Since, so an
+    unchanged resource costs a 304 (which GitHub does not count against the rate limit).
+    If the network fails and a stale copy exists, the stale copy is returned.
+    Raises requests.RequestException when nothing usable is available.
+    """
+    ttl = HTTP_CACHE_TTL if ttl is None else ttl
+    meta, body = _load_entry(url)
+    now = time.time()
+
+    if meta and now - meta.get("fetched_at", 0) < ttl:
+        meta["last_used"] = now
+        _save_meta(url, meta)
+        return CachedResponse(url, body, {"Content-Type": meta.get("content_type")}, from_cache=True)
+
+    request_headers = dict(headers or {})
+    if meta:
+        if meta.get("etag"):
+            request_headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            request_headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        with span("http get", revalidate=bool(meta)) as s:
+            response = get_session().get(url, headers=request_headers, timeout=timeout)
+            s.bytes = len(response.content)
+        if response.status_code == 304 and meta:
+            meta["fetched_at"] = meta["last_used"] = now
+            _save_meta(url, meta)
+            return CachedResponse(url, body, {"Content-Type": meta.get("content_type")}, from_cache=True, revalidated=True)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if meta:
+            print(f"⚠️  Using cached copy of {url} ({e})")
+            return CachedResponse(url, body, {"Content-Type": meta.get("content_type")}, from_cache=True)
+        raise
+
+    _store_entry(url, response)
+    return CachedResponse(url, response.content, dict(response.headers))
@@ -0,0 +1,123 @@
+import json
+
+# Longest value shown in a diff line before it is shortened
+MAX_VALUE_WIDTH = 60
+
+MISSING = object()
+
+
+def diff_values(old, new, path=()):
+    """
+    Structural diff of two parsed JSON documents.
+    Objects are compared key by key; lists and scalars are compared as whole values.
+    Returns a list of (op, path, old, new) with op in added/removed/changed.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append(("removed", path + (key,), old[key], MISSING))
+            else:
+                ops.extend(diff_values(old[key], new[key], path + (key,)))
+        for key in new:
+            if key not in old:
+                ops.append(("added", path + (key,), MISSING, new[key]))
+        return ops
+    if old != new or type(old) is not type(new):
+        return [("changed", path, old, new)]
+    return []
+
+
+def load_json(path):
+    with open(path, "rb") as f:
+        return json.load(f)
+
+
+def diff_files(old_path, new_path):
+    """Diff two JSON files. Byte-identical files are not parsed at all."""
+    with open(old_path, "rb") as a, open(new_path, "rb") as b:
+        if a.read() == b.read():
+            return []
+    return diff_values(load_json(old_path), load_json(new_path))
+
+
+def format_path(path):
+    return ".".join(str(part) for part in path) or "(root)"
+
+
+def _short(value):
+    if value is MISSING:
+        return "∅"
+    text = json.dumps(value, sort_keys=True)
+    return text if len(text) <= MAX_VALUE_WIDTH else text[:MAX_VALUE_WIDTH - 1] + "…"
+
+
+def print_diff(ops, limit=50):
+    symbols = {"added": "+", "removed": "-", "changed": "~"}
+    for op, path, old, new in ops[:limit]:
+        if op == "changed":
+            print(f"   {symbols[op]} {format_path(path)}: {_short(old)} → {_short(new)}")
+        else:
+            print(f"   {symbols[op]} {format_path(path)}: {_short(new if op == 'added' else old)}")
+    if len(ops) > limit:
+        print(f"   … and {len(ops) - limit} more")
+
+
+def _set_path(doc, path, value):
+    node = doc
+    for key in path[:-1]:
+        if not isinstance(node.get(key), dict):
+            node[key] = {}
+        node = node[key]
+    node[path[-1]] = value
+
+
+def _delete_path(doc, path):
+    node = doc
+    for key in path[:-1]:
+        node = node.get(key)
+        if not isinstance(node, dict):
+            return
+    node.pop(path[-1], None)
+
+
+def apply_ops(doc, ops):
+    """Apply diff ops (as produced by diff_values) to a copy of doc."""
+    result = json.loads(json.dumps(doc))
+    for op, path, _, new in ops:
+        if not path:
+            result = new
+        elif op == "removed":
+            _delete_path(result, path)
+        else:
+            _set_path(result, path, new)
+    return result
+
+
+def _overlaps(path, paths):
+    return any(path[:len(p)] == p or p[:len(path)] == path for p in paths)
+
+
+def get_path(doc, path):
+    node = doc
+    for key in path:
+        if not isinstance(node, dict) or key not in node:
+            return MISSING
+        node = node[key]
+    return node
+
+
+def merge_overrides(base, local, upstream):
+    """
+    Three-way merge for config files: local edits are those between base (the upstream file
+    the local copy was made from) and local; they are replayed onto the new upstream.
+    Returns (merged, carried_ops, conflict_ops). On a conflict, where upstream changed the
+    same key to something else, the local value wins and the op is reported.
+    """
+    local_ops = diff_values(base, local)
+    upstream_paths = [path for _, path, _, _ in diff_values(base, upstream)]
+    conflicts = [
+        op for op in local_ops
+        if _overlaps(op[1], upstream_paths) and get_path(upstream, op[1]) != op[3]
+    ]
+    return apply_ops(upstream, local_ops), local_ops, conflicts
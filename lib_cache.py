@@ -0,0 +1,125 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import subprocess
+from functools import lru_cache
+from spu_helpers import spu_cache_dir
+from spu_settings import load_settings
+
+# === Cache settings ===
+LIB_CACHE_MAX_BYTES = load_settings().lib_cache_max_mb * 1024 * 1024
+ARTIFACT_NAME = "files.tar.gz"
+META_NAME = "meta.json"
+
+COMMIT_RE = re.compile(r"^[0-9a-fA-F]{7,40}$")
+
+
+@lru_cache(maxsize=None)
+def compiler_version():
+    """First line of `cc --version`, or 'unknown' if no compiler is available."""
+    try:
+        output = subprocess.run(["cc", "--version"], capture_output=True, text=True, check=True).stdout
+        return output.splitlines()[0].strip() if output else "unknown"
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def resolve_commit(repo_url, ref):
+    """
+    Resolve ref to a commit id without cloning.
+    Commit ids are used as-is; tags and branches are looked up with git ls-remote.
+    Returns None if the ref cannot be resolved (caching is then skipped).
+    """
+    if ref and COMMIT_RE.match(ref):
+        return ref.lower()
+    patterns = ["HEAD"] if not ref else [f"refs/tags/{ref}^{{}}", f"refs/tags/{ref}", f"refs/heads/{ref}"]
+    try:
+        output = subprocess.run(
+            ["git", "ls-remote", repo_url, *patterns],
+            capture_output=True, text=True, check=True, timeout=30,
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    found = {}
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            found[parts[1]] = parts[0]
+    for pattern in patterns:
+        if pattern in found:
+            return found[pattern]
+    return None
+
+
+def cache_key(name, commit, build_steps):
+    """Content key for a library build: library, commit, build flags and compiler."""
+    material = json.dumps(
+        {"lib": name, "commit": commit, "build": build_steps, "compiler": compiler_version()},
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def _entry_dir(key):
+    return os.path.join(spu_cache_dir("native-libs"), key)
+
+
+def lookup(key):
+    """Return the cached artifact path for key (and mark it used), or None."""
+    entry = _entry_dir(key)
+    artifact = os.path.join(entry, ARTIFACT_NAME)
+    meta_path = os.path.join(entry, META_NAME)
+    if not os.path.isfile(artifact) or not os.path.isfile(meta_path):
+        return None
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        meta["last_used"] = time.time()
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+    except (OSError, ValueError):
+        return None
+    return artifact
+
+
+def store(key, artifact_path, meta):
+    """Move a freshly built artifact into the cache and return its new path."""
+    entry = _entry_dir(key)
+    os.makedirs(entry, exist_ok=True)
+    destination = os.path.join(entry, ARTIFACT_NAME)
+    shutil.move(artifact_path, destination)
+    now = time.time()
+    meta = dict(meta, size=os.path.getsize(destination), created=now, last_used=now)
+    with open(os.path.join(entry, META_NAME), "w") as f:
+        json.dump(meta, f, indent=2)
+    evict(keep=key)
+    return destination
+
+
+def evict(max_bytes=None, keep=None):
+    """Remove least-recently-used entries until the cache fits in max_bytes."""
+    max_bytes = LIB_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    root = spu_cache_dir("native-libs")
+    entries = []
+    total = 0
+    for key in os.listdir(root):
+        meta_path = os.path.join(root, key, META_NAME)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        size = meta.get("size", 0)
+        entries.append((meta.get("last_used", 0), key, size))
+        total += size
+
+    for _, key, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        shutil.rmtree(os.path.join(root, key), ignore_errors=True)
+        total -= size
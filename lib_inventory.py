@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import glob
+import json
+
+# Sources read directly instead of spawning dpkg/dpkg-query/pkg-config per item
+DPKG_STATUS_PATH = "/var/lib/dpkg/status"
+LD_SO_CACHE_PATH = "/etc/ld.so.cache"
+LIB_PREFIX = "/usr/local"
+
+PC_VARIABLE_RE = re.compile(r"\$\{(\w+)\}")
+SONAME_RE = re.compile(rb"(lib[\w.+-]+?\.so(?:\.[\d.]+)?)\x00")
+
+
+def read_dpkg_status(path=DPKG_STATUS_PATH):
+    """Parse the dpkg status file into {package: {"installed": bool, "version": str}}."""
+    packages = {}
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            content = f.read()
+    except OSError:
+        return packages
+
+    for paragraph in content.split("\n\n"):
+        fields = {}
+        for line in paragraph.splitlines():
+            if not line or line[0] in " \t" or ":" not in line:
+                continue
+            key, value = line.split(":", 1)
+            fields[key] = value.strip()
+        name = fields.get("Package")
+        if not name:
+            continue
+        installed = fields.get("Status", "").endswith(" installed")
+        # multi-arch packages appear once per architecture; prefer an installed entry
+        if name in packages and packages[name]["installed"] and not installed:
+            continue
+        packages[name] = {"installed": installed, "version": fields.get("Version") if installed else None}
+    return packages
+
+
+def pkgconfig_search_dirs():
+    """Directories pkg-config would search, in priority order."""
+    dirs = [d for d in os.getenv("PKG_CONFIG_PATH", "").split(":") if d]
+    dirs += [
+        f"{LIB_PREFIX}/lib/pkgconfig",
+        f"{LIB_PREFIX}/share/pkgconfig",
+        *sorted(glob.glob("/usr/lib/*/pkgconfig")),
+        "/usr/lib/pkgconfig",
+        "/usr/share/pkgconfig",
+    ]
+    return dirs
+
+
+def parse_pc_file(path):
+    """Return the expanded Version field of a .pc file, or None."""
+    variables = {}
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        line = line.strip()
+        if "=" in line and ":" not in line.split("=", 1)[0]:
+            key, value = line.split("=", 1)
+            variables[key.strip()] = PC_VARIABLE_RE.sub(lambda m: variables.get(m.group(1), ""), value.strip())
+        elif line.startswith("Version:"):
+            version = PC_VARIABLE_RE.sub(lambda m: variables.get(m.group(1), ""), line.split(":", 1)[1].strip())
+            return version or None
+    return None
+
+
+def read_pkgconfig_versions(names):
+    """Return {name: version or None} for the given pkg-config module names."""
+    versions = {name: None for name in names}
+    remaining = set(names)
+    for directory in pkgconfig_search_dirs():
+        for name in list(remaining):
+            path = os.path.join(directory, f"{name}.pc")
+            if os.path.isfile(path):
+                versions[name] = parse_pc_file(path)
+                remaining.discard(name)
+        if not remaining:
+            break
+    return versions
+
+
+def read_ld_cache(path=LD_SO_CACHE_PATH):
+    """Return the set of shared library names known to the dynamic linker."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return set()
+    return {m.decode(errors="replace") for m in SONAME_RE.findall(data)}
+
+
+def collect_inventory(compiled_libs, apt_packages):
+    """
+    Answer all library/package queries in one pass.
+    compiled_libs: iterable of (name, libfile, headerfile, pkg_name)
+    apt_packages:  iterable of Debian package names
+    Returns a list of {"name", "kind", "installed", "version", "linked"} dicts.
+    """
+    compiled_libs = list(compiled_libs)
+    dpkg = read_dpkg_status()
+    pc_versions = read_pkgconfig_versions([pkg_name for _, _, _, pkg_name in compiled_libs])
+    ld_cache = read_ld_cache()
+
+    results = []
+    for name, libfile, headerfile, pkg_name in compiled_libs:
+        installed = (
+            os.path.exists(os.path.join(LIB_PREFIX, "lib", libfile))
+            and os.path.exists(os.path.join(LIB_PREFIX, "include", headerfile))
+        )
+        soname_prefix = os.path.splitext(libfile)[0] + ".so"
+        results.append({
+            "name": name,
+            "kind": "compiled",
+            "installed": installed,
+            "version": pc_versions.get(pkg_name) if installed else None,
+            "linked": any(so.startswith(soname_prefix) for so in ld_cache),
+        })
+
+    for pkg in apt_packages:
+        entry = dpkg.get(pkg, {})
+        results.append({
+            "name": pkg,
+            "kind": "apt",
+            "installed": entry.get("installed", False),
+            "version": entry.get("version"),
+            "linked": None,
+        })
+    return results
+
+
+# Run as a script to print the inventory as JSON
+if __name__ == "__main__":
+    from native_libs import APT_PACKAGES, COMPILED_LIBS
+
+    print(json.dumps(collect_inventory(COMPILED_LIBS, APT_PACKAGES), indent=2))
@@ -1,10 +1,22 @@
 import os
 import shutil
+import tarfile
+import tempfile
+import time
 import subprocess
+import psutil
+import lib_cache
+import privileged
+from lib_inventory import collect_inventory, read_dpkg_status
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from prompt_toolkit import prompt
-from spu_helpers import ask_user_to_continue, clear_terminal, print_header, resolve_path
+from spu_helpers import ask_user_to_continue, clear_terminal, print_header, spu_cache_dir
+from spu_settings import load_settings
+from spu_trace import traced
 
-GIT_DIR = resolve_path("GIT_DIR", default="~/git")
+settings = load_settings()
+
+GIT_DIR = settings.git_dir
 
 DEFAULT_INSTALL_REFS = {
     "libsodium": "dbb48cc",
@@ -12,6 +24,39 @@ DEFAULT_INSTALL_REFS = {
     "blst": "v0.3.14",
 }
 
+# Build recipes for compiled libraries; "build" steps run unprivileged in a worker
+# process (make steps get -j<N> appended), then the result is installed into a
+# DESTDIR staging tree that is cached and unpacked into / as one privileged step
+LIB_RECIPES = {
+    "libsodium": {
+        "repo": "https://github.com/input-output-hk/libsodium",
+        "build": [["./autogen.sh"], ["./configure"], ["make"], ["make", "check"]],
+    },
+    "secp256k1": {
+        "repo": "https://github.com/bitcoin-core/secp256k1",
+        "build": [
+            ["./autogen.sh"],
+            ["./configure", "--enable-module-schnorrsig", "--enable-experimental"],
+            ["make"],
+            ["make", "check"],
+        ],
+    },
+    "blst": {
+        "repo": "https://github.com/supranational/blst",
+        "build": [["./build.sh"]],
+    },
+}
+
+# (name, static library, header, pkg-config module) checked under /usr/local
+COMPILED_LIBS = [
+    ("libsodium", "libsodium.a", "sodium.h", "libsodium"),
+    ("secp256k1", "libsecp256k1.a", "secp256k1.h", "libsecp256k1"),
+    ("blst", "libblst.a", "blst.h", "libblst"),
+]
+
+# Rough peak memory of one compiler job, used to cap make -j on small hosts
+BUILD_MEM_PER_JOB = 512 * 1024 * 1024
+
 # apt packages required for cardano-node; liburing-dev, protobuf-compiler and
 # libsnappy-dev are new since node 10.7 (LSM/io_uring/protobuf support)
 APT_PACKAGES = [
@@ -21,60 +66,67 @@ APT_PACKAGES = [
     "libsnappy-dev",
 ]
 
-
-def check_lib_exists(libfile, headerfile):
-    lib_path = f"/usr/local/lib/{libfile}"
-    header_path = f"/usr/local/include/{headerfile}"
-    return os.path.exists(lib_path) and os.path.exists(header_path)
+APT_LISTS_DIR = "/var/lib/apt/lists"
+APT_INDEX_MAX_AGE = settings.apt_index_max_age  # seconds
 
 
-def check_apt_package(pkg):
+def apt_index_age():
+    """Seconds since the apt package index was last refreshed, or None if unknown."""
+    latest = None
     try:
-        subprocess.run(
-            ["dpkg", "-s", pkg],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=True,
-        )
-        return True
-    except subprocess.CalledProcessError:
-        return False
+        for entry in os.scandir(APT_LISTS_DIR):
+            if entry.is_file() and entry.name.endswith(("Release", "Packages")):
+                mtime = entry.stat().st_mtime
+                latest = mtime if latest is None or mtime > latest else latest
+    except OSError:
+        return None
+    return None if latest is None else time.time() - latest
 
 
-def get_pkg_config_version(pkg_name):
-    """Return version string from pkg-config, or None if unavailable."""
-    try:
-        result = subprocess.run(
-            ["pkg-config", "--modversion", pkg_name],
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-        return result.stdout.strip() or None
-    except subprocess.CalledProcessError:
-        return None
+@traced("apt install")
+def install_apt_packages(pkgs):
+    """
+    Install (or upgrade) all given apt packages in one transaction.
+    The package index is refreshed at most once, and only if it is older than
+    APT_INDEX_MAX_AGE. Returns {pkg: True/False} read back from the dpkg database.
+    """
+    pkgs = list(dict.fromkeys(pkgs))
+    if not pkgs:
+        return {}
 
+    before = read_dpkg_status()
+    print(f"\n⬇️ Installing {', '.join(pkgs)}...")
 
-def get_apt_version(pkg):
+    age = apt_index_age()
     try:
-        return subprocess.run(
-            ["dpkg-query", "-W", "-f=${Version}", pkg],
-            check=True,
-            capture_output=True,
-            text=True,
-        ).stdout.strip() or None
-    except subprocess.CalledProcessError:
-        return None
+        if age is None or age > APT_INDEX_MAX_AGE:
+            print("🔄 Refreshing apt package index...")
+            privileged.run("apt_update")
+        else:
+            print(f"ℹ️  apt package index refreshed {int(age // 60)} min ago – skipping apt update.")
+        privileged.run("apt_install", *pkgs)
+    except subprocess.CalledProcessError as e:
+        print(f"❌ apt transaction failed: {e}")
+
+    after = read_dpkg_status()
+    results = {}
+    for pkg in pkgs:
+        old = before.get(pkg, {}).get("version")
+        new = after.get(pkg, {}).get("version")
+        results[pkg] = after.get(pkg, {}).get("installed", False)
+        if not results[pkg]:
+            print(f"❌ {pkg}: not installed")
+        elif not old:
+            print(f"✅ {pkg}: installed ({new})")
+        elif old != new:
+            print(f"⬆️  {pkg}: upgraded {old} -> {new}")
+        else:
+            print(f"✅ {pkg}: already at newest version ({new})")
+    return results
 
 
 def install_apt_package(pkg):
-    print(f"\n⬇️ Installing {pkg}...")
-    try:
-        subprocess.run(["sudo", "apt", "update"], check=True)
-        subprocess.run(["sudo", "apt", "install", "-y", pkg], check=True)
-        print(f"✅ {pkg} installed.")
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Failed to install {pkg}: {e}")
+    return install_apt_packages([pkg]).get(pkg, False)
 
 
 def safe_git_clone(repo_url, dest_folder_name):
@@ -106,86 +158,43 @@ def safe_git_clone(repo_url, dest_folder_name):
 def check_native_libs():
     print("🔍 Checking required native libraries...\n")
 
-    compiled_libs = [
-        ("libsodium", "libsodium.a", "sodium.h", "libsodium"),
-        ("secp256k1", "libsecp256k1.a", "secp256k1.h", "libsecp256k1"),
-        ("blst", "libblst.a", "blst.h", "libblst"),
-    ]
-
-    results = []
-
-    for name, libfile, headerfile, pkg_name in compiled_libs:
-        ok = check_lib_exists(libfile, headerfile)
-        version = get_pkg_config_version(pkg_name) if ok else None
-        status = "✅ Found" if ok else "❌ Missing"
-        version_note = f" (version: {version})" if version else ""
-        print(f"{name:<16}: {status}{version_note}")
-        results.append({"name": name, "installed": ok, "version": version})
-
-    for pkg in APT_PACKAGES:
-        ok = check_apt_package(pkg)
-        version = get_apt_version(pkg) if ok else None
-        status = "✅ Installed" if ok else "❌ Missing"
-        version_note = f" (version: {version})" if version else ""
-        print(f"{pkg:<16}: {status}{version_note}")
-        results.append({"name": pkg, "installed": ok, "version": version})
+    results = collect_inventory(COMPILED_LIBS, APT_PACKAGES)
+
+    for lib in results:
+        if lib["kind"] == "compiled":
+            status = "✅ Found" if lib["installed"] else "❌ Missing"
+        else:
+            status = "✅ Installed" if lib["installed"] else "❌ Missing"
+        version_note = f" (version: {lib['version']})" if lib["version"] else ""
+        # Installed under /usr/local but unknown to the dynamic linker: the node would fail to load it
+        if lib["installed"] and lib["linked"] is False:
+            version_note += " ⚠️  not in ld.so.cache – run: sudo ldconfig"
+        print(f"{lib['name']:<16}: {status}{version_note}")
 
     return results
 
 
-def install_libsodium(ref=DEFAULT_INSTALL_REFS["libsodium"]):
-    print("\n⬇️ Installing libsodium...")
-    os.makedirs(GIT_DIR, exist_ok=True)
-    if not safe_git_clone("https://github.com/input-output-hk/libsodium", "libsodium"):
-        return
+def make_jobs_per_build(concurrent_builds):
+    """Size make -j for each of concurrent_builds from usable cores and available memory."""
     try:
-        if ref:
-            subprocess.run(["git", "checkout", ref], cwd=f"{GIT_DIR}/libsodium", check=True)
-        subprocess.run(["./autogen.sh"], cwd=f"{GIT_DIR}/libsodium", check=True)
-        subprocess.run(["./configure"], cwd=f"{GIT_DIR}/libsodium", check=True)
-        subprocess.run(["make"], cwd=f"{GIT_DIR}/libsodium", check=True)
-        subprocess.run(["make", "check"], cwd=f"{GIT_DIR}/libsodium", check=True)
-        subprocess.run(["sudo", "make", "install"], cwd=f"{GIT_DIR}/libsodium", check=True)
-        print("✅ libsodium installed.")
-    except subprocess.CalledProcessError as e:
-        print(f"❌ libsodium install failed: {e}")
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    mem_jobs = psutil.virtual_memory().available // BUILD_MEM_PER_JOB
+    total_jobs = max(1, min(cores, mem_jobs))
+    return max(1, total_jobs // max(1, concurrent_builds))
 
 
-def install_secp256k1(ref=DEFAULT_INSTALL_REFS["secp256k1"]):
-    print("\n⬇️ Installing secp256k1...")
-    os.makedirs(GIT_DIR, exist_ok=True)
-    if not safe_git_clone("https://github.com/bitcoin-core/secp256k1", "secp256k1"):
-        return
-    try:
-        if ref:
-            subprocess.run(["git", "checkout", ref], cwd=f"{GIT_DIR}/secp256k1", check=True)
-        subprocess.run(["./autogen.sh"], cwd=f"{GIT_DIR}/secp256k1", check=True)
-        subprocess.run(
-            ["./configure", "--enable-module-schnorrsig", "--enable-experimental"],
-            cwd=f"{GIT_DIR}/secp256k1",
-            check=True,
-        )
-        subprocess.run(["make"], cwd=f"{GIT_DIR}/secp256k1", check=True)
-        subprocess.run(["make", "check"], cwd=f"{GIT_DIR}/secp256k1", check=True)
-        subprocess.run(["sudo", "make", "install"], cwd=f"{GIT_DIR}/secp256k1", check=True)
-        subprocess.run(["sudo", "ldconfig"], check=True)
-        print("✅ secp256k1 installed.")
-    except subprocess.CalledProcessError as e:
-        print(f"❌ secp256k1 install failed: {e}")
-
+def _with_jobs(cmd, jobs):
+    if cmd[0] == "make":
+        return cmd + [f"-j{jobs}"]
+    return cmd
 
-def install_blst(ref=DEFAULT_INSTALL_REFS["blst"]):
-    print("\n⬇️ Installing blst...")
-    os.makedirs(GIT_DIR, exist_ok=True)
-    if not safe_git_clone("https://github.com/supranational/blst", "blst"):
-        return
-    try:
-        if ref:
-            subprocess.run(["git", "checkout", ref], cwd=f"{GIT_DIR}/blst", check=True)
-        subprocess.run(["./build.sh"], cwd=f"{GIT_DIR}/blst", check=True)
 
-        version_label = ref.lstrip("v") if ref else "unknown"
-        pc_content = f"""prefix=/usr/local
+def _stage_blst_files(src_dir, stage_dir, ref):
+    """Lay out blst's library, headers and pkg-config file under stage_dir/usr/local."""
+    version_label = ref.lstrip("v") if ref else "unknown"
+    pc_content = f"""prefix=/usr/local
 exec_prefix=${{prefix}}
 libdir=${{exec_prefix}}/lib
 includedir=${{prefix}}/include
@@ -197,34 +206,188 @@ Version: {version_label}
 Cflags: -I${{includedir}}
 Libs: -L${{libdir}} -lblst
 """
-        with open(f"{GIT_DIR}/blst/libblst.pc", "w") as f:
-            f.write(pc_content)
-
-        subprocess.run(["sudo", "cp", "libblst.pc", "/usr/local/lib/pkgconfig/"], cwd=f"{GIT_DIR}/blst", check=True)
-        subprocess.run(
-            ["sudo", "cp", "bindings/blst_aux.h", "bindings/blst.h", "bindings/blst.hpp", "/usr/local/include/"],
-            cwd=f"{GIT_DIR}/blst",
-            check=True,
-        )
-        subprocess.run(["sudo", "cp", "libblst.a", "/usr/local/lib"], cwd=f"{GIT_DIR}/blst", check=True)
-
-        subprocess.run(
-            [
-                "sudo",
-                "chmod",
-                "u=rw,go=r",
-                "/usr/local/lib/libblst.a",
-                "/usr/local/lib/pkgconfig/libblst.pc",
-                "/usr/local/include/blst.h",
-                "/usr/local/include/blst.hpp",
-                "/usr/local/include/blst_aux.h",
-            ],
-            check=True,
-        )
-
-        print("✅ blst installed.")
+    prefix = os.path.join(stage_dir, "usr", "local")
+    os.makedirs(os.path.join(prefix, "lib", "pkgconfig"), exist_ok=True)
+    os.makedirs(os.path.join(prefix, "include"), exist_ok=True)
+
+    staged = [os.path.join(prefix, "lib", "pkgconfig", "libblst.pc")]
+    with open(staged[0], "w") as f:
+        f.write(pc_content)
+    for header in ("blst_aux.h", "blst.h", "blst.hpp"):
+        staged.append(shutil.copy(os.path.join(src_dir, "bindings", header), os.path.join(prefix, "include")))
+    staged.append(shutil.copy(os.path.join(src_dir, "libblst.a"), os.path.join(prefix, "lib")))
+    for path in staged:
+        os.chmod(path, 0o644)
+
+
+def _build_library(name, src_dir, commands, jobs, log_path, stage_dir, artifact_path, ref):
+    """
+    Worker process: run a library's build commands, install it into stage_dir
+    (DESTDIR) and pack the staged file set into artifact_path. All output is
+    captured in log_path.
+    """
+    with open(log_path, "w") as log:
+        for cmd in commands:
+            cmd = _with_jobs(cmd, jobs)
+            log.write(f"$ {' '.join(cmd)}\n")
+            log.flush()
+            result = subprocess.run(cmd, cwd=src_dir, stdout=log, stderr=subprocess.STDOUT)
+            if result.returncode != 0:
+                return name, False, f"'{' '.join(cmd)}' exited with {result.returncode}"
+
+        try:
+            if name == "blst":
+                _stage_blst_files(src_dir, stage_dir, ref)
+            else:
+                cmd = ["make", "install", f"DESTDIR={stage_dir}"]
+                log.write(f"$ {' '.join(cmd)}\n")
+                log.flush()
+                subprocess.run(cmd, cwd=src_dir, stdout=log, stderr=subprocess.STDOUT, check=True)
+            with tarfile.open(artifact_path, "w:gz") as archive:
+                for entry in sorted(os.listdir(stage_dir)):
+                    archive.add(os.path.join(stage_dir, entry), arcname=entry)
+            # Reject here what the privileged install would refuse, before it reaches the cache
+            privileged.check_artifact(artifact_path)
+        except (OSError, subprocess.CalledProcessError) as e:
+            return name, False, f"staging failed: {e}"
+        except privileged.PrivilegeError as e:
+            return name, False, f"staged files not installable: {e}"
+    return name, True, None
+
+
+def _print_log_tail(log_path, lines=20):
+    try:
+        with open(log_path) as f:
+            tail = f.readlines()[-lines:]
+    except OSError:
+        return
+    print("".join(f"   {line}" for line in tail), end="")
+
+
+def _prepare_library(name, ref):
+    """Clone and check out a library in the main process (may prompt the user)."""
+    recipe = LIB_RECIPES[name]
+    os.makedirs(GIT_DIR, exist_ok=True)
+    if not safe_git_clone(recipe["repo"], name):
+        return None
+    src_dir = os.path.join(GIT_DIR, name)
+    try:
+        if ref:
+            subprocess.run(["git", "checkout", ref], cwd=src_dir, check=True)
     except subprocess.CalledProcessError as e:
-        print(f"❌ blst install failed: {e}")
+        print(f"❌ {name} checkout failed: {e}")
+        return None
+    return src_dir
+
+
+def _install_artifact(artifact_path):
+    """Unpack a staged file set into / (the only privileged step)."""
+    privileged.run("install_tree", artifact_path)
+
+
+@traced("native libraries")
+def install_libraries(refs):
+    """
+    Build and install compiled libraries.
+    refs maps library name -> git ref (None for the default branch). Builds are
+    looked up in the local artifact cache first (keyed by library, resolved commit,
+    build flags and compiler version); a hit is unpacked without cloning or
+    compiling. Remaining libraries are cloned (this may prompt), then built
+    concurrently in worker processes with parallel make and per-library logs.
+    Only unpacking the staged files into / and ldconfig run privileged, serialized.
+    """
+    names = [name for name in LIB_RECIPES if name in refs]
+    if not names:
+        return {}
+
+    results = {name: False for name in names}
+    artifacts = {}
+    keys = {}
+    prepared = {}
+    for name in names:
+        recipe = LIB_RECIPES[name]
+        commit = lib_cache.resolve_commit(recipe["repo"], refs[name])
+        if commit:
+            keys[name] = lib_cache.cache_key(name, commit, recipe["build"])
+            cached = lib_cache.lookup(keys[name])
+            if cached:
+                print(f"\n♻️  Using cached build of {name} ({commit[:12]})")
+                artifacts[name] = cached
+                continue
+        print(f"\n⬇️ Preparing {name}...")
+        src_dir = _prepare_library(name, refs[name])
+        if src_dir:
+            prepared[name] = src_dir
+
+    work_dir = tempfile.mkdtemp(dir=spu_cache_dir("tmp"))
+    try:
+        if prepared:
+            jobs = make_jobs_per_build(len(prepared))
+            log_dir = spu_cache_dir("logs")
+            log_paths = {name: os.path.join(log_dir, f"{name}-build.log") for name in prepared}
+            print(f"\n🔧 Building {', '.join(prepared)} concurrently (make -j{jobs} each)...")
+
+            with ProcessPoolExecutor(max_workers=len(prepared)) as pool:
+                futures = {}
+                for name, src_dir in prepared.items():
+                    stage_dir = os.path.join(work_dir, f"{name}-stage")
+                    artifact_path = os.path.join(work_dir, f"{name}.tar.gz")
+                    os.makedirs(stage_dir)
+                    futures[pool.submit(
+                        _build_library, name, src_dir, LIB_RECIPES[name]["build"], jobs,
+                        log_paths[name], stage_dir, artifact_path, refs[name],
+                    )] = artifact_path
+                for future in as_completed(futures):
+                    name, ok, error = future.result()
+                    if not ok:
+                        print(f"❌ {name} build failed: {error}\n   Log: {log_paths[name]}")
+                        _print_log_tail(log_paths[name])
+                        continue
+                    print(f"✅ {name} built (log: {log_paths[name]})")
+                    artifacts[name] = futures[future]
+                    if name in keys:
+                        artifacts[name] = lib_cache.store(keys[name], artifacts[name], {
+                            "lib": name,
+                            "ref": refs[name],
+                            "commit": _head_commit(prepared[name]),
+                            "compiler": lib_cache.compiler_version(),
+                        })
+
+        for name in names:
+            if name not in artifacts:
+                continue
+            print(f"\n📥 Installing {name}...")
+            try:
+                _install_artifact(artifacts[name])
+                results[name] = True
+                print(f"✅ {name} installed.")
+            except subprocess.CalledProcessError as e:
+                print(f"❌ {name} install failed: {e}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if any(results.values()):
+        privileged.run("ldconfig", check=False)
+    return results
+
+
+def _head_commit(src_dir):
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=src_dir, capture_output=True, text=True, check=True).stdout.strip()
+    except subprocess.CalledProcessError:
+        return None
+
+
+def install_libsodium(ref=DEFAULT_INSTALL_REFS["libsodium"]):
+    return install_libraries({"libsodium": ref}).get("libsodium", False)
+
+
+def install_secp256k1(ref=DEFAULT_INSTALL_REFS["secp256k1"]):
+    return install_libraries({"secp256k1": ref}).get("secp256k1", False)
+
+
+def install_blst(ref=DEFAULT_INSTALL_REFS["blst"]):
+    return install_libraries({"blst": ref}).get("blst", False)
 
 
 def prompt_for_version(lib_name, current_version, default_ref):
@@ -240,13 +403,14 @@ def prompt_for_version(lib_name, current_version, default_ref):
 
 
 def check_and_install_libs():
-    """Main logic for checking and optionally installing required libraries."""
+    """Main logic for checking and optionally installing required libraries. Returns False if an install failed."""
     clear_terminal()
     print_header("Check & install required native libraries")
     print()
 
     libs_state = check_native_libs()
     missing = [lib["name"] for lib in libs_state if not lib["installed"]]
+    results = {}
 
     if not missing:
         print("\n✅ All required libraries are installed.")
@@ -256,34 +420,30 @@ def check_and_install_libs():
             print(f" - {lib}")
 
         if ask_user_to_continue("Do you want to install missing libraries now?"):
-            if "libsodium" in missing:
-                install_libsodium()
-            if "secp256k1" in missing:
-                install_secp256k1()
-            if "blst" in missing:
-                install_blst()
-            for pkg in APT_PACKAGES:
-                if pkg in missing:
-                    install_apt_package(pkg)
-            print("\n➡️  Missing libraries installed.")
+            results.update(install_libraries({name: DEFAULT_INSTALL_REFS[name] for name in LIB_RECIPES if name in missing}))
+            results.update(install_apt_packages([pkg for pkg in APT_PACKAGES if pkg in missing]))
+            if all(results.values()):
+                print("\n➡️  Missing libraries installed.")
+            else:
+                print(f"\n❌ Not installed: {', '.join(name for name, ok in results.items() if not ok)}")
         else:
             print("➡️  Skipping library installation.")
 
     installed_libs = [lib for lib in libs_state if lib["installed"]]
-    if installed_libs and ask_user_to_continue("\nDo you want to reinstall any library to a newer version?"):
+    if installed_libs and ask_user_to_continue("\nDo you want to reinstall any library to a newer version?", unattended_default=False):
+        rebuild_refs = {}
+        apt_upgrades = []
         for lib in installed_libs:
             if not ask_user_to_continue(f"Reinstall {lib['name']} (current: {lib['version'] or 'unknown'})?"):
                 continue
 
-            if lib["name"] in ("libsodium", "secp256k1", "blst"):
-                ref = prompt_for_version(lib["name"], lib["version"], DEFAULT_INSTALL_REFS.get(lib["name"]))
-                if lib["name"] == "libsodium":
-                    install_libsodium(ref)
-                elif lib["name"] == "secp256k1":
-                    install_secp256k1(ref)
-                elif lib["name"] == "blst":
-                    install_blst(ref)
+            if lib["name"] in LIB_RECIPES:
+                rebuild_refs[lib["name"]] = prompt_for_version(lib["name"], lib["version"], DEFAULT_INSTALL_REFS.get(lib["name"]))
             elif lib["name"] in APT_PACKAGES:
-                install_apt_package(lib["name"])
+                apt_upgrades.append(lib["name"])
+
+        results.update(install_libraries(rebuild_refs))
+        results.update(install_apt_packages(apt_upgrades))
 
     print("\n➡️  Library checks and updates completed.")
+    return all(results.values())
@@ -0,0 +1,182 @@
+import os
+import time
+import select
+import signal
+import shutil
+import subprocess
+import psutil
+import privileged
+from node_versions import managed_executables
+from spu_settings import load_settings
+from spu_trace import traced
+
+# === Process settings ===
+settings = load_settings()
+
+CARDANO_SERVICE_NAME = settings.cardano_service_name
+CARDANO_NODE_INSTALL_DIR = settings.cardano_node_install_dir
+NODE_STOP_TIMEOUT = settings.node_stop_timeout  # seconds of SIGTERM grace before SIGKILL
+NODE_KILL_TIMEOUT = 10                          # seconds to wait after SIGKILL
+NODE_SETTLE_SECONDS = 15                        # a node that crashes on a bad config exits within this
+
+
+# === Discovery ===
+def service_main_pid(service=CARDANO_SERVICE_NAME):
+    """MainPID systemd reports for the node service, or None if it is not running."""
+    try:
+        output = subprocess.run(
+            ["systemctl", "show", "--property=MainPID", "--value", f"{service}.service"],
+            capture_output=True, text=True, check=True, timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return int(output) if output.isdigit() and int(output) > 0 else None
+
+
+def node_executables():
+    """Real paths a running cardano-node may have been started from."""
+    candidates = [os.path.join(CARDANO_NODE_INSTALL_DIR, "cardano-node"), shutil.which("cardano-node")]
+    return {os.path.realpath(path) for path in candidates if path} | managed_executables()
+
+
+def _process_exe(pid):
+    """
+    Executable of pid from /proc; a binary replaced on disk shows a ' (deleted)' suffix.
+    /proc/<pid>/exe of another user's process is unreadable, so then an absolute argv[0]
+    (as systemd's ExecStart gives) is resolved instead.
+    """
+    try:
+        exe = os.readlink(f"/proc/{pid}/exe")
+    except PermissionError:
+        return _process_argv0(pid)
+    except OSError:
+        return None
+    return exe[:-len(" (deleted)")] if exe.endswith(" (deleted)") else exe
+
+
+def _process_argv0(pid):
+    try:
+        cmdline = psutil.Process(pid).cmdline()
+    except psutil.Error:
+        return None
+    if not cmdline or not os.path.isabs(cmdline[0]):
+        return None
+    return os.path.realpath(cmdline[0])
+
+
+def find_node_processes(executables=None, strays=False):
+    """
+    Return (service_pid, other_pids).
+    systemd is asked for the service's MainPID first. /proc is only scanned when there is no
+    MainPID, or when strays asks for processes outside the service; they are found by an exact
+    match of their executable (see _process_exe) against the installed paths, so log tailers
+    or scripts that merely mention cardano-node are never picked up.
+    """
+    main_pid = service_main_pid()
+    others = []
+    if main_pid is not None and not strays:
+        return main_pid, others
+    executables = node_executables() if executables is None else set(executables)
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        pid = int(entry.name)
+        if pid == main_pid or pid == os.getpid():
+            continue
+        if _process_exe(pid) in executables:
+            others.append(pid)
+    return main_pid, others
+
+
+# === Waiting and signalling ===
+def wait_for_exit(pid, timeout):
+    """
+    Block until pid exits or timeout seconds pass; True if it exited.
+    Uses a pidfd so the kernel wakes us on exit; falls back to psutil where pidfds are unavailable.
+    """
+    try:
+        pidfd = os.pidfd_open(pid)
+    except ProcessLookupError:
+        return True
+    except (AttributeError, OSError):
+        try:
+            psutil.Process(pid).wait(timeout)
+            return True
+        except psutil.NoSuchProcess:
+            return True
+        except psutil.TimeoutExpired:
+            return False
+
+    try:
+        poller = select.poll()
+        poller.register(pidfd, select.POLLIN)
+        return bool(poller.poll(timeout * 1000))
+    finally:
+        os.close(pidfd)
+
+
+def _signal(pid, sig):
+    try:
+        os.kill(pid, sig)
+    except ProcessLookupError:
+        pass
+    except PermissionError:
+        privileged.run("kill", sig.name[3:], pid, check=False)
+
+
+@traced("stop service")
+def stop_service(service=CARDANO_SERVICE_NAME, timeout=NODE_STOP_TIMEOUT):
+    """
+    Stop the node service and wait for its MainPID to exit.
+    If it does not stop within timeout, systemd is told to SIGKILL it.
+    Returns the seconds the node took to exit, or None if it was not running.
+    """
+    pid = service_main_pid(service)
+    started = time.monotonic()
+    privileged.run("systemctl", "stop", f"{service}.service", "--no-block", check=False)
+    if pid is None:
+        return None
+
+    print(f"⏳ Waiting for {service} (PID {pid}) to shut down...")
+    if not wait_for_exit(pid, timeout):
+        print(f"⚠️  {service} still running after {timeout}s – sending SIGKILL.")
+        privileged.run("systemctl", "kill", f"{service}.service", "--signal=SIGKILL", check=False)
+        wait_for_exit(pid, NODE_KILL_TIMEOUT)
+        elapsed = time.monotonic() - started
+        print(f"❗ {service} was killed after {elapsed:.1f}s (no clean shutdown).")
+        return elapsed
+
+    elapsed = time.monotonic() - started
+    print(f"✅ {service} shut down cleanly in {elapsed:.1f}s.")
+    return elapsed
+
+
+@traced("start service")
+def start_service(service=CARDANO_SERVICE_NAME):
+    """Start the node service. Returns True if systemd reports it running afterwards."""
+    privileged.run("systemctl", "start", f"{service}.service", check=False)
+    return service_main_pid(service) is not None
+
+
+def check_node_running(service=CARDANO_SERVICE_NAME, settle=NODE_SETTLE_SECONDS):
+    """True if the node service has a MainPID that is still alive settle seconds later (fleet health step)."""
+    pid = service_main_pid(service)
+    if pid is None:
+        print(f"❌ {service} is not running.")
+        return False
+    if wait_for_exit(pid, settle):
+        print(f"❌ {service} (PID {pid}) exited within {settle}s of the check.")
+        return False
+    print(f"✅ {service} is running (PID {pid}).")
+    return True
+
+
+def terminate_process(pid, timeout=NODE_STOP_TIMEOUT):
+    """SIGTERM, wait for exit, then SIGKILL. Returns (exited_cleanly, seconds)."""
+    started = time.monotonic()
+    _signal(pid, signal.SIGTERM)
+    if wait_for_exit(pid, timeout):
+        return True, time.monotonic() - started
+    _signal(pid, signal.SIGKILL)
+    wait_for_exit(pid, NODE_KILL_TIMEOUT)
+    return False, time.monotonic() - started
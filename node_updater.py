@@ -1,26 +1,63 @@
 import os
+import time
 import subprocess
-import requests
 import shutil
-import psutil
-from dotenv import load_dotenv
+import tarfile
+import artifact_mirror
+import privileged
+from cabal_build import (
+    build_components,
+    builddir,
+    cached_build_outputs,
+    list_bin,
+    store_build_outputs,
+    update_index_if_stale,
+)
+from downloader import DownloadError, download_segmented, extract_members, stream_extract
+from http_cache import GITHUB_API_HEADERS, cached_get
+from node_process import find_node_processes, service_main_pid, start_service, stop_service, terminate_process
+from node_versions import (
+    BINARIES,
+    activate,
+    active_version,
+    adopt_unmanaged,
+    install_version,
+    installed_versions,
+    previous_version,
+    prune,
+)
 from prompt_toolkit import prompt
 from prompt_toolkit.validation import Validator
-from spu_helpers import ask_user_to_continue, print_header, clear_terminal, resolve_path
+from spu_helpers import VERSION_COMMAND_TIMEOUT, ask_user_to_continue, is_unattended, print_header, clear_terminal
+from spu_settings import load_settings
+from spu_trace import current_span, traced
 
-# === Load environment variables ===
-load_dotenv()
+# === Load settings ===
+settings = load_settings()
 
-CARDANO_SERVICE_NAME      = os.getenv("CARDANO_SERVICE_NAME")
-CARDANO_NODE_INSTALL_DIR  = resolve_path("CARDANO_NODE_INSTALL_DIR")
-CARDANO_CLI_INSTALL_DIR   = resolve_path("CARDANO_CLI_INSTALL_DIR")
-CARDANO_BACKUP_DIR        = resolve_path("CARDANO_BACKUP_DIR")
-CARDANO_SOURCE_DIR        = resolve_path("CARDANO_SOURCE_DIR")
+CARDANO_SERVICE_NAME      = settings.cardano_service_name
+CARDANO_NODE_INSTALL_DIR  = settings.cardano_node_install_dir
+CARDANO_CLI_INSTALL_DIR   = settings.cardano_cli_install_dir
+CARDANO_SOURCE_DIR        = settings.cardano_source_dir
 # GLIVEVIEW_DIR is not used here, so we don't need to resolve it
 
 GITHUB_API_RELEASES = "https://api.github.com/repos/IntersectMBO/cardano-node/releases/latest"
+GITHUB_API_RELEASE_BY_TAG = "https://api.github.com/repos/IntersectMBO/cardano-node/releases/tags/{tag}"
 GITHUB_REPO_URL     = "https://github.com/IntersectMBO/cardano-node.git"
 
+# "stream" extracts the binaries while downloading (nothing else touches the disk);
+# "segmented" downloads the archive with resumable range requests first
+PREBUILT_DOWNLOAD_MODE = settings.prebuilt_download_mode
+PREBUILT_MEMBERS = ["bin/cardano-node", "bin/cardano-cli"]
+PREBUILT_TMP_DIR = os.path.expanduser("~/tmp2")
+
+# "shallow" resolves the release tag remotely and fetches only that ref at depth 1;
+# "full" fetches all branches, tags and history
+CARDANO_SOURCE_FETCH = settings.cardano_source_fetch
+
+# Installation method used in unattended runs: 1 = pre-built binaries, 2 = compile from source
+UNATTENDED_INSTALL_METHOD = settings.node_install_method
+
 # === Prompt validator for method choice ===
 method_validator = Validator.from_callable(
     lambda text: text in ["1", "2"],
@@ -31,18 +68,29 @@ method_validator = Validator.from_callable(
 def fetch_latest_version():
     print("🔍 Checking latest Cardano Node version from GitHub...")
     try:
-        response = requests.get(GITHUB_API_RELEASES, timeout=30)
-        response.raise_for_status()
-        data = response.json()
+        data = cached_get(GITHUB_API_RELEASES, headers=GITHUB_API_HEADERS).json()
         # data["tag_name"] e.g. "10.5.1" or "v10.5.1"
         return data["tag_name"]
     except Exception as e:
         print(f"❌ Failed to fetch version info: {e}")
         return None
 
+def fetch_release_asset_digest(tag, asset_name):
+    """Return the SHA-256 GitHub publishes for a release asset, or None if unavailable."""
+    try:
+        data = cached_get(GITHUB_API_RELEASE_BY_TAG.format(tag=tag), headers=GITHUB_API_HEADERS).json()
+    except Exception as e:
+        print(f"⚠️  Could not fetch release metadata for {tag}: {e}")
+        return None
+    for asset in data.get("assets", []):
+        digest = asset.get("digest") or ""
+        if asset.get("name") == asset_name and digest.startswith("sha256:"):
+            return digest.split(":", 1)[1]
+    return None
+
 def get_installed_version():
     try:
-        output = subprocess.check_output(["cardano-node", "version"], text=True)
+        output = subprocess.check_output(["cardano-node", "version"], text=True, timeout=VERSION_COMMAND_TIMEOUT)
         for line in output.splitlines():
             if line.startswith("cardano-node"):  # e.g., "cardano-node 8.9.0"
                 return line.split()[1]
@@ -50,63 +98,141 @@ def get_installed_version():
         pass
     return None
 
-def check_and_kill_cardano_node_process():
-    """Check if any 'cardano-node' process is running and offer to terminate it."""
-    running_pids = []
-    for proc in psutil.process_iter(['pid', 'name']):
-        if proc.info.get('name') and 'cardano-node' in proc.info['name']:
-            running_pids.append(proc.info['pid'])
-
-    if running_pids:
-        print(f"\n❗ Detected running cardano-node processes: {running_pids}")
-        if ask_user_to_continue("Do you want to kill these processes automatically?"):
-            to_wait = []
-            for pid in running_pids:
-                try:
-                    p = psutil.Process(pid)
-                    p.terminate()
-                    to_wait.append(p)
-                    print(f"✅ Terminated process with PID {pid}")
-                except Exception as e:
-                    print(f"❌ Failed to terminate PID {pid}: {e}")
-            if to_wait:
-                print("⏳ Waiting for processes to exit...")
-                psutil.wait_procs(to_wait, timeout=15)
+def confirm_stopping_strays():
+    """
+    Before the node goes down: find cardano-node processes outside the service (exact binary
+    match) and ask whether they may be stopped with it. Exits, with nothing stopped, if not.
+    Returns the PIDs to stop during the swap.
+    """
+    _, running_pids = find_node_processes(strays=True)
+    if not running_pids:
+        return running_pids
+
+    print(f"\n❗ Detected cardano-node processes outside the service: {running_pids}")
+    if not ask_user_to_continue("Do you want to stop these processes automatically during the swap?"):
+        print("⏸️  Please terminate the processes manually and rerun the upgrade.")
+        raise SystemExit(1)
+    return running_pids
+
+def stop_remaining_node_processes(strays):
+    """While the node is down: stop the service if it came back and the confirmed strays, without asking."""
+    if service_main_pid():
+        stop_service()
+    for pid in strays:
+        clean, elapsed = terminate_process(pid)
+        if clean:
+            print(f"✅ PID {pid} exited cleanly in {elapsed:.1f}s")
         else:
-            print("⏸️  Please terminate the processes manually and rerun the upgrade.")
-            raise SystemExit(1)
+            print(f"❗ PID {pid} did not exit on SIGTERM and was killed after {elapsed:.1f}s")
+
+def release_archive_name(version):
+    return f"cardano-node-{version}-linux.tar.gz"
 
-def install_from_prebuilt(latest_version):
-    print("\n📦 Installing from pre-built binaries...")
+@traced("prepare pre-built")
+def prepare_prebuilt(latest_version):
+    """Download and extract the pre-built binaries into a staging directory; the node keeps running."""
+    print("\n📦 Preparing pre-built binaries...")
 
-    tmp_dir = os.path.expanduser("~/tmp2")
-    os.makedirs(tmp_dir, exist_ok=True)
-    os.chdir(tmp_dir)
+    staging_dir = os.path.join(PREBUILT_TMP_DIR, "bin")
+    os.makedirs(PREBUILT_TMP_DIR, exist_ok=True)
 
-    url = f"https://github.com/IntersectMBO/cardano-node/releases/download/{latest_version}/cardano-node-{latest_version}-linux.tar.gz"
+    archive_name = release_archive_name(latest_version)
+    archive_path = os.path.join(PREBUILT_TMP_DIR, archive_name)
+    url = f"https://github.com/IntersectMBO/cardano-node/releases/download/{latest_version}/{archive_name}"
+
+    expected_sha256 = fetch_release_asset_digest(latest_version, archive_name)
+    if not expected_sha256:
+        print("⚠️  No published SHA-256 for this asset – the download will not be verified.")
 
     print(f"⬇️  Downloading {url}...")
-    subprocess.run(["wget", url], check=True)
+    try:
+        if PREBUILT_DOWNLOAD_MODE == "segmented":
+            download_segmented(url, archive_path, expected_sha256=expected_sha256)
+            print(f"📂 Extracting {', '.join(PREBUILT_MEMBERS)} from {archive_name}...")
+            with open(archive_path, "rb") as f:
+                extract_members(f, PREBUILT_MEMBERS, staging_dir, mode="r:gz")
+        else:
+            print(f"📂 Extracting {', '.join(PREBUILT_MEMBERS)} while downloading...")
+            # The archive is only kept when it is going to be published to the mirror
+            stream_extract(url, PREBUILT_MEMBERS, staging_dir, expected_sha256=expected_sha256,
+                           keep_archive=archive_path if artifact_mirror.can_publish() else None)
+    except DownloadError as e:
+        print(f"❌ Download failed: {e}")
+        return None
 
-    archive_name = f"cardano-node-{latest_version}-linux.tar.gz"
-    print(f"📂 Extracting {archive_name}...")
-    subprocess.run(["tar", "-xvf", archive_name], check=True)
+    return os.path.join(staging_dir, "cardano-node"), os.path.join(staging_dir, "cardano-cli")
 
-    print("\n🔄 Backing up old binaries...")
-    os.makedirs(CARDANO_BACKUP_DIR, exist_ok=True)
-    subprocess.run(["sudo", "cp", f"{CARDANO_NODE_INSTALL_DIR}/cardano-node", f"{CARDANO_BACKUP_DIR}/cardano-node.bak"], check=False)
-    subprocess.run(["sudo", "cp", f"{CARDANO_CLI_INSTALL_DIR}/cardano-cli", f"{CARDANO_BACKUP_DIR}/cardano-cli.bak"], check=False)
+def _reported_version(binary, program):
+    """Version printed by `<binary> version` on the line starting with program, or None."""
+    try:
+        output = subprocess.check_output([binary, "version"], text=True, timeout=VERSION_COMMAND_TIMEOUT)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    for line in output.splitlines():
+        if line.startswith(program):
+            return line.split()[1]
+    return None
 
-    # Make sure nothing holds the binary
-    check_and_kill_cardano_node_process()
+@traced("verify binaries")
+def verify_binaries(node_path, cli_path, latest_version):
+    """
+    Run the new binaries before anything is stopped. cardano-node must report the release
+    version; cardano-cli is versioned separately, so it only has to run.
+    """
+    expected = latest_version.lstrip("v")
+    ok = True
+    for program, path in (("cardano-node", node_path), ("cardano-cli", cli_path)):
+        version = _reported_version(path, program)
+        if version is None:
+            print(f"❌ {program} at {path} does not run.")
+            ok = False
+        elif program == "cardano-node" and version != expected:
+            print(f"❌ {program} at {path} reports {version}, expected {expected}.")
+            ok = False
+        else:
+            print(f"✅ {program} {version} verified.")
+    return ok
+
+@traced("staged swap")
+def staged_swap(version, restart=True):
+    """
+    Stop the node, switch the active version, start it again and report the down window.
+    Nothing prompts while the node is down; if the switch fails, the node is started again.
+    Returns False if the node was to be restarted but did not start.
+    """
+    strays = confirm_stopping_strays()
 
-    print("\n🚚 Moving new binaries to installation directories...")
-    subprocess.run(["sudo", "mv", "bin/cardano-node", CARDANO_NODE_INSTALL_DIR], check=True)
-    subprocess.run(["sudo", "mv", "bin/cardano-cli", CARDANO_CLI_INSTALL_DIR], check=True)
+    print(f"\n🔁 Switching to {version} (node is stopped only for this step)...")
+    down_started = time.monotonic()
+    shutdown = stop_service()
+    try:
+        stop_remaining_node_processes(strays)
+        swap_started = time.monotonic()
+        activate(version)
+        swap = time.monotonic() - swap_started
+    except BaseException:
+        if restart:
+            print(f"❌ Switching to {version} failed – starting the node again on the active version.")
+            start_service()
+        raise
+
+    if not restart:
+        print("⏸️  Cardano node not restarted.")
+        return True
+
+    start_started = time.monotonic()
+    started = start_service()
+    start = time.monotonic() - start_started
+    down = time.monotonic() - down_started
+    current_span().attrs["down_seconds"] = round(down, 3)
+
+    if started:
+        print("🚀 Cardano node restarted.")
+    else:
+        print(f"❌ {CARDANO_SERVICE_NAME}.service did not start – check: journalctl -u {CARDANO_SERVICE_NAME}")
+    print(f"⏱️  Service down for {down:.1f}s (shutdown {shutdown or 0:.1f}s, swap {swap:.1f}s, start {start:.1f}s)")
+    return started
 
-    print("\n🧹 Cleaning up...")
-    os.chdir(os.path.expanduser("~"))
-    shutil.rmtree(tmp_dir, ignore_errors=True)
 
 def _normalize_tag(tag):
     """Return candidate tag names with/without 'v' prefix to maximize compatibility."""
@@ -151,6 +277,24 @@ def _fetch_all_with_tags():
         else:
             raise
 
+def _resolve_remote_tag(candidates):
+    """Return the first candidate tag that exists on origin, using a single ls-remote."""
+    refs = [f"refs/tags/{tag}" for tag in candidates]
+    output = subprocess.check_output(["git", "ls-remote", "--tags", "origin", *refs], text=True)
+    found = {line.split()[1] for line in output.splitlines() if len(line.split()) == 2}
+    for tag in candidates:
+        if f"refs/tags/{tag}" in found:
+            return tag
+    return None
+
+def _fetch_tag_shallow(tag):
+    """Fetch only the given tag at depth 1 (no other refs or history)."""
+    print(f"📥 Fetching tag {tag} (depth 1)...")
+    subprocess.run(
+        ["git", "fetch", "--depth=1", "--no-tags", "--force", "origin", f"+refs/tags/{tag}:refs/tags/{tag}"],
+        check=True,
+    )
+
 def _tag_exists(tag):
     """Return True if the tag exists locally."""
     try:
@@ -170,15 +314,17 @@ def _checkout_tag(tag):
     res = subprocess.run(["git", "-c", "advice.detachedHead=false", "checkout", "-f", tag])
     return res.returncode == 0
 
-def install_from_source(latest_version):
+@traced("build from source")
+def build_from_source(latest_version):
     """
-    Compile and install cardano-node from source.
+    Compile cardano-node and cardano-cli from source.
     Handles directory creation, non-git folders, remote URL, tag fetching, checkout and build.
+    Returns (node_path, cli_path) of the kept build outputs, or None on failure.
     """
     print("\n🛠️  Compiling from source...")
 
     # 🧹 Remove system-wide libsodium-dev to avoid conflicts
-    subprocess.run(["sudo", "apt", "remove", "-y", "libsodium-dev"], check=False)
+    privileged.run("apt_remove", "libsodium-dev", check=False)
 
     # Ensure the parent directory exists
     parent_dir = os.path.dirname(CARDANO_SOURCE_DIR)
@@ -189,7 +335,7 @@ def install_from_source(latest_version):
         git_folder = os.path.join(CARDANO_SOURCE_DIR, ".git")
         if not os.path.exists(git_folder):
             print(f"\n⚠️  The folder {CARDANO_SOURCE_DIR} already exists but is not a Git repository.")
-            if ask_user_to_continue("Do you want to delete this folder and clone a fresh copy?"):
+            if ask_user_to_continue("Do you want to delete this folder and clone a fresh copy?", unattended_default=False):
                 try:
                     shutil.rmtree(CARDANO_SOURCE_DIR)
                     print(f"🧹 Deleted {CARDANO_SOURCE_DIR}")
@@ -201,6 +347,13 @@ def install_from_source(latest_version):
                 return
         else:
             print(f"📂 Using existing git repository in {CARDANO_SOURCE_DIR}")
+    elif CARDANO_SOURCE_FETCH == "shallow":
+        print(f"📥 Initializing source repository in {CARDANO_SOURCE_DIR} (shallow fetch of the release tag)...")
+        try:
+            subprocess.run(["git", "init", "-q", CARDANO_SOURCE_DIR], check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"❌ Git init failed: {e}")
+            return
     else:
         print(f"📥 Cloning latest source code into {CARDANO_SOURCE_DIR}...")
         try:
@@ -217,17 +370,25 @@ def install_from_source(latest_version):
         print(f"❌ Failed to change directory to {CARDANO_SOURCE_DIR}: {e}")
         return
 
-    # Ensure correct remote and fetch tags/submodules
+    # Normalize tag candidates (with/without 'v')
+    candidates = _normalize_tag(latest_version)
+
+    # Ensure correct remote and fetch the release tag (or everything in full mode)
     try:
         _ensure_correct_origin()
-        _fetch_all_with_tags()
+        if CARDANO_SOURCE_FETCH == "shallow":
+            remote_tag = _resolve_remote_tag(candidates)
+            if not remote_tag:
+                print(f"❌ None of these tags exist on {GITHUB_REPO_URL}: {candidates}")
+                return
+            _fetch_tag_shallow(remote_tag)
+            candidates = [remote_tag]
+        else:
+            _fetch_all_with_tags()
     except subprocess.CalledProcessError as e:
         print(f"❌ Git fetch failed: {e}")
         return
 
-    # Normalize tag candidates (with/without 'v')
-    candidates = _normalize_tag(latest_version)
-
     # If we already are on the desired commit, still proceed with build
     checked_out = False
     for tag in candidates:
@@ -247,35 +408,76 @@ def install_from_source(latest_version):
         return
 
     # Update submodules after checkout (cardano-node uses them)
-    subprocess.run(["git", "submodule", "update", "--init", "--recursive"], check=True)
+    submodule_cmd = ["git", "submodule", "update", "--init", "--recursive"]
+    if CARDANO_SOURCE_FETCH == "shallow":
+        submodule_cmd.append("--depth=1")
+    subprocess.run(submodule_cmd, check=True)
 
     # Build with cabal
     print("⚙️  Running cabal configure...")
-    subprocess.run(["cabal", "update"], check=True)
+    update_index_if_stale()
     subprocess.run(["cabal", "configure", "-O0"], check=True)
 
     print("🔧 Building binaries...")
-    subprocess.run(["cabal", "build", "all"], check=True)
-    subprocess.run(["cabal", "build", "cardano-cli"], check=True)
-
-    print("\n🔄 Backing up old binaries...")
-    os.makedirs(CARDANO_BACKUP_DIR, exist_ok=True)
-    subprocess.run(["sudo", "cp", f"{CARDANO_NODE_INSTALL_DIR}/cardano-node", f"{CARDANO_BACKUP_DIR}/cardano-node.bak"], check=False)
-    subprocess.run(["sudo", "cp", f"{CARDANO_CLI_INSTALL_DIR}/cardano-cli", f"{CARDANO_BACKUP_DIR}/cardano-cli.bak"], check=False)
+    cabal_builddir = builddir()
+    if not build_components(extra_args=[f"--builddir={cabal_builddir}"]):
+        return None
 
-    print("🚚 Installing new binaries...")
     try:
-        node_path = subprocess.check_output(["./scripts/bin-path.sh", "cardano-node"], text=True).strip()
-        cli_path  = subprocess.check_output(["./scripts/bin-path.sh", "cardano-cli"],  text=True).strip()
+        node_path = list_bin("exe:cardano-node", cabal_builddir)
+        cli_path  = list_bin("exe:cardano-cli", cabal_builddir)
     except subprocess.CalledProcessError as e:
         print(f"❌ Failed to locate built binaries: {e}")
-        return
+        return None
+
+    return store_build_outputs(latest_version, node_path, cli_path)
+
+def prepare_from_mirror(latest_version):
+    """
+    Binaries another host already published, as (node_path, cli_path), or None.
+    A mirrored release archive must have the SHA-256 GitHub publishes for it, as a direct
+    download would; binaries another host built from source have no upstream digest and
+    are checked against the mirror's manifest only.
+    """
+    if not artifact_mirror.enabled():
+        return None
+    mirror_dir = os.path.join(PREBUILT_TMP_DIR, "mirror")
+    archive_name = release_archive_name(latest_version)
+    expected_sha256 = fetch_release_asset_digest(latest_version, archive_name)
+    if expected_sha256:
+        paths = artifact_mirror.fetch("node-release", latest_version, mirror_dir, names=[archive_name],
+                                      expected={archive_name: expected_sha256})
+        if paths:
+            try:
+                with open(paths[archive_name], "rb") as f:
+                    staged = extract_members(f, PREBUILT_MEMBERS, os.path.join(mirror_dir, "bin"), mode="r:gz")
+            except (DownloadError, tarfile.TarError, OSError) as e:
+                print(f"❌ Mirrored release archive unusable, using upstream: {e}")
+                return None
+            return staged["bin/cardano-node"], staged["bin/cardano-cli"]
+
+    paths = artifact_mirror.fetch("node-build", latest_version, mirror_dir, names=BINARIES)
+    if not paths:
+        return None
+    return paths["cardano-node"], paths["cardano-cli"]
 
-    # Make sure nothing holds the binary
-    check_and_kill_cardano_node_process()
+def publish_to_mirror(method, latest_version, binaries):
+    """Publish what this host verified: the release archive itself for pre-built installs, else the built binaries."""
+    if method == "1":
+        archive_name = release_archive_name(latest_version)
+        archive_path = os.path.join(PREBUILT_TMP_DIR, archive_name)
+        if os.path.exists(archive_path):
+            artifact_mirror.publish("node-release", latest_version, {archive_name: archive_path}, source="prebuilt",
+                                    upstream_sha256=fetch_release_asset_digest(latest_version, archive_name))
+    elif method == "2":
+        artifact_mirror.publish("node-build", latest_version, dict(zip(BINARIES, binaries)), source="source")
 
-    subprocess.run(["sudo", "cp", "-p", node_path, f"{CARDANO_NODE_INSTALL_DIR}/cardano-node"], check=True)
-    subprocess.run(["sudo", "cp", "-p", cli_path,  f"{CARDANO_CLI_INSTALL_DIR}/cardano-cli"],  check=True)
+def prepare_from_source(latest_version):
+    """Return (node_path, cli_path) from a cached build of latest_version or a fresh one; the node keeps running."""
+    cached = cached_build_outputs(latest_version)
+    if cached and ask_user_to_continue(f"\n♻️  A build of {latest_version} is cached. Install it without rebuilding?"):
+        return cached
+    return build_from_source(latest_version)
 
 def run_node_upgrade():
     clear_terminal()
@@ -284,7 +486,7 @@ def run_node_upgrade():
 
     latest_version = fetch_latest_version()
     if not latest_version:
-        return
+        return False
 
     installed_version = get_installed_version()
     print(f"\n🧾 Installed version: {installed_version if installed_version else 'Not found'}")
@@ -292,35 +494,102 @@ def run_node_upgrade():
 
     if installed_version == latest_version:
         print("\n✅ You already have the latest version.")
-        if not ask_user_to_continue("\nDo you still want to reinstall/build the current version from your chosen method?"):
-            return
+        if not ask_user_to_continue("\nDo you still want to reinstall/build the current version from your chosen method?", unattended_default=False):
+            return True
     else:
         if not ask_user_to_continue("\nDo you want to proceed with the upgrade?"):
             print("\n⛔ Upgrade cancelled by user.")
-            return
+            return True
+
+    # A host of the fleet that already downloaded or built this version saves us doing it again
+    binaries = prepare_from_mirror(latest_version)
+    method = "mirror" if binaries else None
+
+    if method is None:
+        print("\nChoose installation method:")
+        print("\n1 - Pre-built binaries from GitHub")
+        print("2 - Compile from source")
+        if is_unattended():
+            method = UNATTENDED_INSTALL_METHOD
+            print(f"\nSelect method (1/2): {method} (unattended)")
+        else:
+            method = prompt("\nSelect method (1/2): ", validator=method_validator).strip()
 
-    print("\nChoose installation method:")
-    print("\n1 - Pre-built binaries from GitHub")
-    print("2 - Compile from source")
-    method = prompt("\nSelect method (1/2): ", validator=method_validator).strip()
+        if method not in ("1", "2"):
+            print("❌ Invalid choice. Upgrade aborted.")
+            return False
 
-    subprocess.run(["sudo", "systemctl", "stop", f"{CARDANO_SERVICE_NAME}.service"], check=False)
+    # Decided up front so nothing waits for an answer while the node is down
+    restart = ask_user_to_continue("\nRestart the Cardano node right after the binaries are swapped?")
 
-    if method == "1":
-        install_from_prebuilt(latest_version)
-    elif method == "2":
-        install_from_source(latest_version)
-    else:
-        print("❌ Invalid choice. Upgrade aborted.")
-        return
+    # Everything up to the swap happens while the node keeps running
+    if binaries is None:
+        binaries = prepare_prebuilt(latest_version) if method == "1" else prepare_from_source(latest_version)
+    if not binaries or not verify_binaries(*binaries, latest_version):
+        print("\n⛔ Upgrade aborted – the running node was not touched.")
+        return False
+    publish_to_mirror(method, latest_version, binaries)
+
+    adopt_unmanaged(installed_version)
+    install_version(latest_version, *binaries)
+    try:
+        started = staged_swap(latest_version, restart=restart)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"❌ Upgrade failed during the swap: {e}")
+        return False
+    shutil.rmtree(PREBUILT_TMP_DIR, ignore_errors=True)
+    if not started:
+        # Nothing is pruned, so the previous version stays available for a rollback
+        print(f"\n❌ Upgrade to {latest_version} installed, but the node is not running. "
+              f"Previous version kept: {previous_version() or 'none'}")
+        return False
+    prune()
 
     print("\n✅ Upgrade complete. You can verify using:")
     print("   cardano-node version")
     print("   cardano-cli version")
+    print(f"\n↩️  Previous version kept for rollback: {previous_version() or 'none'}")
+    return True
 
-    restart = prompt("\nDo you want to restart the Cardano node now? (y/n): ").strip().lower()
-    if restart == "y":
-        subprocess.run(["sudo", "systemctl", "start", f"{CARDANO_SERVICE_NAME}.service"], check=False)
-        print("🚀 Cardano node restarted.")
+def run_node_rollback():
+    clear_terminal()
+    print_header("Roll back cardano-node")
+    print()
+
+    active = active_version()
+    versions = [v for v in installed_versions() if v != active]
+    print(f"🧾 Active version: {active or 'none (not a versioned install)'}")
+    if not versions:
+        print("❌ No other installed version to roll back to.")
+        return False
+
+    print("\nInstalled versions (newest first):")
+    for index, version in enumerate(versions, start=1):
+        print(f"{index} - {version}")
+
+    if is_unattended():
+        target = previous_version()
+        print(f"\nSelect version: {target} (unattended)")
     else:
-        print("⏸️  Cardano node not restarted.")
+        choices = [str(i) for i in range(1, len(versions) + 1)]
+        validator = Validator.from_callable(
+            lambda text: text in choices,
+            error_message=f"Please enter a number from 1 to {len(versions)}",
+            move_cursor_to_end=True,
+        )
+        target = versions[int(prompt("\nSelect version: ", validator=validator)) - 1]
+
+    if not ask_user_to_continue(f"\nSwitch to {target} and restart the node?"):
+        print("⛔ Rollback cancelled.")
+        return True
+
+    try:
+        started = staged_swap(target)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"❌ Rollback failed during the swap: {e}")
+        return False
+    if not started:
+        print(f"\n❌ Switched to {target}, but the node is not running.")
+        return False
+    print(f"\n✅ Rolled back to {target}.")
+    return True
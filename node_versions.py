@@ -0,0 +1,152 @@
+import os
+import time
+import privileged
+from backup_store import snapshot
+from spu_settings import load_settings
+from spu_trace import traced
+
+# === Versioned install settings ===
+settings = load_settings()
+
+CARDANO_NODE_INSTALL_DIR = settings.cardano_node_install_dir
+CARDANO_CLI_INSTALL_DIR = settings.cardano_cli_install_dir
+CARDANO_VERSIONS_DIR = settings.cardano_versions_dir   # <dir>/<version>/bin/{cardano-node,cardano-cli}
+CARDANO_KEEP_VERSIONS = settings.cardano_keep_versions
+CURRENT_LINK = os.path.join(CARDANO_VERSIONS_DIR, "current")
+
+BINARIES = ("cardano-node", "cardano-cli")
+
+
+def _install_paths():
+    return {
+        "cardano-node": os.path.join(CARDANO_NODE_INSTALL_DIR, "cardano-node"),
+        "cardano-cli": os.path.join(CARDANO_CLI_INSTALL_DIR, "cardano-cli"),
+    }
+
+
+def _replace_symlink(link_path, target):
+    """Operations that point link_path at target with a single rename, so readers never see it missing."""
+    tmp_link = os.path.join(os.path.dirname(link_path), f".{os.path.basename(link_path)}.new")
+    return [("symlink", target, tmp_link), ("rename", tmp_link, link_path)]
+
+
+def version_dir(version):
+    return os.path.join(CARDANO_VERSIONS_DIR, version)
+
+
+def active_version():
+    """Version the 'current' link points at, or None before the first versioned install."""
+    try:
+        return os.path.basename(os.readlink(CURRENT_LINK))
+    except OSError:
+        return None
+
+
+def installed_versions():
+    """Installed versions, most recently installed first."""
+    try:
+        entries = list(os.scandir(CARDANO_VERSIONS_DIR))
+    except FileNotFoundError:
+        return []
+    versions = [
+        entry for entry in entries
+        if entry.is_dir(follow_symlinks=False)
+        and not entry.name.startswith(".")
+        and os.path.isfile(os.path.join(entry.path, "bin", "cardano-node"))
+    ]
+    versions.sort(key=lambda entry: entry.stat(follow_symlinks=False).st_mtime, reverse=True)
+    return [entry.name for entry in versions]
+
+
+def previous_version():
+    """Most recently installed version other than the active one (the rollback target)."""
+    active = active_version()
+    for version in installed_versions():
+        if version != active:
+            return version
+    return None
+
+
+def managed_executables():
+    """cardano-node binaries of all installed versions (for process discovery)."""
+    return {os.path.join(version_dir(v), "bin", "cardano-node") for v in installed_versions()}
+
+
+@traced("install version")
+def install_version(version, node_path, cli_path):
+    """
+    Copy binaries into their own version directory while the node keeps running.
+    The directory is filled under a temporary name and renamed into place when complete.
+    Reinstalling an existing version (even the active one) moves the old directory aside
+    first, so 'current' only dangles between two renames; the running node keeps its binary.
+    """
+    target = version_dir(version)
+    partial = os.path.join(CARDANO_VERSIONS_DIR, f".{version}.partial")
+    replaced = os.path.join(CARDANO_VERSIONS_DIR, f".{version}.replaced")
+    operations = [
+        ("remove", partial),
+        ("remove", replaced),
+        ("mkdir", os.path.join(partial, "bin")),
+        ("copy", node_path, os.path.join(partial, "bin", "cardano-node")),
+        ("copy", cli_path, os.path.join(partial, "bin", "cardano-cli")),
+    ]
+    existing = os.path.isdir(target)
+    if existing:
+        operations.append(("rename", target, replaced))
+    operations += [("rename", partial, target), ("remove", replaced)]
+    privileged.batch(operations)
+    print(f"📦 {'Reinstalled' if existing else 'Installed'} {version} into {target}")
+    return target
+
+
+def adopt_unmanaged(version):
+    """
+    Keep binaries installed before versioned installs existed: copy them into a version
+    directory so they can be rolled back to. Returns the version label used, or None.
+    """
+    paths = _install_paths()
+    node = paths["cardano-node"]
+    if os.path.islink(node) or not os.path.isfile(node):
+        return None
+    label = version or time.strftime("unversioned-%Y%m%d-%H%M%S")
+    if os.path.isdir(version_dir(label)):
+        return label
+    cli = paths["cardano-cli"] if os.path.isfile(paths["cardano-cli"]) else node
+    print(f"🗄️  Keeping the currently installed binaries as version {label}")
+    install_version(label, node, cli)
+    return label
+
+
+@traced("activate version")
+def activate(version):
+    """
+    Make version the active one: rename the 'current' link, then make sure the install
+    paths are links through it. Both steps are renames, so this is what runs while the node is down.
+    """
+    if not os.path.isdir(version_dir(version)):
+        raise FileNotFoundError(f"version {version} is not installed in {CARDANO_VERSIONS_DIR}")
+    operations = _replace_symlink(CURRENT_LINK, version)
+    for name, install_path in _install_paths().items():
+        target = os.path.join(CURRENT_LINK, "bin", name)
+        if os.path.islink(install_path) and os.readlink(install_path) == target:
+            continue
+        operations += _replace_symlink(install_path, target)
+    privileged.batch(operations)
+
+
+def prune(keep=CARDANO_KEEP_VERSIONS):
+    """
+    Remove the oldest versions, keeping the active one plus keep - 1 others.
+    Removed versions are archived in the backup store first, so they can still be restored.
+    """
+    active = active_version()
+    kept = 1 if active else 0
+    for version in installed_versions():
+        if version == active:
+            continue
+        if kept < keep:
+            kept += 1
+            continue
+        print(f"🧹 Removing old version {version}")
+        snapshot("binaries", os.path.join(version_dir(version), "bin"), BINARIES, version=version)
+        privileged.run("remove", version_dir(version))
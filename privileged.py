@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import json
+import atexit
+import shutil
+import signal
+import tarfile
+import threading
+import subprocess
+from spu_helpers import is_unattended
+from spu_settings import load_settings
+from spu_trace import span
+
+# Settings are read lazily: the helper itself runs as root under sudo, where ~ and the
+# environment are root's. It takes its allow-list from SYSTEM_CONFIG when root has written
+# one, otherwise from the command line, accepted only within REQUESTABLE_ROOTS.
+SYSTEM_CONFIG = "/etc/spu/privileged.json"
+REQUESTABLE_ROOTS = {"write_roots": ("/usr/local", "/opt"), "remove_roots": ("/opt",), "extract_dirs": ("/usr/local", "/opt")}
+REQUESTABLE_SERVICE = re.compile(r"^(cardano|cnode)[A-Za-z0-9@._-]*\.service$")
+
+_lock = threading.Lock()
+_helper = None
+_helper_unavailable = False
+
+PACKAGE_NAME = re.compile(r"^[a-z0-9][a-z0-9+.-]*$")
+SYSTEMCTL_ACTIONS = ("start", "stop", "restart", "kill")
+SYSTEMCTL_OPTIONS = ("--no-block", "--signal=SIGKILL")
+SIGNALS = ("TERM", "KILL")
+INSTALL_PREFIX = "usr/local/"
+
+
+class PrivilegeError(Exception):
+    pass
+
+
+def _config():
+    """What the helper may touch, derived from this user's settings."""
+    settings = load_settings()
+    install_dirs = [settings.cardano_node_install_dir, settings.cardano_cli_install_dir, settings.cncli_install_dir]
+    return {
+        "write_roots": sorted({settings.cardano_versions_dir, *install_dirs}),
+        "remove_roots": [settings.cardano_versions_dir],
+        "extract_dirs": [settings.cncli_install_dir],
+        "service": f"{settings.cardano_service_name}.service",
+    }
+
+
+# === Allow-list ===
+def _resolved(path):
+    """path with symlinks in its directories resolved (the last component itself is what gets replaced)."""
+    path = os.path.abspath(path)
+    return os.path.join(os.path.realpath(os.path.dirname(path)), os.path.basename(path))
+
+
+def _inside(path, roots):
+    path = _resolved(path)
+    return any(path != root and os.path.commonpath([path, root]) == root for root in map(_resolved, roots))
+
+
+def _helper_config(requested):
+    """
+    The allow-list the helper enforces. A root-owned SYSTEM_CONFIG replaces whatever the
+    caller asked for; without one, the caller's roots must lie inside REQUESTABLE_ROOTS and
+    the service must look like a node service. Raises PrivilegeError otherwise.
+    """
+    try:
+        st = os.stat(SYSTEM_CONFIG)
+    except FileNotFoundError:
+        config, trusted = requested, False
+    else:
+        if st.st_uid != 0 or st.st_mode & 0o022:
+            raise PrivilegeError(f"{SYSTEM_CONFIG} must be owned by root and writable only by root")
+        with open(SYSTEM_CONFIG) as f:
+            config, trusted = json.load(f), True
+
+    if not isinstance(config, dict) or not isinstance(config.get("service"), str):
+        raise PrivilegeError("configuration needs write_roots, remove_roots, extract_dirs and service")
+    checked = {"service": config["service"]}
+    for key, bases in REQUESTABLE_ROOTS.items():
+        paths = config.get(key)
+        if not isinstance(paths, list) or not all(isinstance(path, str) and os.path.isabs(path) for path in paths):
+            raise PrivilegeError(f"{key} must be a list of absolute paths")
+        checked[key] = [_resolved(path) for path in paths]
+        outside = [path for path in checked[key] if not _inside(path, bases)]
+        if outside and not trusted:
+            raise PrivilegeError(f"{key} {', '.join(outside)} not inside {', '.join(bases)}; "
+                                 f"allow it in {SYSTEM_CONFIG}")
+    if not trusted and not REQUESTABLE_SERVICE.match(checked["service"]):
+        raise PrivilegeError(f"service {checked['service']} does not look like a node service; "
+                             f"allow it in {SYSTEM_CONFIG}")
+    return checked
+
+
+def _member_allowed(member, prefix):
+    name = os.path.normpath(member.name)
+    if name.startswith(("/", "..")):
+        return False
+    if not prefix:
+        return member.isfile() or member.isdir()
+    if member.isdir() and prefix.startswith(name + "/"):
+        return True  # the parents of the prefix, e.g. usr and usr/local
+    if not (name + "/").startswith(prefix):
+        return False
+    if member.issym():
+        # make install links libfoo.so -> libfoo.so.N; the link must not lead out of the prefix
+        target = os.path.normpath(os.path.join("/", os.path.dirname(name), member.linkname))
+        return (target + "/").startswith("/" + prefix)
+    return member.isfile() or member.isdir()
+
+
+def _unsafe_member(archive, prefix=""):
+    """Name of the first member that may not be unpacked (outside prefix, a device, an escaping link), or None."""
+    with tarfile.open(archive, "r:gz") as tar:
+        for member in tar.getmembers():
+            if not _member_allowed(member, prefix):
+                return member.name
+    return None
+
+
+def _check(op, args, config):
+    """Raise PrivilegeError unless op(*args) is one of the allowed operations."""
+    def require(condition, reason):
+        if not condition:
+            raise PrivilegeError(f"{op} {' '.join(map(str, args))}: {reason}")
+
+    writable = config["write_roots"]
+    if op in ("mkdir", "remove"):
+        require(len(args) == 1, "takes one path")
+        require(_inside(args[0], writable if op == "mkdir" else config["remove_roots"]), "path not allowed")
+    elif op in ("copy", "rename", "symlink"):
+        require(len(args) == 2, "takes two paths")
+        require(_inside(args[1], writable), "destination not allowed")
+        require(op != "rename" or _inside(args[0], writable), "source not allowed")
+    elif op == "extract":
+        require(len(args) >= 2 and args[2:] in ([], ["verbose"]), "takes an archive, a directory and optionally verbose")
+        require(_resolved(args[1]) in map(_resolved, config["extract_dirs"]), "directory not allowed")
+        unsafe = _unsafe_member(args[0])
+        require(unsafe is None, f"archive member '{unsafe}' is not a plain file or directory")
+    elif op == "install_tree":
+        require(len(args) == 1, "takes one archive")
+        unsafe = _unsafe_member(args[0], prefix=INSTALL_PREFIX)
+        require(unsafe is None, f"archive member '{unsafe}' leads outside /{INSTALL_PREFIX}")
+    elif op == "systemctl":
+        require(len(args) >= 2 and args[0] in SYSTEMCTL_ACTIONS, "action not allowed")
+        require(args[1] == config["service"], "only the node service may be controlled")
+        require(all(option in SYSTEMCTL_OPTIONS for option in args[2:]), "option not allowed")
+    elif op == "kill":
+        require(len(args) == 2 and args[0] in SIGNALS and str(args[1]).isdigit(), "takes TERM|KILL and a pid")
+        exe = _process_exe(int(args[1]))
+        require(exe is None or os.path.basename(exe) == "cardano-node", "not a cardano-node process")
+    elif op in ("apt_install", "apt_remove"):
+        require(args and all(PACKAGE_NAME.match(pkg) for pkg in args), "invalid package name")
+    elif op in ("apt_update", "ldconfig"):
+        require(not args, "takes no arguments")
+    else:
+        raise PrivilegeError(f"unknown operation '{op}'")
+
+
+def check_artifact(archive):
+    """Raise PrivilegeError if install_tree would refuse archive (used on every staged library build)."""
+    _check("install_tree", [archive], _config())
+
+
+def _process_exe(pid):
+    try:
+        exe = os.readlink(f"/proc/{pid}/exe")
+    except OSError:
+        return None
+    return exe[:-len(" (deleted)")] if exe.endswith(" (deleted)") else exe
+
+
+def command(op, args, config):
+    """The shell command equivalent to op (used for the sudo fallback and for ops run as child processes)."""
+    if op == "mkdir":
+        return ["mkdir", "-p", *args]
+    if op == "copy":
+        return ["cp", "-p", *args]
+    if op == "remove":
+        return ["rm", "-rf", *args]
+    if op == "rename":
+        return ["mv", "-T", *args]
+    if op == "symlink":
+        return ["ln", "-sfn", *args]
+    if op == "extract":
+        return ["tar", "-xzvf" if args[2:] == ["verbose"] else "-xzf", args[0], "-C", args[1]]
+    if op == "install_tree":
+        return ["tar", "-xzf", args[0], "-C", "/", "--no-same-owner", "--no-overwrite-dir"]
+    if op == "systemctl":
+        return ["systemctl", args[0], *args[2:], args[1]]
+    if op == "kill":
+        return ["kill", f"-{args[0]}", str(args[1])]
+    if op == "apt_update":
+        return ["apt-get", "update"]
+    if op == "apt_install":
+        return ["apt-get", "install", "-y", *args]
+    if op == "apt_remove":
+        return ["apt-get", "remove", "-y", *args]
+    return ["ldconfig"]
+
+
+# === Execution as root ===
+def _copy(src, dst):
+    shutil.copy2(src, dst)
+    st = os.stat(src)
+    os.chown(dst, st.st_uid, st.st_gid)
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.unlink(path)
+
+
+def _symlink(target, link):
+    if os.path.lexists(link):
+        os.unlink(link)
+    os.symlink(target, link)
+
+
+def _kill(sig, pid):
+    try:
+        os.kill(int(pid), getattr(signal, f"SIG{sig}"))
+    except ProcessLookupError:
+        pass
+
+
+# File operations run in the helper itself; everything else is a child process
+IN_PROCESS = {
+    "mkdir": lambda path: os.makedirs(path, exist_ok=True),
+    "copy": _copy,
+    "remove": _remove,
+    "rename": os.rename,
+    "symlink": _symlink,
+    "kill": _kill,
+}
+
+
+def execute(operations, config):
+    """Run operations as root in order. Returns (status, index of the failed op or None)."""
+    for index, (op, *args) in enumerate(operations):
+        try:
+            _check(op, args, config)
+            if op in IN_PROCESS:
+                IN_PROCESS[op](*args)
+                continue
+            # Child output goes to stderr: stdout is the helper's reply channel
+            status = subprocess.run(command(op, args, config), stdin=subprocess.DEVNULL, stdout=sys.stderr).returncode
+        except PrivilegeError as e:
+            print(f"❌ Refused privileged operation {e}", file=sys.stderr)
+            status = 126
+        except (OSError, tarfile.TarError) as e:
+            print(f"❌ Privileged {op} failed: {e}", file=sys.stderr)
+            status = 1
+        if status:
+            return status, index
+    return 0, None
+
+
+def serve(config):
+    """Helper main loop: one JSON request per line on stdin, one JSON reply per line on stdout."""
+    # Ctrl+C in the terminal must not cut an operation short; the helper ends when SPU closes the pipe
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    replies = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        config = _helper_config(config)
+    except (PrivilegeError, OSError, ValueError) as e:
+        replies.write(json.dumps({"ready": False, "error": str(e)}) + "\n")
+        replies.flush()
+        sys.exit(1)
+    replies.write(json.dumps({"ready": True, "pid": os.getpid()}) + "\n")
+    replies.flush()
+    for line in sys.stdin:
+        try:
+            operations = json.loads(line)["ops"]
+            status, failed = execute(operations, config)
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"❌ Malformed request to the privileged helper: {e}", file=sys.stderr)
+            status, failed = 126, 0
+        replies.write(json.dumps({"status": status, "failed": failed}) + "\n")
+        replies.flush()
+
+
+# === Client side ===
+def _start_helper(config):
+    argv = ["sudo", *(["-n"] if is_unattended() else []), "--",
+            sys.executable, os.path.abspath(__file__), "--serve", json.dumps(config)]
+    print("🔐 Starting the privileged helper (sudo may ask for your password once per session)...")
+    try:
+        process = subprocess.Popen(argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+    except OSError as e:
+        print(f"⚠️  Privileged helper unavailable ({e}) – using sudo per command.")
+        return None
+    try:
+        hello = json.loads(process.stdout.readline() or "{}")
+    except ValueError:
+        hello = {}
+    if not hello.get("ready"):
+        process.wait()
+        reason = f" ({hello['error']})" if hello.get("error") else ""
+        print(f"⚠️  Privileged helper did not start{reason} – using sudo per command.")
+        return None
+    atexit.register(stop_helper)
+    return process
+
+
+def stop_helper():
+    global _helper
+    with _lock:
+        if _helper is not None:
+            _helper.stdin.close()
+            _helper.wait()
+            _helper = None
+
+
+def _via_helper(operations, config):
+    """
+    Send one batch to the helper. Returns (status, failed index), or None if there is no helper.
+    The index is None when the helper died, since which operation was running is unknown.
+    """
+    global _helper, _helper_unavailable
+    if _helper_unavailable or not load_settings().privileged_helper:
+        return None
+    if _helper is None:
+        _helper = _start_helper(config)
+        if _helper is None:
+            _helper_unavailable = True
+            return None
+    try:
+        _helper.stdin.write(json.dumps({"ops": operations}) + "\n")
+        _helper.stdin.flush()
+        reply = _helper.stdout.readline()
+    except (OSError, ValueError):
+        reply = ""
+    if not reply:
+        print("❌ The privileged helper exited – the batch may be incomplete; later commands use sudo.")
+        _helper_unavailable = True
+        _helper = None
+        return 255, None
+    reply = json.loads(reply)
+    return reply["status"], reply["failed"]
+
+
+def _via_sudo(operations, config):
+    for index, (op, *args) in enumerate(operations):
+        try:
+            _check(op, args, config)
+        except PrivilegeError as e:
+            print(f"❌ Refused privileged operation {e}")
+            return 126, index
+        status = subprocess.run(["sudo", *(["-n"] if is_unattended() else []), *command(op, args, config)]).returncode
+        if status:
+            return status, index
+    return 0, None
+
+
+def batch(operations, check=True):
+    """
+    Run [(op, *args), ...] as root, in order, stopping at the first failure. The whole batch
+    is one round trip to the session's helper. Returns the exit status (0 on success); with
+    check, a failure raises subprocess.CalledProcessError for the failed operation.
+    """
+    operations = [list(map(str, operation)) for operation in operations]
+    config = _config()
+    with span("privileged " + ",".join(dict.fromkeys(op for op, *_ in operations))):
+        with _lock:
+            if os.geteuid() == 0:
+                status, failed = execute(operations, config)
+            else:
+                status, failed = _via_helper(operations, config) or _via_sudo(operations, config)
+    if status and check:
+        if failed is None:
+            raise subprocess.CalledProcessError(status, ["privileged helper", *(op for op, *_ in operations)])
+        op, *args = operations[failed]
+        raise subprocess.CalledProcessError(status, command(op, args, config))
+    return status
+
+
+def run(op, *args, check=True):
+    """Run a single allowed operation as root (see batch)."""
+    return batch([(op, *args)], check=check)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--serve":
+        serve(json.loads(sys.argv[2]))
+    elif len(sys.argv) == 3 and sys.argv[1] == "--check-artifact":
+        try:
+            check_artifact(sys.argv[2])
+        except (PrivilegeError, OSError, tarfile.TarError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"✅ {sys.argv[2]} may be installed into /{INSTALL_PREFIX}")
+    else:
+        print("This is SPU's privileged helper; it is started by SPU itself.", file=sys.stderr)
+        sys.exit(2)
@@ -1,15 +1,34 @@
 import subprocess
 import os
-from prompt_toolkit import prompt
-from prompt_toolkit.validation import Validator
+import sys
+from spu_settings import load_settings
 
+# Upper bound for "<tool> --version" style probes, so a hung binary cannot stall a check
+VERSION_COMMAND_TIMEOUT = 10
+
+
+def is_unattended():
+    """True when SPU runs without an operator (SPU_ASSUME_YES set, e.g. in fleet mode)."""
+    return os.getenv("SPU_ASSUME_YES", "").lower() in ("1", "true", "yes", "y")
 
 def clear_terminal():
-    """Clear the terminal screen."""
+    """Clear the terminal screen (skipped in unattended runs and when not on a TTY)."""
+    if is_unattended() or not sys.stdout.isatty():
+        return
     subprocess.run(["clear"])
 
-def ask_user_to_continue(question):
-    """Prompt user with a yes/no question using prompt_toolkit."""
+def ask_user_to_continue(question, unattended_default=True):
+    """
+    Prompt user with a yes/no question using prompt_toolkit.
+    In unattended runs the question is answered with unattended_default.
+    """
+    if is_unattended():
+        print(f"{question} (y/n): {'y' if unattended_default else 'n'} (unattended)")
+        return unattended_default
+
+    from prompt_toolkit import prompt
+    from prompt_toolkit.validation import Validator
+
     validator = Validator.from_callable(
         lambda text: text.lower() in ["y", "n"],
         error_message="Please enter y or n.",
@@ -18,6 +37,16 @@ def ask_user_to_continue(question):
     answer = prompt(f"{question} (y/n): ", validator=validator).strip().lower()
     return answer == "y"
 
+def version_tuple(version):
+    """'9.6.7' -> (9, 6, 7); stops at the first part without digits."""
+    parts = []
+    for part in str(version).split("."):
+        digits = "".join(ch for ch in part if ch.isdigit())
+        if not digits:
+            break
+        parts.append(int(digits))
+    return tuple(parts)
+
 def print_header(title: str):
     width = 50
     border = "=" * width
@@ -27,9 +56,8 @@ def print_header(title: str):
     print(centered_title)
     print(border)
 
-def resolve_path(varname, default=""):
-    """Resolve a path from environment variable with support for ~ and $HOME."""
-    raw_path = os.getenv(varname, default)
-    if not raw_path:
-        return None
-    return os.path.abspath(os.path.expandvars(os.path.expanduser(raw_path)))
+def spu_cache_dir(*parts):
+    """Return (and create) a directory under SPU_CACHE_DIR (default ~/.cache/stake_pool_updater)."""
+    path = os.path.join(load_settings().spu_cache_dir, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
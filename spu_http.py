@@ -0,0 +1,75 @@
+import os
+import tempfile
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from spu_trace import current_span, traced
+
+# === HTTP defaults ===
+HTTP_TIMEOUT = (10, 60)          # (connect, read) seconds
+HTTP_POOL_SIZE = 16
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+USER_AGENT = "Stake-Pool-Updater"
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the shared keep-alive requests session (created on first use)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            retry = Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET", "HEAD"),
+            )
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+
+@traced("http download")
+def stream_to_file(url, destination, session=None, timeout=HTTP_TIMEOUT, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    Stream url into destination chunk by chunk.
+    The body lands in a temp file next to destination and is renamed over it
+    only once complete, so a failed download never leaves a truncated file.
+    Returns the number of bytes written; raises requests.RequestException on failure.
+    """
+    session = session or get_session()
+    directory = os.path.dirname(os.path.abspath(destination))
+    os.makedirs(directory, exist_ok=True)
+
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(destination)}.", suffix=".part", dir=directory)
+        written = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        written += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(destination):
+                os.chmod(tmp_path, os.stat(destination).st_mode & 0o7777)
+            else:
+                os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+    current_span().bytes = written
+    return written
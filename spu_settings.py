@@ -0,0 +1,203 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+# .env next to the SPU checkout (override with SPU_ENV_FILE)
+ENV_FILE = os.getenv("SPU_ENV_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+
+
+class SettingsError(ValueError):
+    """Raised when .env contains invalid values; the message lists every problem."""
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Node role and paths
+    is_block_producer: bool
+    cardano_network: str
+    cardano_service_name: str
+    cncli_install_dir: str
+    cardano_node_install_dir: str
+    cardano_cli_install_dir: str
+    cardano_source_dir: str
+    cardano_versions_dir: str
+    cardano_keep_versions: int
+    cardano_backup_dir: str
+    backup_keep: int
+    gliveview_dir: str
+    node_config_path: str
+    config_file_name: str
+    git_dir: str
+
+    # Upstream endpoints
+    cncli_github_api: str
+    cncli_download_base: str
+    cardano_install_guide: str
+
+    # Caches and downloads
+    spu_cache_dir: str
+    http_cache_ttl: int
+    http_cache_max_mb: int
+    download_segments: int
+    prebuilt_download_mode: str
+    lib_cache_max_mb: int
+    apt_index_max_age: int
+
+    # Source builds
+    cardano_source_fetch: str
+    cabal_build_profile: str
+    cabal_mem_per_job_gb: float
+    cabal_mem_reserve_gb: float
+    cabal_cgroup_memory_max: str
+    cabal_cgroup_cpu_quota: str
+    cabal_index_max_age_hours: float
+    cardano_build_cache_dir: str
+    cardano_build_cache_max_gb: float
+
+    # Node process handling
+    node_stop_timeout: int
+
+    # Status dashboard
+    status_probe_timeout: int
+
+    # Run traces
+    trace_enabled: bool
+
+    # Privileged operations
+    privileged_helper: bool
+
+    # LAN artifact mirror
+    mirror: str
+    mirror_max_age: int
+
+    # Unattended and fleet runs
+    node_install_method: str
+    fleet_inventory: str
+    fleet_step_timeout: int
+
+
+def expand_path(raw_path):
+    """Expand ~ and $VARS and make a path absolute; empty values stay None."""
+    if not raw_path:
+        return None
+    return os.path.abspath(os.path.expandvars(os.path.expanduser(raw_path)))
+
+
+class _Reader:
+    """Reads typed values from the environment, collecting validation errors."""
+
+    def __init__(self):
+        self.errors = []
+
+    def str(self, name, default=""):
+        return (os.getenv(name) or default).strip()
+
+    def path(self, name, default=""):
+        return expand_path(self.str(name, default))
+
+    def bool(self, name, default=False):
+        raw = self.str(name, "true" if default else "false").lower()
+        if raw not in ("true", "false"):
+            self.errors.append(f"{name} must be true or false (got '{raw}')")
+            return default
+        return raw == "true"
+
+    def number(self, name, default, kind=int, minimum=0):
+        raw = self.str(name, str(default))
+        try:
+            value = kind(raw)
+        except ValueError:
+            self.errors.append(f"{name} must be a number (got '{raw}')")
+            return default
+        if value < minimum:
+            self.errors.append(f"{name} must be at least {minimum} (got {value})")
+            return default
+        return value
+
+    def choice(self, name, default, choices):
+        raw = self.str(name, default).lower()
+        if raw not in choices:
+            self.errors.append(f"{name} must be one of {', '.join(choices)} (got '{raw}')")
+            return default
+        return raw
+
+
+def _mirror_location(raw):
+    """SPU_MIRROR is either an http(s) URL or a directory path; empty disables the mirror."""
+    if raw.startswith(("http://", "https://")):
+        return raw.rstrip("/")
+    return expand_path(raw)
+
+
+def _load_env_file():
+    if not os.path.isfile(ENV_FILE):
+        return
+    from dotenv import load_dotenv
+
+    load_dotenv(ENV_FILE)
+
+
+@lru_cache(maxsize=None)
+def load_settings():
+    """Parse .env once and return the validated, shared Settings (raises SettingsError)."""
+    _load_env_file()
+    env = _Reader()
+    node_config_path = env.path("NODE_CONFIG_PATH", "~/cardano-my-node")
+
+    settings = Settings(
+        is_block_producer=env.bool("IS_BLOCK_PRODUCER"),
+        cardano_network=env.str("CARDANO_NETWORK", "mainnet"),
+        cardano_service_name=env.str("CARDANO_SERVICE_NAME", "cardano-node"),
+        cncli_install_dir=env.path("CNCLI_INSTALL_DIR", "/usr/local/bin"),
+        cardano_node_install_dir=env.path("CARDANO_NODE_INSTALL_DIR", "/usr/local/bin"),
+        cardano_cli_install_dir=env.path("CARDANO_CLI_INSTALL_DIR", "/usr/local/bin"),
+        cardano_source_dir=env.path("CARDANO_SOURCE_DIR", "~/git/cardano-node-src"),
+        cardano_versions_dir=env.path("CARDANO_VERSIONS_DIR", "/opt/cardano-node"),
+        cardano_keep_versions=env.number("CARDANO_KEEP_VERSIONS", 3, minimum=2),
+        cardano_backup_dir=env.path("CARDANO_BACKUP_DIR", "~/backups-cardano-binaries"),
+        backup_keep=env.number("SPU_BACKUP_KEEP", 10, minimum=1),
+        gliveview_dir=env.path("GLIVEVIEW_DIR") or node_config_path,
+        node_config_path=node_config_path,
+        config_file_name=env.str("CONFIG_FILE_NAME", "config.json"),
+        git_dir=env.path("GIT_DIR", "~/git"),
+
+        cncli_github_api=env.str("CNCLI_GITHUB_API", "https://api.github.com/repos/cardano-community/cncli/releases/latest"),
+        cncli_download_base=env.str("CNCLI_DOWNLOAD_BASE", "https://github.com/cardano-community/cncli/releases/download/"),
+        cardano_install_guide=env.str(
+            "CARDANO_INSTALL_GUIDE",
+            "https://developers.cardano.org/docs/operate-a-stake-pool/node-operations/installing-cardano-node",
+        ),
+
+        spu_cache_dir=env.path("SPU_CACHE_DIR", "~/.cache/stake_pool_updater"),
+        http_cache_ttl=env.number("SPU_HTTP_CACHE_TTL", 900),
+        http_cache_max_mb=env.number("SPU_HTTP_CACHE_MAX_MB", 64),
+        download_segments=env.number("SPU_DOWNLOAD_SEGMENTS", 4, minimum=1),
+        prebuilt_download_mode=env.choice("PREBUILT_DOWNLOAD_MODE", "stream", ("stream", "segmented")),
+        lib_cache_max_mb=env.number("SPU_LIB_CACHE_MAX_MB", 512),
+        apt_index_max_age=env.number("APT_INDEX_MAX_AGE", 21600),
+
+        cardano_source_fetch=env.choice("CARDANO_SOURCE_FETCH", "shallow", ("shallow", "full")),
+        cabal_build_profile=env.choice("CABAL_BUILD_PROFILE", "nice", ("none", "nice", "cgroup")),
+        cabal_mem_per_job_gb=env.number("CABAL_MEM_PER_JOB_GB", 4, kind=float, minimum=0.5),
+        cabal_mem_reserve_gb=env.number("CABAL_MEM_RESERVE_GB", 2, kind=float),
+        cabal_cgroup_memory_max=env.str("CABAL_CGROUP_MEMORY_MAX"),
+        cabal_cgroup_cpu_quota=env.str("CABAL_CGROUP_CPU_QUOTA"),
+        cabal_index_max_age_hours=env.number("CABAL_INDEX_MAX_AGE_HOURS", 24, kind=float),
+        cardano_build_cache_dir=env.path("CARDANO_BUILD_CACHE_DIR"),
+        cardano_build_cache_max_gb=env.number("CARDANO_BUILD_CACHE_MAX_GB", 40, kind=float),
+
+        node_stop_timeout=env.number("SPU_NODE_STOP_TIMEOUT", 120, minimum=1),
+        status_probe_timeout=env.number("SPU_STATUS_TIMEOUT", 20, minimum=1),
+        trace_enabled=env.bool("SPU_TRACE", True),
+        privileged_helper=env.bool("SPU_PRIVILEGED_HELPER", True),
+        mirror=_mirror_location(env.str("SPU_MIRROR")),
+        mirror_max_age=env.number("SPU_MIRROR_MAX_AGE", 21600),
+
+        node_install_method=env.choice("SPU_NODE_INSTALL_METHOD", "1", ("1", "2")),
+        fleet_inventory=env.path("FLEET_INVENTORY", "fleet.json"),
+        fleet_step_timeout=env.number("FLEET_STEP_TIMEOUT", 7200, minimum=1),
+    )
+
+    if env.errors:
+        raise SettingsError("Invalid settings in .env:\n" + "\n".join(f" - {e}" for e in env.errors))
+    return settings
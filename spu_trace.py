@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import socket
+import resource
+import argparse
+import threading
+import functools
+import subprocess
+from contextlib import contextmanager
+from spu_helpers import spu_cache_dir
+from spu_settings import load_settings
+
+_lock = threading.Lock()
+_local = threading.local()
+_trace = None            # the active Trace, if any
+_original_run = subprocess.run
+
+
+class Trace:
+    def __init__(self, step):
+        self.run_id = time.strftime("%Y%m%d-%H%M%S")
+        self.step = step
+        self.host = socket.gethostname()
+        self.started = time.time()
+        self.origin = time.monotonic()
+        self.process_cpu = _process_cpu()
+        self.spans = []
+        self.next_id = 1
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "step": self.step,
+            "host": self.host,
+            "started": self.started,
+            "wall": round(time.monotonic() - self.origin, 3),
+            # all threads of the process, which per-span cpu (one thread each) does not add up to
+            "process_cpu": round(_process_cpu() - self.process_cpu, 3),
+            "spans": self.spans,
+        }
+
+
+def _process_cpu():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    return own.ru_utime + own.ru_stime
+
+
+def _cpu():
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.thread_time(), children.ru_utime + children.ru_stime
+
+
+class Span:
+    """
+    One timed phase. Records wall time, CPU time of the thread that opened it, CPU time of
+    child processes the process reaped meanwhile, and optional bytes / exit status. Does
+    nothing when no trace is active.
+    """
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.bytes = None
+        self.exit_status = None
+        self.record = None
+
+    def __enter__(self):
+        trace = _trace
+        if trace is None:
+            return self
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        with _lock:
+            span_id = trace.next_id
+            trace.next_id += 1
+        self.record = {
+            "id": span_id,
+            "parent": stack[-1].record["id"] if stack else getattr(_local, "parent", None),
+            "name": self.name,
+            "thread": threading.current_thread().name,
+        }
+        stack.append(self)
+        self._trace = trace
+        self._start = time.monotonic()
+        self._cpu = _cpu()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.record is None:
+            return False
+        own, children = _cpu()
+        _local.stack.pop()
+        self.record.update({
+            "start": round(self._start - self._trace.origin, 3),
+            "wall": round(time.monotonic() - self._start, 3),
+            "cpu": round(own - self._cpu[0], 3),
+            "child_cpu": round(children - self._cpu[1], 3),
+        })
+        if self.bytes is not None:
+            self.record["bytes"] = self.bytes
+        if self.exit_status is not None:
+            self.record["exit_status"] = self.exit_status
+        if exc_type is not None and not issubclass(exc_type, (SystemExit, KeyboardInterrupt)):
+            self.record["error"] = f"{exc_type.__name__}: {exc}"
+        if self.attrs:
+            self.record["attrs"] = self.attrs
+        with _lock:
+            self._trace.spans.append(self.record)
+        return False
+
+
+span = Span
+
+
+def current_span():
+    """Innermost open span of this thread (a detached one when nothing is traced), for setting bytes or attrs."""
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else Span(None)
+
+
+def inherit(func):
+    """
+    Wrap func for a worker thread: spans it opens become children of the caller's current
+    span instead of top-level ones. Call this in the submitting thread.
+    """
+    parent = current_span().record
+    parent_id = parent["id"] if parent else None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, "parent", None)
+        _local.parent = parent_id
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.parent = previous
+    return wrapper
+
+
+def traced(name):
+    """Decorator: run the function inside a span called name."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _command_name(cmd):
+    argv = [cmd] if isinstance(cmd, str) else [str(a) for a in cmd]
+    words = [os.path.basename(argv[0])] + [a for a in argv[1:] if not a.startswith("-")][:2]
+    if words[0] == "sudo" and len(argv) > 1:
+        words = ["sudo"] + [os.path.basename(argv[1])] + [a for a in argv[2:] if not a.startswith("-")][:1]
+    return "cmd " + " ".join(words)
+
+
+def _traced_run(*popenargs, **kwargs):
+    cmd = popenargs[0] if popenargs else kwargs.get("args")
+    with Span(_command_name(cmd)) as s:
+        try:
+            result = _original_run(*popenargs, **kwargs)
+        except subprocess.CalledProcessError as e:
+            s.exit_status = e.returncode
+            raise
+        s.exit_status = result.returncode
+        return result
+
+
+@contextmanager
+def trace_run(step):
+    """
+    Trace one SPU step: every subprocess.run (and check_output, which uses it) becomes a span,
+    as do the phases and network transfers the modules mark. subprocess.call and Popen are not
+    traced. The JSON trace is written to SPU_CACHE_DIR/traces when the step ends.
+    """
+    global _trace
+    if _trace is not None or not load_settings().trace_enabled:
+        yield None
+        return
+    _trace = trace = Trace(step)
+    subprocess.run = _traced_run
+    try:
+        with Span(f"step {step}"):
+            yield trace
+    finally:
+        subprocess.run = _original_run
+        _trace = None
+        path = os.path.join(spu_cache_dir("traces"), f"{trace.run_id}-{trace.host}-{step}.json")
+        with open(path, "w") as f:
+            json.dump(trace.to_dict(), f, indent=2)
+        print(f"\n🧭 Trace written to {path}")
+
+
+# === Reporting ===
+def summarize(trace):
+    """Total wall time, CPU time, bytes and calls per span name."""
+    totals = {}
+    for record in trace["spans"]:
+        entry = totals.setdefault(record["name"], {"calls": 0, "wall": 0.0, "cpu": 0.0, "bytes": 0, "failed": 0})
+        entry["calls"] += 1
+        entry["wall"] += record["wall"]
+        entry["cpu"] += record["cpu"] + record["child_cpu"]
+        entry["bytes"] += record.get("bytes", 0)
+        if record.get("exit_status") or record.get("error"):
+            entry["failed"] += 1
+    return totals
+
+
+def print_summary(trace, other=None):
+    totals = summarize(trace)
+    other_totals = summarize(other) if other else {}
+    title = f"{trace['step']} on {trace['host']} ({trace['run_id']})"
+    if other:
+        title += f" vs {other['host']} ({other['run_id']})"
+    print(title)
+    header = f"{'span':<40} {'calls':>5} {'wall s':>9} {'cpu s':>9} {'MiB':>9}"
+    print(header + (f" {'other wall s':>13}" if other else ""))
+    for name, entry in sorted(totals.items(), key=lambda item: -item[1]["wall"]):
+        line = (f"{name[:40]:<40} {entry['calls']:>5} {entry['wall']:>9.2f} {entry['cpu']:>9.2f} "
+                f"{entry['bytes'] / 1048576:>9.1f}")
+        if other:
+            theirs = other_totals.get(name)
+            line += f" {theirs['wall']:>13.2f}" if theirs else f" {'-':>13}"
+        if entry["failed"]:
+            line += f"  ({entry['failed']} failed)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize or compare SPU run traces")
+    parser.add_argument("trace", help="trace JSON file")
+    parser.add_argument("other", nargs="?", help="second trace to compare against")
+    args = parser.parse_args()
+    with open(args.trace) as f:
+        trace = json.load(f)
+    other = None
+    if args.other:
+        with open(args.other) as f:
+            other = json.load(f)
+    print_summary(trace, other)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
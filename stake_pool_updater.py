@@ -1,70 +1,112 @@
 #!/usr/bin/env python3
 
 import os
-import subprocess
-from dotenv import load_dotenv
-from prompt_toolkit import prompt
-from prompt_toolkit.validation import Validator
-from node_updater import run_node_upgrade
-
-
-# === Local modules ===
-from cncli_checker import check_and_update_cncli
-from guild_view_updater import run_gLiveView_updater
-from ghc_tools import prompt_for_ghcup_tui
-from native_libs import check_and_install_libs
-from config_updater import run_config_update
+import sys
+import argparse
+import importlib
 from spu_helpers import clear_terminal, print_header
+from spu_settings import SettingsError, load_settings
+from spu_trace import trace_run
 
 
-# === Load configuration ===
-load_dotenv()
+# === Steps that can be run one-shot (--run) or remotely in fleet mode ===
+# Modules are imported only when their step is selected, so startup stays fast.
+STEPS = {
+    "cncli": ("cncli_checker", "check_and_update_cncli"),
+    "gliveview": ("guild_view_updater", "run_gLiveView_updater"),
+    "ghc": ("ghc_tools", "prompt_for_ghcup_tui"),
+    "libs": ("native_libs", "check_and_install_libs"),
+    "config": ("config_updater", "run_config_update"),
+    "node": ("node_updater", "run_node_upgrade"),
+    "status": ("status", "show_status_dashboard"),
+    "rollback": ("node_updater", "run_node_rollback"),
+    "restore": ("backup_store", "run_restore_menu"),
+    "health": ("node_process", "check_node_running"),
+}
+
+# === Main menu: key, label, step ===
+MENU = [
+    ("1", "Check & update CNCLI", STEPS["cncli"]),
+    ("2", "Update Guild LiveView", STEPS["gliveview"]),
+    ("3", "Check required GHC/Cabal & launch ghcup tui", STEPS["ghc"]),
+    ("4", "Check & install required native libraries (libsodium, secp256k1, blst, lmdb, liburing, protobuf-compiler, snappy)", STEPS["libs"]),
+    ("5", "Download and update Cardano configuration files", STEPS["config"]),
+    ("6", "Upgrade cardano-node (choose method)", STEPS["node"]),
+    ("7", "Fleet mode: run steps across relays and block producer", ("fleet", "run_fleet_menu")),
+    ("8", "Status of all components (installed vs latest)", STEPS["status"]),
+    ("9", "Roll back cardano-node to a previously installed version", STEPS["rollback"]),
+    ("10", "Restore config, gLiveView or binaries from a backup snapshot", STEPS["restore"]),
+]
+
+
+def load_step(target):
+    """Import the step's module on first use and return its entry function."""
+    module_name, function_name = target
+    return getattr(importlib.import_module(module_name), function_name)
 
-# === Prompt validator ===
-menu_validator = Validator.from_callable(
-    lambda text: text in ["0", "1", "2", "3", "4", "5", "6"],
-    error_message="Please enter a valid option: 0, 1, 2, 3, 4, 5 or 6",
-    move_cursor_to_end=True,
-)
 
 def main_menu():
+    from prompt_toolkit import prompt
+    from prompt_toolkit.validation import Validator
+
+    actions = {key: target for key, _, target in MENU}
+    keys = ["0", *actions]
+    menu_validator = Validator.from_callable(
+        lambda text: text in keys,
+        error_message=f"Please enter a valid option: {', '.join(keys[:-1])} or {keys[-1]}",
+        move_cursor_to_end=True,
+    )
+
     while True:
         clear_terminal()
         print_header("🛠️  Stake Pool Updater 1.0.0-rc1 – Main Menu")
         print()
-        
-        print("1 - Check & update CNCLI")
-        print("2 - Update Guild LiveView")
-        print("3 - Check required GHC/Cabal & launch ghcup tui")
-        print("4 - Check & install required native libraries (libsodium, secp256k1, blst, lmdb, liburing, protobuf-compiler, snappy)")
-        print("5 - Download and update Cardano configuration files")
-        print("6 - Upgrade cardano-node (choose method)")
+
+        for key, label, _ in MENU:
+            print(f"{key} - {label}")
         print("0 - Exit\n")
 
         choice = prompt("Select an option: ", validator=menu_validator).strip()
 
-        if choice == "1":
-            check_and_update_cncli()
-        elif choice == "2":
-            run_gLiveView_updater()
-        elif choice == "3":
-            prompt_for_ghcup_tui()
-        elif choice == "4":
-            check_and_install_libs()
-        elif choice == "5":
-            run_config_update()
-        elif choice == "6":
-            run_node_upgrade()
-        elif choice == "0":
+        if choice == "0":
             print("👋 Exiting.")
             break
+        elif choice in actions:
+            with trace_run(actions[choice][1]):
+                load_step(actions[choice])()
         else:
             print("❌ Invalid choice.")
 
         input("\nPress Enter to continue...")
 
+def run_step(name):
+    """
+    Run one step non-interactively from the command line. Step functions return True on
+    success (including nothing to do or a declined change) and False on failure; exit status 1 on failure.
+    """
+    with trace_run(name):
+        ok = load_step(STEPS[name])()
+    return 0 if ok else 1
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stake Pool Updater")
+    parser.add_argument("--run", choices=sorted(STEPS), help="run a single step and exit instead of showing the menu")
+    parser.add_argument("--yes", action="store_true", help="answer prompts unattended (sets SPU_ASSUME_YES=1)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.yes:
+        os.environ["SPU_ASSUME_YES"] = "1"
     try:
-        main_menu()
+        load_settings()
+    except SettingsError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+    try:
+        if args.run:
+            sys.exit(run_step(args.run))
+        else:
+            main_menu()
     except KeyboardInterrupt:
-        print("\n👋 Program interrupted by user. Exiting...\n")
\ No newline at end of file
+        print("\n👋 Program interrupted by user. Exiting...\n")
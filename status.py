@@ -0,0 +1,210 @@
+import sys
+import time
+import threading
+from concurrent.futures import Future, wait
+from spu_helpers import clear_terminal, print_header, version_tuple
+from spu_settings import load_settings
+from spu_trace import inherit
+
+# === Status settings ===
+STATUS_PROBE_TIMEOUT = load_settings().status_probe_timeout  # seconds, for all probes together
+
+TIMED_OUT = object()
+
+
+class _ProbeOutput:
+    """
+    stdout proxy used while probes run: text printed from a probe thread is kept
+    for that probe (shown only when it found nothing), other threads print normally.
+    A probe that outlives the timeout keeps writing into its buffer, which nobody reads;
+    the proxy uninstalls itself once collection is over and the last probe has returned.
+    """
+
+    def __init__(self, stream, probes):
+        self.stream = stream
+        self.buffers = {}
+        self.running = probes
+        self.collecting = True
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        buffer = self.buffers.get(threading.get_ident())
+        if buffer is None:
+            return self.stream.write(text)
+        buffer.append(text)
+        return len(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def _uninstall_if_idle(self):
+        if not self.collecting and not self.running and sys.stdout is self:
+            sys.stdout = self.stream
+
+    def probe_done(self, ident):
+        with self.lock:
+            del self.buffers[ident]
+            self.running -= 1
+            self._uninstall_if_idle()
+
+    def collection_done(self):
+        with self.lock:
+            self.collecting = False
+            self._uninstall_if_idle()
+
+
+def _run_probe(output, probe):
+    ident = threading.get_ident()
+    output.buffers[ident] = notes = []
+    started = time.monotonic()
+    try:
+        value = probe()
+    except Exception as e:
+        value = None
+        notes.append(f"{e}\n")
+    finally:
+        output.probe_done(ident)
+    return value, "".join(notes).strip(), time.monotonic() - started
+
+
+def _start_probe(output, probe):
+    """
+    Run probe in a daemon thread and return a Future for its result. A probe stuck past
+    the timeout (HTTP retries, slow subprocesses) then never holds up interpreter exit.
+    """
+    future = Future()
+    run = inherit(_run_probe)
+    threading.Thread(target=lambda: future.set_result(run(output, probe)), daemon=True).start()
+    return future
+
+
+def _probes():
+    """Every local and remote check, keyed by name; each runs in its own thread."""
+    from cncli_checker import get_latest_cncli_version, get_local_cncli_version
+    from ghc_tools import get_installed_tool_version, get_required_versions
+    from guild_view_updater import get_local_gliveview_version, get_remote_gliveview_version
+    from lib_inventory import collect_inventory
+    from native_libs import APT_PACKAGES, COMPILED_LIBS
+    from node_updater import fetch_latest_version, get_installed_version
+
+    return {
+        "node.installed": get_installed_version,
+        "node.latest": lambda: (fetch_latest_version() or "").lstrip("v") or None,
+        "cncli.installed": get_local_cncli_version,
+        "cncli.latest": lambda: get_latest_cncli_version()[0],
+        "gliveview.installed": get_local_gliveview_version,
+        "gliveview.latest": get_remote_gliveview_version,
+        "ghc.installed": lambda: get_installed_tool_version("ghc"),
+        "cabal.installed": lambda: get_installed_tool_version("cabal"),
+        "ghc_cabal.required": lambda: get_required_versions()[:2],
+        "libs.inventory": lambda: collect_inventory(COMPILED_LIBS, APT_PACKAGES),
+    }
+
+
+def collect_status(timeout=None):
+    """
+    Run all probes concurrently and wait at most timeout seconds in total.
+    Returns {name: (value, notes, seconds)}; probes still running get value TIMED_OUT.
+    """
+    timeout = STATUS_PROBE_TIMEOUT if timeout is None else timeout
+    probes = _probes()
+    output = _ProbeOutput(sys.stdout, len(probes))
+    sys.stdout = output
+    try:
+        futures = {name: _start_probe(output, probe) for name, probe in probes.items()}
+        wait(futures.values(), timeout=timeout)
+    finally:
+        # Probes still running stay captured (and their output is dropped) until they return
+        output.collection_done()
+
+    results = {}
+    for name, future in futures.items():
+        if future.done():
+            results[name] = future.result()
+        else:
+            results[name] = (TIMED_OUT, f"no answer within {timeout}s", timeout)
+    return results
+
+
+def _compare(installed, latest, kind):
+    if installed is TIMED_OUT or latest is TIMED_OUT:
+        return "⏱️  timed out"
+    if installed is None:
+        return "➖ not installed"
+    if latest in (None, "unknown"):
+        return "❔ unknown"
+    if kind == "minimum":
+        return "✅ meets requirement" if version_tuple(installed) >= version_tuple(latest) else "⚠️  below required"
+    if kind == "contains":
+        up_to_date = latest in installed
+    else:
+        up_to_date = installed == latest
+    return "✅ up to date" if up_to_date else "🆕 update available"
+
+
+def _cell(value):
+    if value is TIMED_OUT:
+        return "timeout"
+    return value or "-"
+
+
+def build_rows(results):
+    """Turn probe results into (component, installed, latest, status) rows plus notes."""
+    value = {name: result[0] for name, result in results.items()}
+    required = value["ghc_cabal.required"]
+    if required is TIMED_OUT:
+        ghc_required = cabal_required = TIMED_OUT
+    else:
+        ghc_required, cabal_required = required or ("unknown", "unknown")
+
+    rows = []
+    for label, installed, latest, kind in (
+        ("cardano-node", value["node.installed"], value["node.latest"], "exact"),
+        ("CNCLI", value["cncli.installed"], value["cncli.latest"], "exact"),
+        ("gLiveView", value["gliveview.installed"], value["gliveview.latest"], "contains"),
+        ("GHC", value["ghc.installed"], ghc_required, "minimum"),
+        ("Cabal", value["cabal.installed"], cabal_required, "minimum"),
+    ):
+        shown_latest = f">= {latest}" if kind == "minimum" and latest not in (None, "unknown", TIMED_OUT) else _cell(latest)
+        rows.append((label, _cell(installed), shown_latest, _compare(installed, latest, kind)))
+
+    inventory = value["libs.inventory"]
+    if inventory is TIMED_OUT or inventory is None:
+        rows.append(("Native libraries", _cell(inventory), "-", "⏱️  timed out" if inventory is TIMED_OUT else "❔ unknown"))
+    else:
+        missing = [lib["name"] for lib in inventory if not lib["installed"]]
+        present = f"{len(inventory) - len(missing)}/{len(inventory)} present"
+        rows.append(("Native libraries", present, "-", f"❌ missing: {', '.join(missing)}" if missing else "✅ all present"))
+
+    notes = [
+        (name, notes)
+        for name, (result, notes, _) in sorted(results.items())
+        if notes and result in (None, TIMED_OUT)
+    ]
+    return rows, notes
+
+
+def show_status_dashboard():
+    clear_terminal()
+    print_header("Status of all components")
+    print()
+    print("🔍 Probing installed and latest versions...\n")
+
+    started = time.monotonic()
+    results = collect_status()
+    elapsed = time.monotonic() - started
+    rows, notes = build_rows(results)
+
+    print(f"{'Component':<18} {'Installed':<22} {'Latest':<14} Status")
+    print("-" * 72)
+    for component, installed, latest, status in rows:
+        print(f"{component:<18} {installed[:22]:<22} {latest[:14]:<14} {status}")
+
+    if notes:
+        print("\nNotes:")
+        for name, text in notes:
+            print(f" - {name}: {' '.join(text.split())}")
+
+    slowest_name, slowest = max(((name, r[2]) for name, r in results.items()), key=lambda item: item[1])
+    print(f"\n⏱️  {len(results)} probes in {elapsed:.1f}s (slowest: {slowest_name}, {slowest:.1f}s)")
+    return True